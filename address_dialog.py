@@ -278,7 +278,7 @@ class AddressDialog(BaseDialog):
             
             # Обновляем кэш автодополнения после сохранения
             if not self.read_only:
-                self.autocomplete_helper.clear_cache()
+                self.autocomplete_helper.add_saved_values(data)
                 
             QMessageBox.information(self, "Успех", "Адрес успешно " + ("обновлён" if self.is_edit else "добавлен"))
             super().accept()
@@ -7,26 +7,38 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QTableView, QMessageBox, QHeaderView, QAbstractItemView
 )
-from PyQt6.QtSql import QSqlQuery, QSqlQueryModel
+from PyQt6.QtSql import QSqlQuery
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QFont
 from address_dialog import AddressDialog
+from krd_aggregate import CardTableModel, KrdCard
 from ui_helpers import is_reader  # 🔒 Импорт проверки роли
 
 class AddressesTab(QWidget):
     """Вкладка адресов проживания"""
     data_changed = pyqtSignal()
 
-    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None):
+    # (ключ строки карточки, заголовок колонки)
+    COLUMNS = [
+        ('id', 'ID'), ('region', 'Субъект РФ'), ('district', 'Район'), ('town', 'Населенный пункт'),
+        ('street', 'Улица'), ('house', 'Дом'), ('building', 'Корпус'), ('letter', 'Литер'),
+        ('apartment', 'Квартира'), ('room', 'Комната'), ('check_date', 'Дата проверки'),
+        ('check_result', 'Результат'),
+    ]
+
+    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None, card=None):
         super().__init__()
         self.krd_id = krd_id
         self.db = db_connection
         self.audit_logger = audit_logger
         self.user_info = user_info or {}
         self.is_read_only = is_reader(self.user_info)  # 🔒 Флаг режима чтения
+        # Данные карточки (общие для всех вкладок окна)
+        self.card = card or KrdCard(db_connection, krd_id)
+        self.card.changed.connect(self._on_card_changed)
         
         self.init_ui()
-        self.load_data()
+        self._show_rows()
     
     def init_ui(self):
         """Инициализация интерфейса"""
@@ -42,7 +54,7 @@ class AddressesTab(QWidget):
         layout.addWidget(title_label)
         
         # Таблица адресов
-        self.addresses_model = QSqlQueryModel()
+        self.addresses_model = CardTableModel(self.COLUMNS)
         self.addresses_table = QTableView()
         self.addresses_table.setModel(self.addresses_model)
         self.addresses_table.setAlternatingRowColors(True)
@@ -88,29 +100,15 @@ class AddressesTab(QWidget):
         layout.addLayout(button_layout)
 
     def load_data(self):
-        """Загрузка данных из базы"""
-        query = QSqlQuery(self.db)
-        query.prepare("""
-            SELECT
-                id,
-                region as "Субъект РФ",
-                district as "Район",
-                town as "Населенный пункт",
-                street as "Улица",
-                house as "Дом",
-                building as "Корпус",
-                letter as "Литер",
-                apartment as "Квартира",
-                room as "Комната",
-                check_date as "Дата проверки",
-                check_result as "Результат"
-            FROM krd.addresses
-            WHERE krd_id = ?
-            ORDER BY id DESC
-        """)
-        query.addBindValue(self.krd_id)
-        query.exec()
-        self.addresses_model.setQuery(query)
+        """Перечитывает адреса карточки из базы"""
+        self.card.refresh('addresses')
+
+    def _on_card_changed(self, part):
+        if part == 'addresses':
+            self._show_rows()
+
+    def _show_rows(self):
+        self.addresses_model.set_rows(self.card.get('addresses'))
         # Скрыть ID колонку
         self.addresses_table.setColumnHidden(0, True)
 
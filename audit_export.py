@@ -0,0 +1,196 @@
+"""
+Потоковая выгрузка журнала аудита в CSV/XLSX
+✅ ОПТИМИЗИРОВАНО: Полная выборка по фильтру читается серверным курсором порциями (FETCH), без модели таблицы
+✅ ОПТИМИЗИРОВАНО: Дата форматируется в SQL (to_char) — строки пишутся в файл без преобразования по ячейкам
+✅ ДОБАВЛЕНО: AuditExportJob — выгрузка в фоновом потоке на подключении из пула (background_job), прогресс и отмена
+"""
+import csv
+import os
+import re
+from datetime import datetime
+
+from PyQt6.QtCore import Qt
+from PyQt6.QtSql import QSqlQuery
+from PyQt6.QtWidgets import QMessageBox
+
+from audit_log_model import AUDIT_TABLE_HEADERS
+from background_job import ProgressDialogJob
+
+
+AUDIT_EXPORT_FETCH_SIZE = 5000
+_CURSOR_NAME = "audit_export_cursor"
+
+_PREAMBLE = [
+    ["ОТЧЕТ ПО АУДИТУ ДЕЙСТВИЙ ПОЛЬЗОВАТЕЛЕЙ"],
+    None,  # Дата формирования
+    [],
+    ["📖 ПОЯСНЕНИЕ К СТОЛБЦАМ И ТИПАМ ДАННЫХ:"],
+    ["• Дата и время | Формат: ДД.ММ.ГГГГ ЧЧ:ММ:СС. Момент фиксации действия в системе."],
+    ["• Тип действия   | Код операции. Примеры: LOGIN/LOGOUT (вход/выход), "
+     "CREATE/UPDATE/DELETE/VIEW (CRUD операции), EXPORT (выгрузка данных), "
+     "REFERENCE_CREATE/UPDATE/DELETE (изменение справочников), "
+     "DOCUMENT_GENERATE/SAVE (работа с шаблонами), STATUS_CHANGE (смена статуса КРД)."],
+    ["• Таблица        | Имя таблицы БД или модуля, к которому относится действие "
+     "(например: krd, users, social_data, ranks, statuses, outgoing_requests)."],
+    ["• ID записи      | Внутренний первичный ключ (ID) конкретной измененной записи в таблице."],
+    ["• ID КРД         | Идентификатор карточки розыска, к которой привязано действие. "
+     "Значение 0 или пусто означает системное/глобальное действие."],
+    ["• Описание       | Человеко-читаемый лог с деталями операции (ФИО, номера документов, старые/новые значения)."],
+    [],
+]
+
+
+class AuditExportCancelled(Exception):
+    """Выгрузка прервана пользователем"""
+
+
+def _where_sql(user_id, action_type, date_from, date_to):
+    """
+    Условия выборки литералами: DECLARE CURSOR нельзя подготовить с параметрами через QtSql.
+    Даты проверяются по формату, тип действия экранируется.
+    """
+    for value in (date_from, date_to):
+        if not re.match(r"^\d{4}-\d{2}-\d{2}$", value or ""):
+            raise ValueError(f"Некорректная дата: {value}")
+    conditions = [
+        f"al.created_at >= DATE '{date_from}'",
+        f"al.created_at < DATE '{date_to}' + 1",
+    ]
+    if user_id:
+        conditions.append(f"al.user_id = {int(user_id)}")
+    if action_type:
+        conditions.append("al.action_type = '{}'".format(action_type.replace("'", "''")))
+    return " AND ".join(conditions)
+
+
+class _CsvSink:
+    def __init__(self, file_path):
+        self.file = open(file_path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file, delimiter=";", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+
+    def write_row(self, values):
+        self.writer.writerow(values)
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        self.file.close()
+
+
+class _XlsxSink:
+    def __init__(self, file_path):
+        from openpyxl import Workbook
+        self.file_path = file_path
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet("Аудит")
+
+    def write_row(self, values):
+        self.ws.append(values)
+
+    def close(self):
+        self.wb.save(self.file_path)
+
+    def discard(self):
+        """Удаляет временный файл потокового листа"""
+        writer = getattr(self.ws, "_writer", None)
+        if writer is not None:
+            try:
+                writer.close()
+                writer.cleanup()
+            except Exception:
+                pass
+
+
+def export_audit_log(db, file_path, user_id, action_type, date_from, date_to,
+                     progress_callback=None, cancel_check=None):
+    """
+    Выгружает все события по фильтру в CSV или XLSX (по расширению файла).
+    Returns:
+        int: число выгруженных событий
+    """
+    where_sql = _where_sql(user_id, action_type, date_from, date_to)
+
+    count_query = QSqlQuery(db)
+    total = 0
+    if count_query.exec(f"SELECT COUNT(*) FROM krd.audit_log al WHERE {where_sql}") and count_query.next():
+        total = int(count_query.value(0) or 0)
+
+    sink = _XlsxSink(file_path) if file_path.lower().endswith(".xlsx") else _CsvSink(file_path)
+    rows = 0
+    completed = False
+    if not db.transaction():
+        raise Exception(f"Не удалось начать транзакцию: {db.lastError().text()}")
+    try:
+        for line in _PREAMBLE:
+            sink.write_row(line if line is not None else
+                           [f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"])
+        sink.write_row(AUDIT_TABLE_HEADERS)
+
+        query = QSqlQuery(db)
+        query.setForwardOnly(True)
+        if not query.exec(f"""
+            DECLARE {_CURSOR_NAME} NO SCROLL CURSOR FOR
+            SELECT to_char(al.created_at, 'DD.MM.YYYY HH24:MI:SS'), al.username, al.action_type,
+                   al.table_name, COALESCE(al.record_id::text, ''), COALESCE(al.krd_id::text, ''),
+                   COALESCE(al.description, '')
+            FROM krd.audit_log al
+            WHERE {where_sql}
+            ORDER BY al.created_at DESC, al.id DESC
+        """):
+            raise Exception(query.lastError().text())
+
+        column_range = range(len(AUDIT_TABLE_HEADERS))
+        while True:
+            if not query.exec(f"FETCH FORWARD {AUDIT_EXPORT_FETCH_SIZE} FROM {_CURSOR_NAME}"):
+                raise Exception(query.lastError().text())
+            fetched = 0
+            while query.next():
+                sink.write_row([query.value(i) for i in column_range])
+                fetched += 1
+            rows += fetched
+            if progress_callback:
+                progress_callback(rows, max(total, rows))
+            if fetched < AUDIT_EXPORT_FETCH_SIZE:
+                break
+            if cancel_check and cancel_check():
+                raise AuditExportCancelled()
+
+        sink.close()
+        completed = True
+    finally:
+        db.rollback()  # Только чтение: закрывает курсор вместе с транзакцией
+        if not completed:
+            sink.discard()
+            if os.path.exists(file_path):
+                os.remove(file_path)
+    return rows
+
+
+class AuditExportJob(ProgressDialogJob):
+    """Задание выгрузки в GUI-потоке (background_job) с окном прогресса поверх окна аудита"""
+    window_title = "Экспорт журнала аудита"
+    start_text = "Подготовка выгрузки..."
+    cancel_text = "⏳ Отмена выгрузки..."
+    error_text = "Ошибка экспорта отчета"
+    modality = Qt.WindowModality.WindowModal
+
+    def __init__(self, file_path, user_id, action_type, date_from, date_to, parent=None):
+        self.file_path = file_path
+
+        def task(db, report, cancel_check):
+            return export_audit_log(db, file_path, user_id, action_type, date_from, date_to,
+                                    progress_callback=report, cancel_check=cancel_check)
+
+        super().__init__(task, parent, cancel_exceptions=(AuditExportCancelled,))
+
+    def progress_text(self, done, total, extra, elapsed):
+        rate = done / elapsed if elapsed > 0 else 0.0
+        return f"📝 Строк: {done} из {total}   ⚡ {rate:.0f} строк/с"
+
+    def on_finished(self, rows):
+        QMessageBox.information(self.parent_widget, "Успех",
+                                f"Отчет успешно экспортирован:\n📝 Записей: {rows}\n📁 {self.file_path}")
+
+    def on_cancelled(self):
+        print("⚠️ [AUDIT] Выгрузка журнала аудита отменена, файл не сохранен")
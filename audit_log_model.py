@@ -0,0 +1,206 @@
+"""
+Модель журнала аудита с серверной постраничной загрузкой
+✅ ОПТИМИЗИРОВАНО: Keyset-пагинация по (created_at, id) вместо LIMIT 1000 — прокрутка без усечения
+✅ ОПТИМИЗИРОВАНО: Каждая страница — диапазонное чтение индекса (created_at DESC, id DESC),
+   фильтр по периоду отсекает лишние секции krd.audit_log
+✅ ОПТИМИЗИРОВАНО: Ограниченный LRU-кэш страниц, вытесненная страница перечитывается по сохраненной границе
+"""
+from collections import OrderedDict
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtSql import QSqlQuery
+
+
+AUDIT_TABLE_HEADERS = [
+    "Дата и время", "Пользователь", "Тип действия", "Таблица", "ID записи", "ID КРД", "Описание"
+]
+
+# Служебные колонки выборки после видимых: ключ created_at с микросекундами и id
+_KEY_TS_COLUMN = len(AUDIT_TABLE_HEADERS)
+_KEY_ID_COLUMN = _KEY_TS_COLUMN + 1
+
+
+class AuditLogTableModel(QAbstractTableModel):
+    """
+    Виртуализированная модель krd.audit_log (новые события сверху).
+    Фильтры: user_id, action_type, период [date_from, date_to] включительно (строки yyyy-MM-dd).
+    """
+    PAGE_SIZE = 500
+    MAX_CACHED_PAGES = 20
+
+    _PAGE_SQL = """
+        SELECT
+            al.created_at,
+            al.username,
+            al.action_type,
+            al.table_name,
+            al.record_id,
+            al.krd_id,
+            al.description,
+            to_char(al.created_at, 'YYYY-MM-DD HH24:MI:SS.US'),
+            al.id
+        FROM krd.audit_log al
+        WHERE al.created_at >= CAST(:date_from AS date)
+          AND al.created_at < CAST(:date_to AS date) + 1
+          {filter_sql} {keyset_sql}
+        ORDER BY al.created_at DESC, al.id DESC
+        LIMIT :limit
+    """
+
+    def __init__(self, db_connection, parent=None):
+        super().__init__(parent)
+        self.db = db_connection
+        self.user_id = None
+        self.action_type = ""
+        self.date_from = ""
+        self.date_to = ""
+        self.last_error = ""
+
+        self._row_count = 0
+        self._at_end = True
+        # _page_bounds[i] — ключ (created_at, id) последней строки перед страницей i
+        self._page_bounds = [None]
+        self._pages = OrderedDict()
+
+    # =========================================================================
+    # === ПАРАМЕТРЫ ВЫБОРКИ ===
+    # =========================================================================
+    def set_filters(self, user_id, action_type, date_from, date_to):
+        """Меняет фильтры и перечитывает только первую страницу"""
+        self.user_id = user_id if user_id and user_id > 0 else None
+        self.action_type = action_type or ""
+        self.date_from = date_from
+        self.date_to = date_to
+        return self.reload()
+
+    def filter_sql(self):
+        """Условия фильтра (без периода) и их параметры — общие для модели и экспорта"""
+        conditions = []
+        params = {}
+        if self.user_id:
+            conditions.append("AND al.user_id = :user_id")
+            params[":user_id"] = self.user_id
+        if self.action_type:
+            conditions.append("AND al.action_type = :action_type")
+            params[":action_type"] = self.action_type
+        return " ".join(conditions), params
+
+    def has_more(self):
+        return not self._at_end
+
+    # =========================================================================
+    # === ЗАГРУЗКА ===
+    # =========================================================================
+    def reload(self):
+        self.beginResetModel()
+        self._pages.clear()
+        self._page_bounds = [None]
+        self._row_count = 0
+        self._at_end = False
+        self.last_error = ""
+
+        rows = self._fetch_page(0)
+        ok = rows is not None
+        if ok:
+            self._append_page(rows)
+        else:
+            self._at_end = True
+        self.endResetModel()
+        return ok
+
+    def _fetch_page(self, page_index):
+        bound = self._page_bounds[page_index]
+        keyset_sql = ""
+        if bound is not None:
+            keyset_sql = "AND (al.created_at, al.id) < (CAST(:last_ts AS timestamp), :last_id)"
+        filter_sql, params = self.filter_sql()
+
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare(self._PAGE_SQL.format(filter_sql=filter_sql, keyset_sql=keyset_sql))
+        query.bindValue(":date_from", self.date_from)
+        query.bindValue(":date_to", self.date_to)
+        for name, value in params.items():
+            query.bindValue(name, value)
+        if bound is not None:
+            query.bindValue(":last_ts", bound[0])
+            query.bindValue(":last_id", bound[1])
+        query.bindValue(":limit", self.PAGE_SIZE)
+
+        if not query.exec():
+            self.last_error = query.lastError().text()
+            print(f"❌ [AuditLogTableModel] Ошибка загрузки страницы {page_index}: {self.last_error}")
+            return None
+
+        rows = []
+        while query.next():
+            rows.append([query.value(i) for i in range(_KEY_ID_COLUMN + 1)])
+        return rows
+
+    def _append_page(self, rows):
+        page_index = len(self._page_bounds) - 1
+        self._store_page(page_index, rows)
+        self._row_count += len(rows)
+        if len(rows) < self.PAGE_SIZE:
+            self._at_end = True
+        else:
+            last = rows[-1]
+            self._page_bounds.append((last[_KEY_TS_COLUMN], last[_KEY_ID_COLUMN]))
+
+    def _store_page(self, page_index, rows):
+        self._pages[page_index] = rows
+        self._pages.move_to_end(page_index)
+        while len(self._pages) > self.MAX_CACHED_PAGES:
+            self._pages.popitem(last=False)
+
+    def _get_row(self, row):
+        page_index = row // self.PAGE_SIZE
+        rows = self._pages.get(page_index)
+        if rows is not None:
+            self._pages.move_to_end(page_index)
+        elif page_index < len(self._page_bounds):
+            rows = self._fetch_page(page_index)
+            if rows is not None:
+                self._store_page(page_index, rows)
+        offset = row % self.PAGE_SIZE
+        if rows is None or offset >= len(rows):
+            return None
+        return rows[offset]
+
+    # =========================================================================
+    # === ИНТЕРФЕЙС QAbstractTableModel ===
+    # =========================================================================
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(AUDIT_TABLE_HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._at_end
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._at_end:
+            return
+        rows = self._fetch_page(len(self._page_bounds) - 1)
+        if not rows:
+            self._at_end = True
+            return
+        first = self._row_count
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._append_page(rows)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        row = self._get_row(index.row())
+        if row is None:
+            return None
+        return row[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if (orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole
+                and 0 <= section < len(AUDIT_TABLE_HEADERS)):
+            return AUDIT_TABLE_HEADERS[section]
+        return super().headerData(section, orientation, role)
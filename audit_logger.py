@@ -1,15 +1,236 @@
 """
 Модуль для аудита действий пользователей
 Адаптирован под структуру krd.audit_log без хранения diff-значений (old/new).
+✅ ОПТИМИЗИРОВАНО: log_action не ждет БД — событие ставится в очередь, запись пачками в фоновом потоке
+   (многострочный INSERT по AUDIT_BATCH_SIZE событий или раз в AUDIT_FLUSH_INTERVAL_SEC)
+✅ ДОБАВЛЕНО: Локальный журнал (append-only) — неподтвержденные события переживают сбой и разрыв связи
+   и дописываются в БД при следующем запуске
 """
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
 
+from PyQt6.QtCore import QStandardPaths
 from PyQt6.QtSql import QSqlQuery
 
+from connection_pool import get_connection_pool
+
+
+AUDIT_BATCH_SIZE = 100
+AUDIT_FLUSH_INTERVAL_SEC = 2.0
+AUDIT_RETRY_MAX_SEC = 60
+AUDIT_JOURNAL_NAME = "audit_journal.jsonl"
+
+_EVENT_FIELDS = ("user_id", "username", "action_type", "table_name", "record_id", "krd_id", "created_at", "description")
+
+
+def default_journal_path():
+    """Журнал в каталоге данных приложения: рабочий каталог (Program Files) может быть недоступен для записи"""
+    base = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
+    directory = base or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, AUDIT_JOURNAL_NAME)
+
+
+class AuditJournal:
+    """
+    Локальный журнал событий аудита в формате JSONL (только дозапись).
+    Строка {"event": {...}} — новое событие, {"ack": [...]} — события записаны в БД.
+    Когда неподтвержденных событий не остается, файл обнуляется.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_journal_path()
+        self._lock = threading.Lock()
+        self._unacked = set()
+        self._file = None
+
+    def _ensure_open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def _write(self, record):
+        self._ensure_open()
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def append(self, event):
+        with self._lock:
+            self._unacked.add(event["event_id"])
+            self._write({"event": event})
+
+    def ack(self, event_ids):
+        with self._lock:
+            self._unacked.difference_update(event_ids)
+            try:
+                if self._unacked:
+                    self._write({"ack": list(event_ids)})
+                    return
+                # Все события в БД — журнал можно начать заново
+                if self._file is not None:
+                    self._file.close()
+                self._file = open(self.path, "w", encoding="utf-8")
+            except OSError as e:
+                # События уже в БД: при следующем запуске они дописались бы повторно, но запись в БД не прерываем
+                self._file = None
+                print(f"⚠️ Журнал аудита: не удалось отметить записанные события ({self.path}): {e}")
+
+    def load_pending(self):
+        """Неподтвержденные события из журнала прошлого запуска"""
+        if not os.path.exists(self.path):
+            return []
+        events, acked = {}, set()
+        with self._lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # Недописанная строка при аварийном завершении
+                        if "event" in record:
+                            events[record["event"]["event_id"]] = record["event"]
+                        elif "ack" in record:
+                            acked.update(record["ack"])
+            except OSError as e:
+                print(f"⚠️ Журнал аудита не прочитан ({self.path}): {e}")
+                return []
+            pending = [e for event_id, e in events.items() if event_id not in acked]
+            self._unacked.update(e["event_id"] for e in pending)
+        return pending
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class AuditWriter:
+    """Фоновый поток пакетной записи событий в krd.audit_log через арендованное подключение"""
+
+    _STOP = object()
+
+    def __init__(self, journal, pool, batch_size=AUDIT_BATCH_SIZE, flush_interval=AUDIT_FLUSH_INTERVAL_SEC):
+        self.journal = journal
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="AuditWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, event):
+        self._queue.put(event)
+
+    def flush(self, timeout=5.0):
+        """Ждет записи всех поставленных событий. Возвращает True, если все записано"""
+        done = threading.Event()
+        result = {}
+        self._queue.put((done, result))
+        return done.wait(timeout) and result.get("ok", False)
+
+    def stop(self, timeout=5.0):
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        pending, waiters = [], []
+        db = None
+        last_flush = time.monotonic()
+        retry_at, backoff = 0.0, 1.0
+        stopping = False
+
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            while item is not None:
+                if item is self._STOP:
+                    stopping = True
+                elif isinstance(item, tuple):
+                    waiters.append(item)
+                else:
+                    pending.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            now = time.monotonic()
+            due = (len(pending) >= self.batch_size or now - last_flush >= self.flush_interval
+                   or waiters or stopping)
+            if pending and due and (now >= retry_at or waiters or stopping):
+                try:
+                    if db is None:
+                        db = self.pool.acquire()
+                    while pending:
+                        batch = pending[:self.batch_size]
+                        self._insert_batch(db, batch)
+                        del pending[:len(batch)]
+                        self.journal.ack([e["event_id"] for e in batch])
+                    backoff = 1.0
+                except Exception as e:
+                    print(f"⚠️ Ошибка записи аудита ({len(pending)} событий в журнале): {e}")
+                    failed = True
+                else:
+                    failed = False
+                if failed:
+                    if db is not None:
+                        self.pool.release(db)
+                        db = None
+                        # Подключение могло оборваться — следующее будет открыто заново
+                        self.pool.close_thread_connections()
+                    retry_at = now + backoff
+                    backoff = min(backoff * 2, AUDIT_RETRY_MAX_SEC)
+                last_flush = now
+            elif due:
+                last_flush = now
+
+            for done, result in waiters:
+                result["ok"] = not pending
+                done.set()
+            waiters = []
+
+        if db is not None:
+            self.pool.release(db)
+            db = None
+        self.pool.close_thread_connections()
+
+    @staticmethod
+    def _insert_batch(db, events):
+        values_sql = ", ".join(
+            f"(:u{i}, :un{i}, :a{i}, :t{i}, :r{i}, :k{i}, CAST(:c{i} AS timestamp), :d{i})" for i in range(len(events))
+        )
+        query = QSqlQuery(db)
+        query.prepare(f"""
+            INSERT INTO krd.audit_log
+            (user_id, username, action_type, table_name, record_id, krd_id, created_at, description)
+            VALUES {values_sql}
+        """)
+        for i, e in enumerate(events):
+            query.bindValue(f":u{i}", e["user_id"])
+            query.bindValue(f":un{i}", e["username"])
+            query.bindValue(f":a{i}", e["action_type"])
+            query.bindValue(f":t{i}", e["table_name"])
+            query.bindValue(f":r{i}", e["record_id"])
+            query.bindValue(f":k{i}", e["krd_id"])
+            query.bindValue(f":c{i}", e["created_at"])
+            query.bindValue(f":d{i}", e["description"])
+        if not query.exec():
+            raise Exception(query.lastError().text())
+
 
 class AuditLogger:
     """Класс для логирования действий пользователей"""
     
-    def __init__(self, db_connection, user_info):
+    def __init__(self, db_connection, user_info, journal_path=None):
         """
         Args:
             db_connection: активное QSqlDatabase соединение
@@ -17,30 +238,69 @@ class AuditLogger:
         """
         self.db = db_connection
         self.user_info = user_info
+        self.journal = None
+        self.writer = None
+
+        try:
+            pool = get_connection_pool()
+        except RuntimeError:
+            pool = None  # Без пула (утилиты, отладка) — синхронная запись
+        if pool is not None:
+            self.journal = AuditJournal(journal_path)
+            replay = self.journal.load_pending()
+            self.writer = AuditWriter(self.journal, pool)
+            if replay:
+                print(f"📋 Аудит: дописываю {len(replay)} событий из локального журнала")
+                for event in replay:
+                    self.writer.submit(event)
     
     def log_action(self, action_type, table_name, record_id=None, krd_id=None, description=None):
-        """Базовый метод записи события в журнал аудита"""
+        """Базовый метод записи события в журнал аудита (без ожидания БД)"""
         try:
-            query = QSqlQuery(self.db)
-            query.prepare("""
-                INSERT INTO krd.audit_log 
-                (user_id, username, action_type, table_name, record_id, krd_id, description)
-                VALUES (:uid, :uname, :atype, :tname, :rid, :kid, :desc)
-            """)
-            query.bindValue(":uid", self.user_info.get('id'))
-            query.bindValue(":uname", self.user_info.get('username'))
-            query.bindValue(":atype", action_type)
-            query.bindValue(":tname", table_name)
-            query.bindValue(":rid", record_id)
-            query.bindValue(":kid", krd_id)
-            query.bindValue(":desc", description)
-            
-            if not query.exec():
-                print(f"⚠️ Ошибка логирования: {query.lastError().text()}")
+            event = {
+                "event_id": uuid.uuid4().hex,
+                "user_id": self.user_info.get('id'),
+                "username": self.user_info.get('username'),
+                "action_type": action_type,
+                "table_name": table_name,
+                "record_id": record_id,
+                "krd_id": krd_id,
+                # Время фиксируется в момент действия, а не в момент записи пачки
+                "created_at": datetime.now().isoformat(sep=" "),
+                "description": description,
+            }
+            if self.writer is None:
+                self._insert_now(event)
+                return
+            try:
+                self.journal.append(event)
+            except OSError as e:
+                # Без локальной копии событие все равно уходит в БД
+                print(f"⚠️ Журнал аудита недоступен ({self.journal.path}): {e}")
+            self.writer.submit(event)
                 
         except Exception as e:
             print(f"⚠️ Критическая ошибка в логгере аудита: {e}")
 
+    def _insert_now(self, event):
+        try:
+            AuditWriter._insert_batch(self.db, [event])
+        except Exception as e:
+            print(f"⚠️ Ошибка логирования: {e}")
+
+    def flush(self, timeout=5.0):
+        """Дожидается записи накопленных событий в БД"""
+        return self.writer.flush(timeout) if self.writer else True
+
+    def close(self, timeout=5.0):
+        """Записывает накопленное и останавливает фоновый поток (незаписанное остается в журнале)"""
+        if self.writer is None:
+            return
+        self.writer.flush(timeout)
+        self.writer.stop(timeout)
+        self.writer = None
+        self.journal.close()
+
     # ========================
     # МЕТОДЫ АУДИТА КРД
     # ========================
@@ -0,0 +1,190 @@
+"""
+Секционирование журнала аудита krd.audit_log по месяцам
+✅ ДОБАВЛЕНО: Однократный перенос krd.audit_log в секционированную таблицу (RANGE по created_at)
+✅ ДОБАВЛЕНО: krd.audit_log_ensure_partition — создание секции месяца (строки из DEFAULT переносятся)
+✅ ДОБАВЛЕНО: Индексы под фильтры окна аудита и keyset-пагинацию по (created_at, id)
+✅ ДОБАВЛЕНО: Хранение AUDIT_RETENTION_MONTHS месяцев; старые секции отсоединяются в схему krd_archive
+Перенос и обслуживание выполняет migrate_db.py (администратор, по расписанию); клиент при запуске
+только проверяет, что журнал секционирован (check_audit_partitioning).
+"""
+from datetime import date
+
+from PyQt6.QtSql import QSqlQuery
+
+
+AUDIT_MONTHS_AHEAD = 2          # Секции создаются заранее на текущий и следующие месяцы
+AUDIT_RETENTION_MONTHS = 36     # Секции старше отсоединяются в архив
+AUDIT_ARCHIVE_SCHEMA = "krd_archive"
+
+# Ключ advisory lock: обслуживание выполняет только один клиент одновременно
+_MAINTENANCE_LOCK_KEY = 7204101
+
+_ENSURE_PARTITION_FUNCTION = """
+    CREATE OR REPLACE FUNCTION krd.audit_log_ensure_partition(p_month date) RETURNS void AS $$
+    DECLARE
+        v_start date := date_trunc('month', p_month)::date;
+        v_end date := (date_trunc('month', p_month) + interval '1 month')::date;
+        v_name text := format('audit_log_y%sm%s', to_char(v_start, 'YYYY'), to_char(v_start, 'MM'));
+    BEGIN
+        IF to_regclass('krd.' || v_name) IS NOT NULL THEN
+            RETURN;
+        END IF;
+        EXECUTE format('CREATE TABLE krd.%I (LIKE krd.audit_log INCLUDING DEFAULTS)', v_name);
+        -- События этого месяца, попавшие в DEFAULT до создания секции
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM krd.audit_log_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO krd.%I SELECT * FROM moved', v_start, v_end, v_name);
+        EXECUTE format('ALTER TABLE krd.audit_log ATTACH PARTITION krd.%I FOR VALUES FROM (%L) TO (%L)',
+                       v_name, v_start, v_end);
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+_MIGRATION_STEPS = [
+    "ALTER SEQUENCE krd.audit_log_id_seq OWNED BY NONE",
+    "ALTER TABLE krd.audit_log RENAME TO audit_log_legacy",
+    # Имя первичного ключа освобождается для новой таблицы
+    """
+    DO $$ BEGIN
+        IF to_regclass('krd.audit_log_pkey') IS NOT NULL THEN
+            ALTER INDEX krd.audit_log_pkey RENAME TO audit_log_legacy_pkey;
+        END IF;
+    END $$
+    """,
+    """
+    CREATE TABLE krd.audit_log (
+        id integer NOT NULL DEFAULT nextval('krd.audit_log_id_seq'::regclass),
+        user_id integer NOT NULL,
+        username character varying(100) NOT NULL,
+        action_type character varying(50) NOT NULL,
+        table_name character varying(100) NOT NULL,
+        record_id integer,
+        krd_id integer,
+        created_at timestamp without time zone NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        description text,
+        PRIMARY KEY (created_at, id)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    "COMMENT ON TABLE krd.audit_log IS 'Журнал аудита действий пользователей (секции по месяцам)'",
+    "CREATE TABLE krd.audit_log_default PARTITION OF krd.audit_log DEFAULT",
+    _ENSURE_PARTITION_FUNCTION,
+    """
+    SELECT krd.audit_log_ensure_partition(m::date)
+    FROM generate_series(
+        date_trunc('month', (SELECT COALESCE(MIN(created_at), CURRENT_TIMESTAMP) FROM krd.audit_log_legacy)),
+        date_trunc('month', CURRENT_TIMESTAMP), interval '1 month') AS m
+    """,
+    """
+    INSERT INTO krd.audit_log (id, user_id, username, action_type, table_name, record_id, krd_id, created_at, description)
+    SELECT id, user_id, username, action_type, table_name, record_id, krd_id,
+           COALESCE(created_at, CURRENT_TIMESTAMP), description
+    FROM krd.audit_log_legacy
+    """,
+    "DROP TABLE krd.audit_log_legacy",
+    "ALTER SEQUENCE krd.audit_log_id_seq OWNED BY krd.audit_log.id",
+    # Keyset-пагинация окна аудита и фильтры по пользователю/типу в пределах периода
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_created_id ON krd.audit_log (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_user_created ON krd.audit_log (user_id, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_action_created ON krd.audit_log (action_type, created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_log_krd_id ON krd.audit_log (krd_id)",
+]
+
+
+def _exec(db, sql):
+    query = QSqlQuery(db)
+    if not query.exec(sql):
+        raise Exception(f"{query.lastError().text()}\n📝 SQL: {sql.strip()[:200]}")
+    return query
+
+
+def _is_partitioned(db):
+    query = _exec(db, "SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass('krd.audit_log')")
+    return query.next() and query.value(0) == 'p'
+
+
+def _add_months(day, months):
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def install_audit_partitioning(db):
+    """Переносит krd.audit_log в секционированную таблицу (однократно, в одной транзакции)"""
+    if _is_partitioned(db):
+        return False
+    print("🧱 [AUDIT] Перевод krd.audit_log на секции по месяцам...")
+    if not db.transaction():
+        raise Exception(f"Не удалось начать транзакцию: {db.lastError().text()}")
+    try:
+        _exec(db, f"SELECT pg_advisory_xact_lock({_MAINTENANCE_LOCK_KEY})")
+        # Другой клиент мог завершить перенос, пока мы ждали блокировку
+        if not _is_partitioned(db):
+            for step in _MIGRATION_STEPS:
+                _exec(db, step)
+        if not db.commit():
+            raise Exception(db.lastError().text())
+    except Exception:
+        db.rollback()
+        raise
+    print("✅ [AUDIT] Журнал аудита секционирован")
+    return True
+
+
+def ensure_audit_partitions(db, months_ahead=AUDIT_MONTHS_AHEAD):
+    """Создает секции на текущий и следующие months_ahead месяцев"""
+    today = date.today().replace(day=1)
+    for offset in range(months_ahead + 1):
+        month = _add_months(today, offset)
+        _exec(db, f"SELECT krd.audit_log_ensure_partition(DATE '{month.isoformat()}')")
+
+
+def archive_old_audit_partitions(db, retention_months=AUDIT_RETENTION_MONTHS):
+    """
+    Отсоединяет секции старше retention_months и переносит их в схему krd_archive
+    (данные сохраняются, но не участвуют в запросах окна аудита). Возвращает имена секций.
+    """
+    cutoff = _add_months(date.today().replace(day=1), -retention_months)
+    cutoff_name = f"audit_log_y{cutoff.year:04d}m{cutoff.month:02d}"
+    query = _exec(db, """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'krd.audit_log'::regclass AND c.relname ~ '^audit_log_y[0-9]{4}m[0-9]{2}$'
+        ORDER BY c.relname
+    """)
+    # Имена секций сортируются как даты: audit_log_yYYYYmMM
+    expired = []
+    while query.next():
+        if query.value(0) < cutoff_name:
+            expired.append(query.value(0))
+    if not expired:
+        return []
+    _exec(db, f"CREATE SCHEMA IF NOT EXISTS {AUDIT_ARCHIVE_SCHEMA}")
+    for name in expired:
+        _exec(db, f"ALTER TABLE krd.audit_log DETACH PARTITION krd.{name}")
+        _exec(db, f"ALTER TABLE krd.{name} SET SCHEMA {AUDIT_ARCHIVE_SCHEMA}")
+        print(f"📦 [AUDIT] Секция {name} перенесена в {AUDIT_ARCHIVE_SCHEMA}")
+    return expired
+
+
+def run_audit_maintenance(db):
+    """Обслуживание (migrate_db.py по расписанию): секции вперед и архивирование старых"""
+    query = _exec(db, f"SELECT pg_try_advisory_lock({_MAINTENANCE_LOCK_KEY})")
+    if not (query.next() and query.value(0)):
+        print("ℹ️ [AUDIT] Обслуживание секций уже выполняется другим процессом")
+        return
+    try:
+        ensure_audit_partitions(db)
+        archive_old_audit_partitions(db)
+    finally:
+        _exec(db, f"SELECT pg_advisory_unlock({_MAINTENANCE_LOCK_KEY})")
+
+
+def check_audit_partitioning(db):
+    """Проверка при запуске клиента (без DDL): журнал аудита переведен на секции"""
+    try:
+        if _is_partitioned(db):
+            return True
+    except Exception as e:
+        print(f"⚠️ [AUDIT] Не удалось проверить секционирование журнала аудита: {e}")
+        return False
+    print("⚠️ [AUDIT] Журнал аудита не секционирован — выполните migrate_db.py")
+    return False
@@ -1,6 +1,9 @@
 """
 Вспомогательный модуль для настройки автодополнения в текстовых полях
 Поддержка QLineEdit и AutoCompleteTextEdit
+✅ ОПТИМИЗИРОВАНО: SuggestionIndex — общий на процесс индекс подсказок, SELECT DISTINCT по колонке — один раз за сеанс
+✅ ОПТИМИЗИРОВАНО: Сохраненные значения добавляются в индекс без повторного чтения из БД
+✅ ОПТИМИЗИРОВАНО: Подсказки ищет SuggestionMatcher (префикс + триграммы, top-k) вместо линейного фильтра QCompleter
 """
 import re
 from PyQt6.QtWidgets import (
@@ -12,6 +15,8 @@ from PyQt6.QtGui import QColor, QFont, QTextOption
 from PyQt6.QtCore import Qt, QPoint, pyqtSignal, QEvent, QTimer, QSize, QStringListModel
 from PyQt6.QtSql import QSqlQuery
 
+from suggestion_matcher import SuggestionMatcher
+
 
 class AutoCompletePopup(QFrame):
     """
@@ -158,7 +163,7 @@ class AutoCompleteTextEdit(QTextEdit):
         self.setWordWrapMode(QTextOption.WrapMode.WordWrap)
         
         # Автодополнение
-        self._autocomplete_values = []
+        self._matcher = None
         self._autocomplete_popup = None
         self._autocomplete_max_items = 15
         self._autocomplete_case_sensitive = False
@@ -212,28 +217,12 @@ class AutoCompleteTextEdit(QTextEdit):
         self._autocomplete_popup.item_selected.connect(self._on_item_selected)
     
     def _load_autocomplete_values(self):
-        """Загрузка значений из базы данных"""
+        """Индекс значений из общего SuggestionIndex (новые значения появляются без перезагрузки)"""
         if not self._db_connection or not self._table_name or not self._column_name:
             return
-        
-        if not re.match(r'^\w+$', self._table_name) or not re.match(r'^\w+$', self._column_name):
-            return
-        
-        query = QSqlQuery(self._db_connection)
-        query.prepare(f"""
-            SELECT DISTINCT {self._column_name} 
-            FROM krd.{self._table_name} 
-            WHERE {self._column_name} IS NOT NULL 
-              AND TRIM({self._column_name}) != ''
-            ORDER BY {self._column_name}
-        """)
-        
-        if query.exec():
-            self._autocomplete_values = []
-            while query.next():
-                val = query.value(0)
-                if val and str(val).strip():
-                    self._autocomplete_values.append(str(val))
+        self._matcher = SuggestionIndex.instance().matcher(
+            self._db_connection, self._table_name, self._column_name
+        )
     
     def _on_text_changed(self):
         """Обработка изменения текста"""
@@ -258,17 +247,10 @@ class AutoCompleteTextEdit(QTextEdit):
     
     def _show_popup(self, current_word):
         """Показать всплывающее окно с вариантами"""
-        if not self._autocomplete_popup or not self._autocomplete_values:
+        if not self._autocomplete_popup or self._matcher is None:
             return
         
-        # Фильтруем значения
-        if self._autocomplete_case_sensitive:
-            filtered = [v for v in self._autocomplete_values if current_word in v]
-        else:
-            filtered = [v for v in self._autocomplete_values if current_word.lower() in v.lower()]
-        
-        # Ограничиваем количество
-        filtered = filtered[:self._autocomplete_max_items]
+        filtered = self._matcher.match(current_word, self._autocomplete_max_items)
         
         if filtered:
             self._autocomplete_popup.set_items(filtered, current_word)
@@ -325,7 +307,76 @@ class AutoCompleteTextEdit(QTextEdit):
     
     def refresh_values(self):
         """Обновить значения автодополнения из БД"""
-        self._load_autocomplete_values()
+        if self._db_connection and self._table_name and self._column_name:
+            SuggestionIndex.instance().reload(self._db_connection, [(self._table_name, self._column_name)])
+
+
+def _load_unique_values(db, table_name, column_name):
+    """Загрузка уникальных значений колонки из базы данных"""
+    if not re.match(r'^\w+$', table_name) or not re.match(r'^\w+$', column_name):
+        return []
+    
+    query = QSqlQuery(db)
+    query.prepare(f"""
+        SELECT DISTINCT {column_name} 
+        FROM krd.{table_name} 
+        WHERE {column_name} IS NOT NULL 
+          AND TRIM({column_name}) != ''
+    """)
+    
+    if not query.exec():
+        return []
+    
+    values = []
+    while query.next():
+        val = query.value(0)
+        if val and str(val).strip():
+            values.append(str(val))
+    return values
+
+
+class SuggestionIndex:
+    """
+    Общий для всех окон индекс подсказок (один на процесс).
+    Для каждой пары (таблица, колонка) — SuggestionMatcher (префиксный массив + триграммы).
+    Используется только из GUI-потока.
+    """
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._matchers = {}   # {(таблица, колонка): SuggestionMatcher}
+
+    def matcher(self, db, table_name, column_name):
+        """Индекс значений колонки (загружается из БД при первом обращении)"""
+        key = (table_name, column_name)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = SuggestionMatcher(_load_unique_values(db, table_name, column_name))
+            self._matchers[key] = matcher
+        return matcher
+
+    def add_value(self, table_name, column_name, value):
+        """Добавляет сохраненное значение в загруженный индекс. True — значение новое"""
+        matcher = self._matchers.get((table_name, column_name))
+        if matcher is None or not isinstance(value, str) or not value.strip():
+            return False
+        return matcher.add(value.strip())
+
+    def reload(self, db, keys=None):
+        """Полное перечитывание указанных (или всех загруженных) колонок из БД"""
+        for key in list(keys if keys is not None else self._matchers):
+            values = _load_unique_values(db, *key)
+            matcher = self._matchers.get(key)
+            if matcher is None:
+                self._matchers[key] = SuggestionMatcher(values)
+            else:
+                matcher.rebuild(values)  # Виджеты держат ссылку на тот же объект
 
 
 class AutocompleteHelper:
@@ -333,38 +384,29 @@ class AutocompleteHelper:
     
     def __init__(self, db_connection):
         self.db = db_connection
-        self._cache = {}
+        self.index = SuggestionIndex.instance()
         self._field_refs = []
     
     def setup_autocomplete(self, widget, table_name, column_name, max_items=15, 
                           case_sensitive=False, show_on_focus=True):
         """
         Настройка автодополнения для QLineEdit или AutoCompleteTextEdit
+        (case_sensitive оставлен для совместимости — поиск всегда без учета регистра)
         """
         from PyQt6.QtWidgets import QLineEdit
         
-        cache_key = f"{table_name}_{column_name}"
-        
-        if cache_key in self._cache:
-            values = self._cache[cache_key]
-        else:
-            values = self._load_unique_values(table_name, column_name)
-            self._cache[cache_key] = values
+        matcher = self.index.matcher(self.db, table_name, column_name)
         
         # Регистрируем поле
         self._field_refs.append({
             'widget': widget,
             'table': table_name,
             'column': column_name,
-            'max_items': max_items,
-            'case_sensitive': case_sensitive,
-            'show_on_focus': show_on_focus,
-            'values': values
         })
         
         # Настраиваем в зависимости от типа виджета
         if isinstance(widget, QLineEdit):
-            self._setup_line_edit(widget, values, max_items, case_sensitive, show_on_focus)
+            self._setup_line_edit(widget, matcher, max_items, show_on_focus)
         elif isinstance(widget, AutoCompleteTextEdit):
             widget.setup_autocomplete(
                 self.db, table_name, column_name,
@@ -373,25 +415,25 @@ class AutocompleteHelper:
                 show_on_focus=show_on_focus
             )
         
-        print(f"✅ Настроено: {table_name}.{column_name} ({len(values)} значений)")
+        print(f"✅ Настроено: {table_name}.{column_name} ({len(matcher)} значений)")
         return widget
     
-    def _setup_line_edit(self, line_edit, values, max_items, case_sensitive, show_on_focus):
-        """Настройка автодополнения для QLineEdit"""
-        if not values:
-            return
-        
-        model = QStringListModel(values, line_edit)
+    def _setup_line_edit(self, line_edit, matcher, max_items, show_on_focus):
+        """
+        Настройка автодополнения для QLineEdit: модель совпадений заполняет SuggestionMatcher,
+        QCompleter показывает ее без собственной фильтрации
+        """
+        model = QStringListModel(line_edit)
         completer = QCompleter(model, line_edit)
-        
-        completer.setCaseSensitivity(
-            Qt.CaseSensitivity.CaseSensitive if case_sensitive 
-            else Qt.CaseSensitivity.CaseInsensitive
-        )
-        completer.setFilterMode(Qt.MatchFlag.MatchContains)
+        completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
         completer.setMaxVisibleItems(max_items)
-        completer.setCompletionMode(QCompleter.CompletionMode.PopupCompletion)
+        completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        
+        def update_matches(text):
+            model.setStringList(matcher.match(text, max_items))
         
+        # textEdited приходит раньше, чем QLineEdit открывает popup completer'а
+        line_edit.textEdited.connect(update_matches)
         line_edit.setCompleter(completer)
         
         if show_on_focus:
@@ -402,76 +444,39 @@ class AutocompleteHelper:
                 original_focus = line_edit.focusInEvent
                 original_mouse = line_edit.mousePressEvent
                 
-                def new_focus(event):
-                    original_focus(event)
+                def show_all():
                     if len(line_edit.text()) <= 1:
+                        update_matches("")
                         completer.setCompletionPrefix("")
                         completer.complete()
                 
+                def new_focus(event):
+                    original_focus(event)
+                    show_all()
+                
                 def new_mouse(event):
                     original_mouse(event)
-                    if len(line_edit.text()) <= 1:
-                        completer.setCompletionPrefix("")
-                        completer.complete()
+                    show_all()
                 
                 line_edit.focusInEvent = new_focus
                 line_edit.mousePressEvent = new_mouse
     
-    def _load_unique_values(self, table_name, column_name):
-        """Загрузка уникальных значений из базы данных"""
-        if not re.match(r'^\w+$', table_name) or not re.match(r'^\w+$', column_name):
-            return []
-        
-        query = QSqlQuery(self.db)
-        query.prepare(f"""
-            SELECT DISTINCT {column_name} 
-            FROM krd.{table_name} 
-            WHERE {column_name} IS NOT NULL 
-              AND TRIM({column_name}) != ''
-            ORDER BY {column_name}
-        """)
-        
-        if not query.exec():
-            return []
-        
-        values = []
-        while query.next():
-            val = query.value(0)
-            if val and str(val).strip():
-                values.append(str(val))
-        
-        return values
-    
-    def clear_cache(self):
-        """Очистка кэша"""
-        self._cache.clear()
+    def add_saved_values(self, data):
+        """
+        Добавляет сохраненные значения ({колонка: значение}) в общий индекс подсказок —
+        вместо повторного SELECT DISTINCT после каждого сохранения
+        """
+        added = 0
+        for field_ref in self._field_refs:
+            value = data.get(field_ref['column'])
+            if self.index.add_value(field_ref['table'], field_ref['column'], value):
+                added += 1
+        if added:
+            print(f"✅ Добавлено {added} новых значений автодополнения")
     
     def refresh_all_fields(self):
-        """Обновление всех полей автодополнения"""
+        """Обновление всех полей автодополнения из БД"""
         print("🔄 Обновление данных автодополнения...")
-        
-        updated_count = 0
-        for field_ref in self._field_refs:
-            widget = field_ref['widget']
-            table_name = field_ref['table']
-            column_name = field_ref['column']
-            cache_key = f"{table_name}_{column_name}"
-            
-            from PyQt6.QtWidgets import QLineEdit
-            
-            values = self._load_unique_values(table_name, column_name)
-            self._cache[cache_key] = values
-            field_ref['values'] = values
-            
-            if isinstance(widget, QLineEdit):
-                completer = widget.completer()
-                if completer:
-                    model = completer.model()
-                    if isinstance(model, QStringListModel):
-                        model.setStringList(values)
-                        updated_count += 1
-            elif isinstance(widget, AutoCompleteTextEdit):
-                widget._autocomplete_values = values
-                updated_count += 1
-        
-        print(f"✅ Обновлено {updated_count} полей автодополнения")
\ No newline at end of file
+        keys = {(ref['table'], ref['column']) for ref in self._field_refs}
+        self.index.reload(self.db, keys)
+        print(f"✅ Обновлено {len(keys)} полей автодополнения")
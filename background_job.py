@@ -0,0 +1,205 @@
+"""
+Фоновые задания на подключении из пула
+✅ ДОБАВЛЕНО: PooledWorker — выполняет задачу в отдельном QThread со своим подключением к БД
+   (QSqlDatabase нельзя использовать из другого потока, поэтому подключение арендуется из пула в рабочем потоке)
+✅ ДОБАВЛЕНО: BackgroundJob — поток, рабочий объект, отмена и обработчики результата в GUI-потоке
+✅ ДОБАВЛЕНО: ProgressDialogJob — то же с окном прогресса и кнопкой отмены
+Используется экспортом отчета, выгрузкой журнала аудита и пакетной генерацией документов.
+"""
+import time
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, Qt
+from PyQt6.QtWidgets import QProgressDialog, QMessageBox
+
+from connection_pool import get_connection_pool
+
+
+# Не чаще одного обновления прогресса за этот интервал (сигналы идут через очередь GUI-потока)
+PROGRESS_INTERVAL_SEC = 0.2
+
+# Задания, живущие без владельца (detached): держим ссылки, пока поток не завершится
+_active_jobs = set()
+
+
+class PooledWorker(QObject):
+    """
+    Выполняется в рабочем потоке. Сигналы доставляются в GUI-поток через очередь.
+    task(db, report, cancel_check) -> результат; report(готово, всего, *доп. значения) — прогресс.
+    Исключения из cancel_exceptions означают отмену, остальные — ошибку.
+    """
+    progress = pyqtSignal(int, int, object, float)   # готово, всего, доп. значения, секунд с начала
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, task, cancel_exceptions=()):
+        super().__init__()
+        self.task = task
+        self.cancel_exceptions = tuple(cancel_exceptions)
+        self._cancel_requested = False
+        self._started = 0.0
+        self._last_emit = 0.0
+
+    def cancel(self):
+        self._cancel_requested = True
+
+    def is_cancel_requested(self):
+        return self._cancel_requested
+
+    def run(self):
+        pool = get_connection_pool()
+        try:
+            self._run(pool)
+        finally:
+            # Поток задания завершается — его подключения больше не понадобятся
+            pool.close_thread_connections()
+
+    def _run(self, pool):
+        try:
+            db = pool.acquire()
+        except Exception as e:
+            self.failed.emit(f"Не удалось получить подключение к БД: {e}")
+            return
+        try:
+            self._started = time.perf_counter()
+            result = self.task(db, self._report, self.is_cancel_requested)
+            self.finished.emit(result)
+        except self.cancel_exceptions:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            pool.release(db)
+
+    def _report(self, done, total, *extra):
+        now = time.perf_counter()
+        if done < total and now - self._last_emit < PROGRESS_INTERVAL_SEC:
+            return
+        self._last_emit = now
+        self.progress.emit(done, total, extra, now - self._started)
+
+
+class BackgroundJob(QObject):
+    """
+    Задание в GUI-потоке: владеет потоком и рабочим объектом.
+    Подклассы переопределяют on_progress / on_finished / on_failed / on_cancelled.
+    detached=True — задание живет без владельца и удаляется после завершения.
+    """
+
+    def __init__(self, task, parent=None, cancel_exceptions=(), detached=False):
+        super().__init__(parent)
+        self.parent_widget = parent
+        self.detached = detached
+
+        self.thread = QThread()
+        self.worker = PooledWorker(task, cancel_exceptions)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.on_progress)
+        self.worker.finished.connect(self._on_worker_finished)
+        self.worker.failed.connect(self._on_worker_failed)
+        self.worker.cancelled.connect(self._on_worker_cancelled)
+        self._running = False
+
+    def start(self):
+        if self.detached:
+            _active_jobs.add(self)
+        self._running = True
+        self.thread.start()
+
+    def is_running(self):
+        return self._running
+
+    def cancel(self):
+        self.worker.cancel()
+
+    def wait(self):
+        """Отменяет и дожидается завершения потока (при закрытии окна или приложения)"""
+        self.worker.cancel()
+        self.thread.quit()
+        self.thread.wait()
+
+    def on_progress(self, done, total, extra, elapsed):
+        pass
+
+    def on_finished(self, result):
+        pass
+
+    def on_failed(self, message):
+        pass
+
+    def on_cancelled(self):
+        pass
+
+    def _on_worker_finished(self, result):
+        self._finish()
+        self.on_finished(result)
+
+    def _on_worker_failed(self, message):
+        self._finish()
+        self.on_failed(message)
+
+    def _on_worker_cancelled(self):
+        self._finish()
+        self.on_cancelled()
+
+    def _finish(self):
+        self._running = False
+        self.thread.quit()
+        self.thread.wait()
+        if self.detached:
+            _active_jobs.discard(self)
+            self.deleteLater()
+
+
+class ProgressDialogJob(BackgroundJob):
+    """Задание с окном прогресса; тексты — атрибуты класса, строка прогресса — progress_text()"""
+    window_title = ""
+    start_text = "Подготовка..."
+    cancel_text = "⏳ Отмена..."
+    error_text = "Ошибка"
+    modality = Qt.WindowModality.NonModal
+
+    def __init__(self, task, parent=None, cancel_exceptions=(), detached=False, maximum=0):
+        super().__init__(task, parent, cancel_exceptions, detached)
+        self.progress_dialog = QProgressDialog(self.start_text, "Отмена", 0, maximum, parent)
+        self.progress_dialog.setWindowTitle(self.window_title)
+        self.progress_dialog.setWindowModality(self.modality)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.setMinimumDuration(0)
+        self.progress_dialog.canceled.connect(self.cancel)
+
+    def start(self):
+        self.progress_dialog.show()
+        super().start()
+
+    def cancel(self):
+        self.progress_dialog.setLabelText(self.cancel_text)
+        self.progress_dialog.setCancelButton(None)
+        super().cancel()
+
+    def progress_text(self, done, total, extra, elapsed):
+        return f"{done} из {total}"
+
+    def on_progress(self, done, total, extra, elapsed):
+        if total:
+            self.progress_dialog.setMaximum(total)
+        self.progress_dialog.setValue(done)
+        self.progress_dialog.setLabelText(self.progress_text(done, total, extra, elapsed))
+
+    def on_failed(self, message):
+        QMessageBox.critical(self.parent_widget, "Ошибка", f"❌ {self.error_text}:\n{message}")
+
+    def _finish(self):
+        # close() у QProgressDialog выдает canceled — задание уже завершено
+        self.progress_dialog.canceled.disconnect(self.cancel)
+        self.progress_dialog.close()
+        super()._finish()
+
+
+def stop_active_jobs():
+    """Прерывает все задания без владельца (вызывается при закрытии главного окна)"""
+    for job in list(_active_jobs):
+        job.wait()
+        _active_jobs.discard(job)
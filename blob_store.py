@@ -0,0 +1,307 @@
+"""
+Хранилище файлов по содержимому (шаблоны, сгенерированные запросы, файлы ответов)
+✅ ОПТИМИЗИРОВАНО: Файл хранится один раз по SHA-256 в krd.blobs/krd.blob_chunks, таблицы ссылаются на хеш
+✅ ОПТИМИЗИРОВАНО: Фрагменты по BLOB_CHUNK_SIZE, zlib — только если сжатие дает выигрыш (docx/pdf/jpg уже сжаты)
+✅ ОПТИМИЗИРОВАНО: Проверка наличия (EXISTS) до загрузки — повторный файл не передается на сервер
+✅ ДОБАВЛЕНО: Потоковая выгрузка в файл по фрагментам
+✅ ДОБАВЛЕНО: Схему, перенос BYTEA из таблиц (порциями) и удаление файлов без ссылок выполняет migrate_db.py,
+   клиент при запуске только проверяет, что хранилище создано
+"""
+import hashlib
+import math
+import os
+import zlib
+
+from PyQt6.QtCore import QByteArray
+from PyQt6.QtSql import QSqlQuery
+
+
+BLOB_CHUNK_SIZE = 256 * 1024
+# Фрагмент хранится сжатым, если zlib уменьшает его хотя бы на 5%
+MIN_COMPRESSION_RATIO = 0.95
+# Сколько строк таблицы переносится в хранилище одним UPDATE (короткие блокировки строк)
+MIGRATION_BATCH_SIZE = 100
+# Файлы без ссылок удаляются не раньше этого срока: клиент записывает файл до строки, которая на него сошлется
+BLOB_GC_GRACE_PERIOD = '1 day'
+
+# (таблица, колонка BYTEA, колонка ссылки на хеш)
+BLOB_COLUMNS = [
+    ('document_templates', 'template_data', 'template_hash'),
+    ('outgoing_requests', 'document_data', 'document_hash'),
+    ('outgoing_requests', 'response_data', 'response_hash'),
+]
+
+# Строка krd.blobs появляется после всех фрагментов: ее наличие означает, что файл записан полностью
+_PUT_FUNCTION = """
+    CREATE OR REPLACE FUNCTION krd.blob_put(p_data bytea, p_chunk_size integer DEFAULT 262144)
+    RETURNS text AS $$
+    DECLARE
+        v_hash text := encode(sha256(p_data), 'hex');
+        v_size bigint := octet_length(p_data);
+        v_chunks integer := GREATEST(1, ceil(octet_length(p_data)::numeric / p_chunk_size)::integer);
+    BEGIN
+        IF EXISTS (SELECT 1 FROM krd.blobs WHERE hash = v_hash) THEN
+            RETURN v_hash;
+        END IF;
+        INSERT INTO krd.blob_chunks (hash, chunk_no, compressed, data)
+        SELECT v_hash, n, FALSE, substring(p_data FROM n * p_chunk_size + 1 FOR p_chunk_size)
+        FROM generate_series(0, v_chunks - 1) n
+        ON CONFLICT DO NOTHING;
+        INSERT INTO krd.blobs (hash, size, chunk_count) VALUES (v_hash, v_size, v_chunks)
+        ON CONFLICT DO NOTHING;
+        RETURN v_hash;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+_STORAGE_MIGRATION = [
+    """
+    CREATE TABLE IF NOT EXISTS krd.blobs (
+        hash text PRIMARY KEY,
+        size bigint NOT NULL,
+        chunk_count integer NOT NULL,
+        created_at timestamp NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS krd.blob_chunks (
+        hash text NOT NULL,
+        chunk_no integer NOT NULL,
+        compressed boolean NOT NULL,
+        data bytea NOT NULL,
+        created_at timestamp NOT NULL DEFAULT now(),
+        PRIMARY KEY (hash, chunk_no)
+    )
+    """,
+    # Для хранилищ, созданных до сборки мусора (значение по умолчанию не переписывает таблицу)
+    "ALTER TABLE krd.blob_chunks ADD COLUMN IF NOT EXISTS created_at timestamp NOT NULL DEFAULT now()",
+    _PUT_FUNCTION,
+    "ALTER TABLE krd.document_templates ALTER COLUMN template_data DROP NOT NULL",
+] + [
+    f"ALTER TABLE krd.{table} ADD COLUMN IF NOT EXISTS {hash_column} text REFERENCES krd.blobs(hash)"
+    for table, _, hash_column in BLOB_COLUMNS
+] + [
+    # Проверка ссылок при удалении из krd.blobs (внешний ключ и сборка мусора) — по индексу
+    f"CREATE INDEX IF NOT EXISTS idx_{table}_{hash_column} ON krd.{table} ({hash_column})"
+    for table, _, hash_column in BLOB_COLUMNS
+]
+
+
+def _exec(db, sql):
+    query = QSqlQuery(db)
+    if not query.exec(sql):
+        raise Exception(f"{query.lastError().text()}\n📝 SQL: {sql.strip()[:200]}")
+    return query
+
+
+def install_blob_storage(db):
+    """Миграция (migrate_db.py): таблицы хранилища, функция записи и ссылки на хеш в таблицах"""
+    for sql in _STORAGE_MIGRATION:
+        _exec(db, sql)
+
+
+def check_blob_storage(db):
+    """Проверка при запуске клиента (без DDL): хранилище и ссылки на хеш созданы"""
+    query = QSqlQuery(db)
+    query.prepare("""
+        SELECT to_regclass('krd.blobs') IS NOT NULL AND to_regclass('krd.blob_chunks') IS NOT NULL,
+               (SELECT count(*) FROM information_schema.columns
+                WHERE table_schema = 'krd' AND table_name || '.' || column_name = ANY(CAST(:columns AS text[])))
+    """)
+    query.bindValue(":columns", "{" + ",".join(f"{table}.{hash_column}" for table, _, hash_column in BLOB_COLUMNS) + "}")
+    if not query.exec() or not query.next():
+        print(f"⚠️ [BLOB] Не удалось проверить хранилище файлов: {query.lastError().text()}")
+        return False
+    if not query.value(0) or query.value(1) != len(BLOB_COLUMNS):
+        print("⚠️ [BLOB] Хранилище файлов не создано — выполните migrate_db.py")
+        return False
+    return True
+
+
+def migrate_inline_blobs(db, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Миграция (migrate_db.py): переносит все BYTEA-колонки в хранилище (целиком на сервере).
+    Порции по batch_size строк — каждая фиксируется отдельно и держит блокировки недолго.
+    """
+    for table, data_column, hash_column in BLOB_COLUMNS:
+        q = QSqlQuery(db)
+        q.prepare(f"""
+            UPDATE krd.{table}
+            SET {hash_column} = krd.blob_put({data_column}, :chunk_size), {data_column} = NULL
+            WHERE id IN (SELECT id FROM krd.{table}
+                         WHERE {hash_column} IS NULL AND {data_column} IS NOT NULL LIMIT :limit)
+        """)
+        moved = 0
+        while True:
+            q.bindValue(":chunk_size", BLOB_CHUNK_SIZE)
+            q.bindValue(":limit", batch_size)
+            if not q.exec():
+                raise Exception(f"Ошибка переноса {table}.{data_column}: {q.lastError().text()}")
+            if q.numRowsAffected() <= 0:
+                break
+            moved += q.numRowsAffected()
+        if moved:
+            print(f"📦 [BLOB] {table}.{data_column}: перенесено в хранилище {moved} файлов")
+
+
+def collect_unreferenced_blobs(db, grace_period=BLOB_GC_GRACE_PERIOD):
+    """
+    Обслуживание (migrate_db.py --maintenance): удаляет файлы, на которые не ссылается ни одна таблица
+    (удаленные запросы, замененные шаблоны и ответы), и фрагменты недописанных файлов.
+    Файлы моложе grace_period не трогаются — клиент мог записать файл и еще не сохранить ссылку.
+    Возвращает (файлов, фрагментов) удалено.
+    """
+    references = "\n".join(
+        f"AND NOT EXISTS (SELECT 1 FROM krd.{table} t WHERE t.{hash_column} = b.hash)"
+        for table, _, hash_column in BLOB_COLUMNS
+    )
+    if not db.transaction():
+        raise Exception(f"Не удалось начать транзакцию: {db.lastError().text()}")
+    try:
+        q_blobs = QSqlQuery(db)
+        q_blobs.prepare(f"""
+            DELETE FROM krd.blobs b
+            WHERE b.created_at < now() - CAST(:grace AS interval)
+            {references}
+        """)
+        q_blobs.bindValue(":grace", grace_period)
+        if not q_blobs.exec():
+            raise Exception(f"Ошибка удаления файлов без ссылок: {q_blobs.lastError().text()}")
+        blobs_removed = max(q_blobs.numRowsAffected(), 0)
+
+        # Фрагменты без строки krd.blobs: файлы удалены выше или запись прервалась до конца
+        q_chunks = QSqlQuery(db)
+        q_chunks.prepare("""
+            DELETE FROM krd.blob_chunks c
+            WHERE c.created_at < now() - CAST(:grace AS interval)
+              AND NOT EXISTS (SELECT 1 FROM krd.blobs b WHERE b.hash = c.hash)
+        """)
+        q_chunks.bindValue(":grace", grace_period)
+        if not q_chunks.exec():
+            raise Exception(f"Ошибка удаления фрагментов: {q_chunks.lastError().text()}")
+        chunks_removed = max(q_chunks.numRowsAffected(), 0)
+
+        if not db.commit():
+            raise Exception(db.lastError().text())
+    except Exception:
+        db.rollback()
+        raise
+    print(f"🗑️ [BLOB] Удалено файлов без ссылок: {blobs_removed}, фрагментов: {chunks_removed}")
+    return blobs_removed, chunks_removed
+
+
+def blob_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def existing_blobs(db, hashes):
+    """Хеши из списка, уже записанные в хранилище (один запрос)"""
+    if not hashes:
+        return set()
+    q = QSqlQuery(db)
+    q.prepare("SELECT hash FROM krd.blobs WHERE hash = ANY(CAST(:hashes AS text[]))")
+    q.bindValue(":hashes", "{" + ",".join(hashes) + "}")
+    if not q.exec():
+        raise Exception(f"Ошибка проверки хранилища файлов: {q.lastError().text()}")
+    found = set()
+    while q.next():
+        found.add(q.value(0))
+    return found
+
+
+def _write_blob(db, key, data):
+    chunk_count = max(1, math.ceil(len(data) / BLOB_CHUNK_SIZE))
+    q = QSqlQuery(db)
+    q.prepare("""
+        INSERT INTO krd.blob_chunks (hash, chunk_no, compressed, data)
+        VALUES (:hash, :chunk_no, :compressed, :data)
+        ON CONFLICT DO NOTHING
+    """)
+    stored = 0
+    for n in range(chunk_count):
+        piece = data[n * BLOB_CHUNK_SIZE:(n + 1) * BLOB_CHUNK_SIZE]
+        packed = zlib.compress(piece)
+        compressed = len(packed) < len(piece) * MIN_COMPRESSION_RATIO
+        payload = packed if compressed else piece
+        q.bindValue(":hash", key)
+        q.bindValue(":chunk_no", n)
+        q.bindValue(":compressed", compressed)
+        q.bindValue(":data", QByteArray(payload))
+        if not q.exec():
+            raise Exception(f"Ошибка записи файла в хранилище: {q.lastError().text()}")
+        stored += len(payload)
+
+    q_blob = QSqlQuery(db)
+    q_blob.prepare("""
+        INSERT INTO krd.blobs (hash, size, chunk_count) VALUES (:hash, :size, :chunk_count)
+        ON CONFLICT DO NOTHING
+    """)
+    q_blob.bindValue(":hash", key)
+    q_blob.bindValue(":size", len(data))
+    q_blob.bindValue(":chunk_count", chunk_count)
+    if not q_blob.exec():
+        raise Exception(f"Ошибка записи файла в хранилище: {q_blob.lastError().text()}")
+    print(f"📦 [BLOB] Записан {key[:12]}: {len(data)} байт → {stored} байт, фрагментов: {chunk_count}")
+
+
+def put_blobs(db, items):
+    """Записывает файлы (список байтов) и возвращает их хеши; уже имеющиеся и повторы не передаются"""
+    keys = [blob_hash(data) for data in items]
+    present = existing_blobs(db, sorted(set(keys)))
+    for key, data in zip(keys, items):
+        if key not in present:
+            _write_blob(db, key, data)
+            present.add(key)
+    return keys
+
+
+def put_blob(db, data):
+    return put_blobs(db, [data])[0]
+
+
+def iter_blob_chunks(db, key):
+    """Фрагменты файла по одному запросу на фрагмент — в памяти не больше одного фрагмента"""
+    q = QSqlQuery(db)
+    q.prepare("SELECT chunk_count FROM krd.blobs WHERE hash = :hash")
+    q.bindValue(":hash", key)
+    if not q.exec() or not q.next():
+        raise Exception(f"Файл {key[:12]} отсутствует в хранилище")
+    chunk_count = q.value(0)
+
+    q_chunk = QSqlQuery(db)
+    q_chunk.prepare("SELECT compressed, data FROM krd.blob_chunks WHERE hash = :hash AND chunk_no = :chunk_no")
+    for n in range(chunk_count):
+        q_chunk.bindValue(":hash", key)
+        q_chunk.bindValue(":chunk_no", n)
+        if not q_chunk.exec() or not q_chunk.next():
+            raise Exception(f"Фрагмент {n} файла {key[:12]} отсутствует в хранилище")
+        payload = bytes(q_chunk.value(1))
+        yield zlib.decompress(payload) if q_chunk.value(0) else payload
+
+
+def read_blob(db, key):
+    return b"".join(iter_blob_chunks(db, key))
+
+
+def write_blob_to_file(db, key, path):
+    """Потоковая выгрузка файла из хранилища; при ошибке частичный файл удаляется. Возвращает размер"""
+    size = 0
+    try:
+        with open(path, 'wb') as f:
+            for chunk in iter_blob_chunks(db, key):
+                f.write(chunk)
+                size += len(chunk)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return size
+
+
+def load_file_data(db, key, inline_data):
+    """Содержимое по ссылке на хранилище или из еще не перенесенной BYTEA-колонки (None — файла нет)"""
+    if key:
+        return read_blob(db, key)
+    if inline_data:
+        return bytes(inline_data)
+    return None
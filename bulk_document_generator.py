@@ -0,0 +1,285 @@
+"""
+Пакетная генерация документов по одному шаблону для множества КРД
+✅ ДОБАВЛЕНО: Контексты строятся множественными запросами (krd_id = ANY(:ids)) — по одному на источник
+✅ ДОБАВЛЕНО: Рендеринг DOCX в ProcessPoolExecutor (шаблон передается в процесс один раз)
+✅ ДОБАВЛЕНО: Вставка outgoing_requests многострочными INSERT в одной транзакции
+✅ ДОБАВЛЕНО: Прогресс и пропускная способность (док/с), отмена до записи в БД
+✅ ОПТИМИЗИРОВАНО: Документы записываются в хранилище файлов (blob_store), запросы ссылаются на хеш
+"""
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from PyQt6.QtSql import QSqlQuery
+
+from doc_generation_engine import DocGenerationEngine
+from template_cache import CompiledTemplate
+from blob_store import put_blobs
+
+try:
+    from db_mappings import DB_COLUMNS_MAP
+except ImportError:
+    DB_COLUMNS_MAP = {}
+
+
+# Таблицы, запись из которых выбирается правилом для каждой КРД
+SELECTABLE_TABLES = ("addresses", "service_places", "soch_episodes", "incoming_orders")
+RULE_LATEST = "latest"   # Последняя (по id) неудаленная запись КРД
+RULE_NONE = None         # Не подставлять
+
+# Маркер "запись будет выбрана правилом" для планировщика колонок
+_RULE_PLACEHOLDER_ID = -1
+
+# Документы — крупные BYTEA, поэтому в один INSERT попадает ограниченное число строк
+INSERT_CHUNK_SIZE = 50
+
+
+# =============================================================================
+# === РАБОЧИЙ ПРОЦЕСС РЕНДЕРИНГА ===
+# =============================================================================
+_worker_compiled = None
+
+
+def _init_render_worker(template_bytes):
+    """Инициализатор процесса: шаблон разбирается один раз на процесс"""
+    global _worker_compiled
+    engine = DocGenerationEngine(None, None)
+    _worker_compiled = CompiledTemplate(template_bytes, engine.placeholder_pattern)
+
+
+def _render_in_worker(krd_id, context):
+    engine = DocGenerationEngine(None, krd_id)
+    engine.debug_mode = False
+    doc_bytes, replacements = engine.render_compiled(_worker_compiled, context)
+    return krd_id, doc_bytes, replacements
+
+
+def _ids_array_literal(ids):
+    return "{" + ",".join(str(int(i)) for i in ids) + "}"
+
+
+class BulkDocumentGenerator:
+    """Генерация одного шаблона для списка КРД с сохранением в krd.outgoing_requests"""
+
+    def __init__(self, db_connection, max_workers=None):
+        self.db = db_connection
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+
+        self.engine = DocGenerationEngine(db_connection, None)
+        self.engine.debug_mode = False
+        self.engine.set_columns_map(DB_COLUMNS_MAP)
+
+    def generate(self, template_id, krd_ids, request_type_id, recipient_id=None, signatory_id=None,
+                 selection_rules=None, progress_callback=None, cancel_check=None):
+        """
+        Args:
+            selection_rules: {таблица: RULE_LATEST | RULE_NONE}, по умолчанию RULE_LATEST для SELECTABLE_TABLES
+            progress_callback: callable(done, total, docs_per_sec)
+            cancel_check: callable() -> bool; при True генерация прерывается без записи в БД
+        Returns:
+            dict: {'created': [(krd_id, request_id, issue_number)], 'failed': {krd_id: ошибка},
+                   'cancelled': bool, 'elapsed': сек, 'docs_per_sec': float, 'template_name': str}
+        """
+        krd_ids = list(dict.fromkeys(int(k) for k in krd_ids))
+        result = {'created': [], 'failed': {}, 'cancelled': False, 'elapsed': 0.0, 'docs_per_sec': 0.0,
+                  'template_name': None}
+        if not krd_ids:
+            return result
+        started = time.perf_counter()
+
+        rules = {table: RULE_LATEST for table in SELECTABLE_TABLES}
+        rules.update(selection_rules or {})
+        fixed = {'recipients': recipient_id, 'signatories': signatory_id}
+
+        compiled = self.engine.load_compiled_template(template_id)
+        result['template_name'] = compiled.name
+        mapping_list = self.engine.load_mapping_list(template_id)
+        if mapping_list is None:
+            raise Exception("Не удалось загрузить сопоставления шаблона")
+
+        contexts = self._build_contexts(mapping_list, krd_ids, rules, fixed)
+        print(f"📊 [BULK] Контексты собраны для {len(contexts)} КРД за {time.perf_counter() - started:.2f} с")
+
+        documents = self._render_all(compiled, contexts, result, started, progress_callback, cancel_check)
+        if result['cancelled']:
+            result['elapsed'] = time.perf_counter() - started
+            return result
+
+        issue_numbers = self._next_issue_numbers([krd_id for krd_id, _ in documents])
+        rows = [(krd_id, issue_numbers[krd_id], doc_bytes) for krd_id, doc_bytes in documents]
+        result['created'] = self._insert_requests(rows, request_type_id, recipient_id, signatory_id)
+
+        result['elapsed'] = time.perf_counter() - started
+        result['docs_per_sec'] = len(result['created']) / result['elapsed'] if result['elapsed'] else 0.0
+        print(f"✅ [BULK] Создано документов: {len(result['created'])}, ошибок: {len(result['failed'])}, "
+              f"{result['docs_per_sec']:.1f} док/с")
+        return result
+
+    # =========================================================================
+    # === КОНТЕКСТЫ (МНОЖЕСТВЕННЫЕ ЗАПРОСЫ) ===
+    # =========================================================================
+    def _build_contexts(self, mapping_list, krd_ids, rules, fixed):
+        probe = {table: _RULE_PLACEHOLDER_ID for table, rule in rules.items() if rule == RULE_LATEST}
+        probe.update({table: rid for table, rid in fixed.items() if rid})
+        plan = self.engine._plan_context_fetch(mapping_list, probe)
+
+        per_krd = {}        # {(table): {krd_id: (row_id, row)}}
+        shared_rows = {}    # {(table, id): row} — фиксированные адресат/подписант
+        for (table, rid), columns in plan.items():
+            if rid is None:
+                per_krd[table] = self._fetch_rows_by_krd(table, columns, krd_ids, only_active=False)
+            elif rid == _RULE_PLACEHOLDER_ID:
+                per_krd[table] = self._fetch_rows_by_krd(table, columns, krd_ids, only_active=True)
+            else:
+                shared_rows[(table, rid)] = self.engine._fetch_source_row((table, rid), columns) or {}
+
+        contexts = {}
+        for krd_id in krd_ids:
+            selections = dict(fixed)
+            source_rows = dict(shared_rows)
+            social = per_krd.get('social_data', {}).get(krd_id)
+            source_rows[('social_data', None)] = social[1] if social else {}
+            for table in SELECTABLE_TABLES:
+                found = per_krd.get(table, {}).get(krd_id) if table in probe else None
+                selections[table] = found[0] if found else None
+                if found:
+                    source_rows[(table, found[0])] = found[1]
+            contexts[krd_id] = self.engine.resolve_context(mapping_list, selections, source_rows)
+        return contexts
+
+    def _fetch_rows_by_krd(self, table, columns, krd_ids, only_active):
+        """Одна выборка по всем КРД: последняя запись таблицы на каждую КРД (DISTINCT ON)"""
+        if not re.match(r'^\w+$', table):
+            raise Exception(f"Некорректная таблица: '{table}'")
+        valid_columns, select_parts, joins = self.engine.build_select_parts(columns)
+        select_sql = "".join(f", {part}" for part in select_parts)
+        active_sql = "AND (s.is_deleted = FALSE OR s.is_deleted IS NULL)" if only_active else ""
+
+        q = QSqlQuery(self.db)
+        q.setForwardOnly(True)
+        q.prepare(f"""
+            SELECT DISTINCT ON (s.krd_id) s.krd_id, s.id{select_sql}
+            FROM krd.{table} s {' '.join(joins)}
+            WHERE s.krd_id = ANY(CAST(:ids AS integer[])) {active_sql}
+            ORDER BY s.krd_id, s.id DESC
+        """)
+        q.bindValue(":ids", _ids_array_literal(krd_ids))
+        if not q.exec():
+            raise Exception(f"Ошибка выборки {table}: {q.lastError().text()}")
+
+        rows = {}
+        while q.next():
+            row = {col: self.engine._format_value(q.value(i + 2)) for i, col in enumerate(valid_columns)}
+            rows[q.value(0)] = (q.value(1), row)
+        return rows
+
+    # =========================================================================
+    # === РЕНДЕРИНГ ===
+    # =========================================================================
+    def _render_all(self, compiled, contexts, result, started, progress_callback, cancel_check):
+        total = len(contexts)
+        documents = []
+
+        def report():
+            if progress_callback:
+                elapsed = time.perf_counter() - started
+                done = len(documents) + len(result['failed'])
+                progress_callback(done, total, len(documents) / elapsed if elapsed else 0.0)
+
+        pending = dict(contexts)
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_render_worker,
+                                     initargs=(compiled.template_bytes,)) as pool:
+                futures = {pool.submit(_render_in_worker, krd_id, ctx): krd_id for krd_id, ctx in contexts.items()}
+                for future in as_completed(futures):
+                    krd_id = futures[future]
+                    try:
+                        _, doc_bytes, _ = future.result()
+                        documents.append((krd_id, doc_bytes))
+                        pending.pop(krd_id, None)
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        result['failed'][krd_id] = str(e)
+                        pending.pop(krd_id, None)
+                    report()
+                    if cancel_check and cancel_check():
+                        for f in futures:
+                            f.cancel()
+                        result['cancelled'] = True
+                        return documents
+        except (BrokenProcessPool, OSError) as e:
+            # Пул процессов недоступен (ограничения ОС/сборки) — дорендериваем в текущем процессе
+            print(f"⚠️ [BULK] Пул процессов недоступен ({e}), рендеринг в текущем процессе")
+            for krd_id, ctx in pending.items():
+                try:
+                    doc_bytes, _ = self.engine.render_compiled(compiled, ctx)
+                    documents.append((krd_id, doc_bytes))
+                except Exception as render_error:
+                    result['failed'][krd_id] = str(render_error)
+                report()
+                if cancel_check and cancel_check():
+                    result['cancelled'] = True
+                    break
+        return documents
+
+    # =========================================================================
+    # === ЗАПИСЬ В БД ===
+    # =========================================================================
+    def _next_issue_numbers(self, krd_ids):
+        """Номера вида КРД-N/З-k по всем КРД одним запросом"""
+        counts = {krd_id: 0 for krd_id in krd_ids}
+        if krd_ids:
+            q = QSqlQuery(self.db)
+            q.prepare("""
+                SELECT krd_id, COUNT(*) FROM krd.outgoing_requests
+                WHERE krd_id = ANY(CAST(:ids AS integer[])) AND issue_date = CURRENT_DATE
+                GROUP BY krd_id
+            """)
+            q.bindValue(":ids", _ids_array_literal(krd_ids))
+            if q.exec():
+                while q.next():
+                    counts[q.value(0)] = q.value(1) or 0
+        return {krd_id: f"КРД-{krd_id}/З-{cnt + 1}" for krd_id, cnt in counts.items()}
+
+    def _insert_requests(self, rows, request_type_id, recipient_id, signatory_id):
+        """Многострочные INSERT порциями по INSERT_CHUNK_SIZE в одной транзакции"""
+        created = []
+        if not rows:
+            return created
+        if not self.db.transaction():
+            raise Exception(f"Не удалось начать транзакцию: {self.db.lastError().text()}")
+        try:
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                chunk = rows[start:start + INSERT_CHUNK_SIZE]
+                # Документы — в хранилище файлов, строки запросов ссылаются на хеш
+                document_hashes = put_blobs(self.db, [doc_bytes for _, _, doc_bytes in chunk])
+                values_sql = ", ".join(
+                    f"(:k{i}, :rt{i}, :rc{i}, CURRENT_DATE, :n{i}, :d{i}, :sg{i})" for i in range(len(chunk))
+                )
+                q = QSqlQuery(self.db)
+                q.prepare(f"""
+                    INSERT INTO krd.outgoing_requests
+                    (krd_id, request_type_id, recipient_id, issue_date, issue_number, document_hash, signatory_id)
+                    VALUES {values_sql}
+                    RETURNING id, krd_id, issue_number
+                """)
+                for i, ((krd_id, issue_number, _), document_hash) in enumerate(zip(chunk, document_hashes)):
+                    q.bindValue(f":k{i}", krd_id)
+                    q.bindValue(f":rt{i}", request_type_id)
+                    q.bindValue(f":rc{i}", recipient_id)
+                    q.bindValue(f":n{i}", issue_number)
+                    q.bindValue(f":d{i}", document_hash)
+                    q.bindValue(f":sg{i}", signatory_id)
+                if not q.exec():
+                    raise Exception(f"Ошибка БД: {q.lastError().text()}")
+                while q.next():
+                    created.append((q.value(1), q.value(0), q.value(2)))
+            if not self.db.commit():
+                raise Exception(f"Ошибка коммита: {self.db.lastError().text()}")
+        except Exception:
+            self.db.rollback()
+            raise
+        return created
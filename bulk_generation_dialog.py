@@ -0,0 +1,242 @@
+"""
+Диалог пакетной генерации документов по списку КРД
+✅ ДОБАВЛЕНО: Выбор шаблона, адресата, подписанта и списка КРД (номера и диапазоны "1-50, 75")
+✅ ДОБАВЛЕНО: Прогресс с пропускной способностью (док/с) и отмена до записи в БД
+✅ ОПТИМИЗИРОВАНО: Контексты, рендеринг и запись в БД выполняются в BulkGenerationJob (общий BackgroundJob:
+   отдельный QThread со своим подключением из пула), окно остается отзывчивым
+"""
+import re
+
+from PyQt6.QtWidgets import (
+    QVBoxLayout, QHBoxLayout, QFormLayout, QComboBox, QLineEdit, QCheckBox,
+    QPushButton, QLabel, QProgressBar, QMessageBox
+)
+from PyQt6.QtSql import QSqlQuery
+
+from background_job import BackgroundJob
+from bulk_document_generator import BulkDocumentGenerator
+from reference_cache import reference_rows
+from ui_helpers import BaseDialog
+
+
+def parse_krd_ids(text):
+    """Разбирает строку вида '1-50, 75 80' в список номеров КРД"""
+    ids = []
+    for token in re.split(r"[,\s;]+", text or ""):
+        if not token:
+            continue
+        if "-" in token:
+            start, _, end = token.partition("-")
+            start, end = int(start), int(end)
+            if start > end:
+                start, end = end, start
+            ids.extend(range(start, end + 1))
+        else:
+            ids.append(int(token))
+    return ids
+
+
+class BulkGenerationJob(BackgroundJob):
+    """Генерация в отдельном потоке (background_job); прогресс и результат передаются диалогу"""
+
+    def __init__(self, dialog, template_id, krd_ids, request_type_id, recipient_id, signatory_id):
+        def task(db, report, cancel_check):
+            generator = BulkDocumentGenerator(db)
+            return generator.generate(template_id, krd_ids, request_type_id, recipient_id, signatory_id,
+                                      progress_callback=report, cancel_check=cancel_check)
+
+        super().__init__(task, dialog)
+        self.dialog = dialog
+
+    def on_progress(self, done, total, extra, elapsed):
+        docs_per_sec = extra[0] if extra else 0.0
+        self.dialog.on_progress(done, total, docs_per_sec)
+
+    def on_finished(self, result):
+        self.dialog.on_finished(result)
+
+    def on_failed(self, message):
+        self.dialog.on_failed(message)
+
+
+class BulkGenerationDialog(BaseDialog):
+    """Пакетная генерация одного шаблона для множества КРД"""
+
+    def __init__(self, db_connection, parent=None, audit_logger=None):
+        super().__init__(parent)
+        self.setWindowTitle("Пакетная генерация документов")
+        self.setMinimumSize(600, 320)
+        self.db = db_connection
+        self.audit_logger = audit_logger
+        self._job = None
+
+        self.init_ui()
+        self.load_combos()
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+
+        self.template_combo = QComboBox()
+        self.recipient_combo = QComboBox()
+        self.signatory_combo = QComboBox()
+        form.addRow("📄 Шаблон:", self.template_combo)
+        form.addRow("📨 Адресат:", self.recipient_combo)
+        form.addRow("✍️ Подписант:", self.signatory_combo)
+
+        self.ids_input = QLineEdit()
+        self.ids_input.setPlaceholderText("Например: 1-50, 75, 80")
+        self.all_krd_check = QCheckBox("Все КРД")
+        self.all_krd_check.toggled.connect(self.ids_input.setDisabled)
+        ids_layout = QHBoxLayout()
+        ids_layout.addWidget(self.ids_input)
+        ids_layout.addWidget(self.all_krd_check)
+        form.addRow("🔢 Номера КРД:", ids_layout)
+        layout.addLayout(form)
+
+        layout.addWidget(QLabel("ℹ️ Адреса, места службы, эпизоды СОЧ и поручения берутся последние по каждой КРД"))
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        btn_layout = QHBoxLayout()
+        btn_layout.addStretch()
+        self.generate_btn = QPushButton("🚀 Сгенерировать")
+        self.generate_btn.clicked.connect(self.start_generation)
+        self.cancel_btn = QPushButton("Отмена")
+        self.cancel_btn.clicked.connect(self.on_cancel)
+        btn_layout.addWidget(self.generate_btn)
+        btn_layout.addWidget(self.cancel_btn)
+        layout.addLayout(btn_layout)
+
+    def _fill_combo(self, combo, sql, empty_text=None):
+        combo.clear()
+        if empty_text:
+            combo.addItem(empty_text, None)
+        q = QSqlQuery(self.db)
+        if q.exec(sql):
+            while q.next():
+                combo.addItem(q.value(1), q.value(0))
+        else:
+            print(f"⚠️ [BULK] Ошибка загрузки списка: {q.lastError().text()}")
+
+    def load_combos(self):
+        self._fill_combo(self.template_combo,
+                         "SELECT id, name FROM krd.document_templates WHERE is_deleted=FALSE ORDER BY name")
+        self._fill_combo(self.recipient_combo,
+                         "SELECT id, name FROM krd.recipients WHERE is_deleted = FALSE ORDER BY name",
+                         "— Не выбрано —")
+        self._fill_combo(self.signatory_combo, """
+            SELECT id, full_name || ' (' || COALESCE(rank, '') || ', ' || COALESCE(garrison, '') || ')'
+            FROM krd.signatories WHERE is_deleted = FALSE ORDER BY full_name
+        """, "— Не выбрано —")
+
+    def _collect_krd_ids(self):
+        if not self.all_krd_check.isChecked():
+            return parse_krd_ids(self.ids_input.text())
+        q = QSqlQuery(self.db)
+        q.setForwardOnly(True)
+        ids = []
+        if q.exec("SELECT id FROM krd.krd WHERE is_deleted = FALSE ORDER BY id"):
+            while q.next():
+                ids.append(q.value(0))
+        return ids
+
+    def _resolve_request_type(self, recipient_id):
+        q = QSqlQuery(self.db)
+        if recipient_id:
+            q.prepare("SELECT request_type_id FROM krd.recipients WHERE id = :rid")
+            q.bindValue(":rid", recipient_id)
+            if q.exec() and q.next() and q.value(0):
+                return q.value(0)
+        # Тип запроса по умолчанию — первый по имени (из кэша справочников)
+        request_types = reference_rows(self.db, 'request_types')
+        return request_types[0][0] if request_types else None
+
+    def start_generation(self):
+        template_id = self.template_combo.currentData()
+        if not template_id:
+            return QMessageBox.warning(self, "Ошибка", "Выберите шаблон")
+        try:
+            krd_ids = self._collect_krd_ids()
+        except ValueError:
+            return QMessageBox.warning(self, "Ошибка", "Некорректный список номеров КРД")
+        if not krd_ids:
+            return QMessageBox.warning(self, "Ошибка", "Не указаны номера КРД")
+
+        recipient_id = self.recipient_combo.currentData()
+        signatory_id = self.signatory_combo.currentData()
+        request_type_id = self._resolve_request_type(recipient_id)
+        if not request_type_id:
+            return QMessageBox.warning(self, "Ошибка", "Справочник типов запросов пуст!")
+
+        self.generate_btn.setEnabled(False)
+        self.progress_bar.setRange(0, len(set(krd_ids)))
+        self.progress_bar.setValue(0)
+        self.status_label.setText("⏳ Подготовка данных...")
+
+        self._job = BulkGenerationJob(self, template_id, krd_ids, request_type_id, recipient_id, signatory_id)
+        self._job.start()
+
+    def on_progress(self, done, total, docs_per_sec):
+        self.progress_bar.setValue(done)
+        self.status_label.setText(f"📄 {done} из {total} ({docs_per_sec:.1f} док/с)")
+
+    def on_finished(self, result):
+        self._finish()
+        if result['cancelled']:
+            self.status_label.setText("⚠️ Генерация отменена, документы не сохранены")
+            return
+
+        if self.audit_logger and result['created']:
+            self.audit_logger.log_action(
+                'REQUEST_BULK_CREATE', 'outgoing_requests', None, None,
+                f'Пакетная генерация по шаблону "{result["template_name"]}": {len(result["created"])} документов'
+            )
+
+        message = (f"Создано документов: {len(result['created'])}\n"
+                   f"⏱️ Время: {result['elapsed']:.1f} с ({result['docs_per_sec']:.1f} док/с)")
+        if result['failed']:
+            failed = ", ".join(str(k) for k in list(result['failed'])[:20])
+            message += f"\n⚠️ Ошибки для КРД: {failed}"
+        self.status_label.setText(f"✅ Создано документов: {len(result['created'])}")
+        QMessageBox.information(self, "Пакетная генерация", message)
+
+    def on_failed(self, message):
+        self._finish()
+        self.status_label.setText("❌ Ошибка генерации")
+        QMessageBox.critical(self, "Ошибка генерации", message)
+
+    def _finish(self):
+        # Поток уже остановлен заданием (BackgroundJob._finish)
+        self._job.deleteLater()
+        self._job = None
+        self.generate_btn.setEnabled(True)
+
+    @property
+    def _running(self):
+        return self._job is not None and self._job.is_running()
+
+    def on_cancel(self):
+        if self._running:
+            self._job.cancel()
+            self.status_label.setText("⏳ Отмена...")
+        else:
+            super().reject()
+
+    def reject(self):
+        # Esc во время генерации — только отмена, диалог закроется после завершения потока
+        if self._running:
+            self.on_cancel()
+            return
+        super().reject()
+
+    def closeEvent(self, event):
+        if self._running:
+            self._job.cancel()
+            event.ignore()
+            return
+        super().closeEvent(event)
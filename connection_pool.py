@@ -0,0 +1,196 @@
+"""
+Пул подключений к PostgreSQL для фоновых потоков и диалогов
+✅ ДОБАВЛЕНО: ConnectionPool — именованные подключения на поток (QSqlDatabase работает только в потоке-создателе)
+✅ ДОБАВЛЕНО: Ограничение общего числа подключений (max_size) с ожиданием освобождения
+✅ ДОБАВЛЕНО: Проверка живости (check_connection) перед выдачей после простоя, вытеснение простаивающих
+✅ ОПТИМИЗИРОВАНО: Подключение остается открытым между арендами — SSL-рукопожатие выполняется один раз
+"""
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+
+
+DEFAULT_MAX_SIZE = 8
+# Проверять живость подключения, если оно простаивало дольше (сек)
+HEALTH_CHECK_AFTER_SEC = 30
+# Закрывать подключения, простаивающие дольше (сек)
+IDLE_TIMEOUT_SEC = 300
+# Сколько ждать свободного места в пуле (сек)
+LEASE_TIMEOUT_SEC = 30
+
+
+def check_connection(db):
+    """Проверка живости подключения легким запросом"""
+    if not db.isOpen():
+        return False
+    query = QSqlQuery(db)
+    return query.exec("SELECT 1") and query.next()
+
+
+class PoolExhausted(Exception):
+    """Все подключения пула заняты дольше LEASE_TIMEOUT_SEC"""
+
+
+class _PooledConnection:
+    __slots__ = ("name", "thread_id", "last_used")
+
+    def __init__(self, name, thread_id):
+        self.name = name
+        self.thread_id = thread_id
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Пул именованных подключений. Свободные подключения хранятся отдельно для каждого потока:
+    аренда в потоке выдает только подключение, созданное в этом же потоке.
+    Поток, завершающий работу, должен вызвать close_thread_connections().
+    """
+
+    def __init__(self, connector, max_size=DEFAULT_MAX_SIZE, idle_timeout=IDLE_TIMEOUT_SEC,
+                 health_check_after=HEALTH_CHECK_AFTER_SEC):
+        self.connector = connector
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle = {}      # {thread_id: [_PooledConnection]}
+        self._leased = {}    # {имя подключения: _PooledConnection}
+        self._size = 0
+        self._counter = itertools.count(1)
+
+    # =========================================================================
+    # === АРЕНДА ===
+    # =========================================================================
+    def acquire(self, timeout=LEASE_TIMEOUT_SEC):
+        """Выдает открытое подключение для текущего потока"""
+        thread_id = threading.get_ident()
+        deadline = time.monotonic() + timeout
+        entry = None
+        with self._cond:
+            self._evict_idle_locked(thread_id)
+            while True:
+                idle = self._idle.get(thread_id)
+                if idle:
+                    entry = idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f"Нет свободных подключений (максимум {self.max_size})")
+                self._cond.wait(remaining)
+
+        if entry is not None and time.monotonic() - entry.last_used > self.health_check_after:
+            if not check_connection(QSqlDatabase.database(entry.name, False)):
+                print(f"⚠️ [POOL] Подключение {entry.name} не отвечает, переоткрываю")
+                self._remove_connection(entry.name)
+                entry = None
+        if entry is None:
+            try:
+                entry = self._open_connection(thread_id)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._leased[entry.name] = entry
+        return QSqlDatabase.database(entry.name, False)
+
+    def release(self, db):
+        """Возвращает подключение в пул. Транзакции должны быть завершены арендатором"""
+        name = db.connectionName()
+        with self._cond:
+            entry = self._leased.pop(name, None)
+        if entry is None:
+            return
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.setdefault(entry.thread_id, []).append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=LEASE_TIMEOUT_SEC):
+        """with pool.connection() as db: ... — аренда на время блока"""
+        db = self.acquire(timeout)
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+    # =========================================================================
+    # === ЗАКРЫТИЕ И ВЫТЕСНЕНИЕ ===
+    # =========================================================================
+    def evict_idle(self):
+        """Закрывает простаивающие подключения текущего потока"""
+        with self._cond:
+            self._evict_idle_locked(threading.get_ident())
+
+    def close_thread_connections(self):
+        """Закрывает все свободные подключения текущего потока (перед завершением потока)"""
+        thread_id = threading.get_ident()
+        with self._cond:
+            entries = self._idle.pop(thread_id, [])
+            self._size -= len(entries)
+            self._cond.notify_all()
+        for entry in entries:
+            self._remove_connection(entry.name)
+
+    def _evict_idle_locked(self, thread_id):
+        idle = self._idle.get(thread_id)
+        if not idle:
+            return
+        now = time.monotonic()
+        keep = [e for e in idle if now - e.last_used <= self.idle_timeout]
+        expired = [e for e in idle if now - e.last_used > self.idle_timeout]
+        self._idle[thread_id] = keep
+        self._size -= len(expired)
+        for entry in expired:
+            print(f"🔌 [POOL] Закрываю простаивающее подключение {entry.name}")
+            self._remove_connection(entry.name)
+        if expired:
+            self._cond.notify_all()
+
+    def _open_connection(self, thread_id):
+        name = f"krd_pool_{next(self._counter)}"
+        db = self.connector.create_connection(name)
+        if not db.open():
+            error_text = db.lastError().text()
+            del db
+            QSqlDatabase.removeDatabase(name)
+            raise Exception(f"Ошибка подключения: {error_text}")
+        del db
+        print(f"✅ [POOL] Открыто подключение {name}")
+        return _PooledConnection(name, thread_id)
+
+    @staticmethod
+    def _remove_connection(name):
+        db = QSqlDatabase.database(name, False)
+        if db.isOpen():
+            db.close()
+        del db
+        QSqlDatabase.removeDatabase(name)
+
+
+_pool = None
+
+
+def init_connection_pool(connector, max_size=DEFAULT_MAX_SIZE):
+    """Создает пул приложения по параметрам основного подключения"""
+    global _pool
+    _pool = ConnectionPool(connector, max_size)
+    return _pool
+
+
+def get_connection_pool():
+    if _pool is None:
+        raise RuntimeError("Пул подключений не инициализирован")
+    return _pool
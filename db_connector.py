@@ -1,9 +1,11 @@
 """
 Модуль для безопасного подключения к PostgreSQL с поддержкой SSL
 ✅ ИСПРАВЛЕНО: Гарантированное преобразование port к int
+✅ ДОБАВЛЕНО: create_connection — фабрика именованных подключений для пула (connection_pool)
 """
 import sys
-from PyQt6.QtSql import QSqlDatabase, QSqlQuery
+from PyQt6.QtSql import QSqlDatabase
+from connection_pool import check_connection
 from PyQt6.QtWidgets import QMessageBox
 
 class DatabaseConnector:
@@ -29,20 +31,9 @@ class DatabaseConnector:
             tuple: (bool, str) - (Успех, Сообщение)
         """
         try:
-            self.db = QSqlDatabase.addDatabase("QPSQL")
-            self.db.setHostName(self.host)
-            
-            # ✅ Явное преобразование к int перед вызовом setPort
-            self.db.setPort(int(self.port))
-            
-            self.db.setDatabaseName(self.dbname)
-            self.db.setUserName(self.user)
-            self.db.setPassword(self.password)
-
-            # ✅ НАСТРОЙКА SSL ШИФРОВАНИЯ
             if self.ssl_mode:
                 print(f"🔒 [DB] Включаю SSL-шифрование (sslmode={self.ssl_mode})...")
-                self.db.setConnectOptions(f"sslmode={self.ssl_mode}")
+            self.db = self.create_connection()
 
             if not self.db.open():
                 error_text = self.db.lastError().text()
@@ -50,9 +41,8 @@ class DatabaseConnector:
                     error_text += "\n💡 Возможно, на сервере PostgreSQL не настроен SSL."
                 return False, f"Ошибка подключения: {error_text}"
 
-            # ✅ ТЕСТОВОЕ ЗАПРОС ДЛЯ ПРОВЕРКИ СОЕДИНЕНИЯ
-            query = QSqlQuery(self.db)
-            if not query.exec("SELECT 1"):
+            # ✅ ПРОВЕРКА СОЕДИНЕНИЯ
+            if not check_connection(self.db):
                 return False, "База данных не отвечает на запросы."
 
             print("✅ [DB] Подключение к базе данных установлено успешно.")
@@ -63,6 +53,26 @@ class DatabaseConnector:
         except Exception as e:
             return False, f"Критическая ошибка: {str(e)}"
 
+    def create_connection(self, connection_name=None):
+        """
+        Фабрика подключений с параметрами этого коннектора (без открытия).
+        Без имени — подключение по умолчанию; именованные используются пулом.
+        """
+        if connection_name:
+            db = QSqlDatabase.addDatabase("QPSQL", connection_name)
+        else:
+            db = QSqlDatabase.addDatabase("QPSQL")
+        db.setHostName(self.host)
+        # ✅ Явное преобразование к int перед вызовом setPort
+        db.setPort(int(self.port))
+        db.setDatabaseName(self.dbname)
+        db.setUserName(self.user)
+        db.setPassword(self.password)
+        # ✅ НАСТРОЙКА SSL ШИФРОВАНИЯ
+        if self.ssl_mode:
+            db.setConnectOptions(f"sslmode={self.ssl_mode}")
+        return db
+
     def get_connection(self):
         """Возвращает объект подключения QSqlDatabase"""
         return self.db
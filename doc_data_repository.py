@@ -7,6 +7,8 @@
 """
 from PyQt6.QtSql import QSqlQuery
 
+from blob_store import load_file_data
+
 # ✅ БЕЗОПАСНЫЙ ИМПОРТ ЕДИНОГО СПРАВОЧНИКА
 try:
     from db_mappings import DB_COLUMNS_MAP
@@ -53,14 +55,14 @@ class DocDataRepository:
         """Получение данных шаблона (байты + имя)"""
         q = QSqlQuery(self.db)
         q.prepare("""
-            SELECT template_data, name 
+            SELECT template_hash, template_data, name 
             FROM krd.document_templates 
             WHERE id = :id
         """)
         q.bindValue(":id", template_id)
         
         if q.exec() and q.next():
-            return q.value(0), q.value(1)
+            return load_file_data(self.db, q.value(0), q.value(1)), q.value(2)
         raise Exception("Шаблон не найден")
         
     def get_template_description(self, template_id):
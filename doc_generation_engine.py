@@ -4,15 +4,19 @@
 ✅ АВТОМАТИЧЕСКАЯ ПОДСТАНОВКА НАЗВАНИЙ ИЗ СПРАВОЧНИКОВ (вместо ID)
 ✅ ИСПОЛЬЗУЕТ ЕДИНЫЙ СПРАВОЧНИК ИЗ db_mappings.py
 ✅ ПОЛНАЯ СОВМЕСТИМОСТЬ С QPSQL (:param вместо ?)
+✅ ОПТИМИЗИРОВАНО: Рендеринг DOCX целиком в памяти (BytesIO), один разбор шаблона, без временных файлов
+✅ ОПТИМИЗИРОВАНО: Кэш скомпилированных шаблонов (template_cache) с индексом абзацев, содержащих переменные
+✅ ОПТИМИЗИРОВАНО: Планировщик контекста — один SELECT на источник (таблица + выбранная запись) вместо запроса на каждое поле
+✅ ОПТИМИЗИРОВАНО: Шаблоны и сгенерированные документы — в хранилище файлов по хешу (blob_store)
 """
-import os
-import tempfile
+import io
 import json
 import re
 from docx.shared import Pt
-from docx import Document
+from template_cache import CompiledTemplate, template_cache
+from blob_store import load_file_data, put_blob
 from PyQt6.QtSql import QSqlQuery
-from PyQt6.QtCore import QByteArray, QDate
+from PyQt6.QtCore import QDate
 import traceback
 
 # ✅ ИМПОРТ ЕДИНОГО СПРАВОЧНИКА
@@ -33,6 +37,7 @@ class DocGenerationEngine:
         self.db_columns_map = {}
         self.placeholder_pattern = re.compile(r'\{\{([^{}]+)\}\}')
         self.debug_mode = True
+        self._query_count = 0
 
         # ✅ КАРТА СПРАВОЧНИКОВ ЗАГРУЖАЕТСЯ ИЗ db_mappings.py
         self.lookup_tables = LOOKUP_TABLES
@@ -45,22 +50,6 @@ class DocGenerationEngine:
             prefix = {"INFO": "📝", "WARN": "⚠️", "ERROR": "❌", "SUCCESS": "✅", "DATA": "📊", "TEXT": "📄"}.get(level, "•")
             print(f"{prefix} [{level}] {message}")
 
-    def _extract_all_text(self, doc):
-        all_text = []
-        for i, para in enumerate(doc.paragraphs):
-            if para.text.strip(): all_text.append(f"[Абзац {i}] {para.text}")
-        for i, table in enumerate(doc.tables):
-            for j, row in enumerate(table.rows):
-                for k, cell in enumerate(row.cells):
-                    for para in cell.paragraphs:
-                        if para.text.strip(): all_text.append(f"[Таблица {i}, Ячейка {j},{k}] {para.text}")
-        for i, section in enumerate(doc.sections):
-            for para in section.header.paragraphs:
-                if para.text.strip(): all_text.append(f"[Шапка {i}] {para.text}")
-            for para in section.footer.paragraphs:
-                if para.text.strip(): all_text.append(f"[Подвал {i}] {para.text}")
-        return all_text
-
     def build_context(self, template_id, selections):
         self._log("=" * 80, "INFO")
         self._log(f"НАЧАЛО СБОРКИ КОНТЕКСТА (template_id={template_id}, krd_id={self.krd_id})", "INFO")
@@ -69,14 +58,30 @@ class DocGenerationEngine:
         # ✅ ДИАГНОСТИКА: Показать selections
         self._log(f"Входящие selections: {selections}", "DATA")
         
-        context = {}
+        self._query_count = 0
+        mapping_list = self.load_mapping_list(template_id)
+        if mapping_list is None:
+            return {}
+        
+        # ✅ ПЛАНИРОВЩИК: одна выборка на каждый источник (таблица + выбранная запись)
+        plan = self._plan_context_fetch(mapping_list, selections)
+        source_rows = self._fetch_planned_rows(plan)
+        context = self.resolve_context(mapping_list, selections, source_rows)
+        
+        self._log(f"SQL-запросов: {self._query_count} (источников данных: {len(plan)})", "DATA")
+        self._log("=" * 80, "INFO")
+        return context
+
+    def load_mapping_list(self, template_id):
+        """Загружает сопоставления шаблона. Возвращает список словарей или None при ошибке"""
         query = QSqlQuery(self.db)
         query.prepare("SELECT field_name, db_column, table_name, db_columns, is_composite FROM krd.field_mappings WHERE template_id = :tid")
         query.bindValue(":tid", template_id)
+        self._query_count += 1
         
         if not query.exec():
             self._log(f"Ошибка загрузки маппингов: {query.lastError().text()}", "ERROR")
-            return context
+            return None
         
         mapping_list = []
         while query.next():
@@ -89,46 +94,33 @@ class DocGenerationEngine:
             })
         
         self._log(f"Загружено сопоставлений из БД: {len(mapping_list)}", "SUCCESS")
-        
+        return mapping_list
+
+    def resolve_context(self, mapping_list, selections, source_rows):
+        """Заполняет все переменные шаблона из заранее выбранных строк источников (без SQL)"""
+        context = {}
         mappings_count = 0
         for mapping in mapping_list:
             field_name = mapping['field_name'].strip('{} ')
-            raw_db_column = mapping['db_column']
             table_name = mapping['table_name']
             db_columns_json = mapping['db_columns']
             is_composite = mapping['is_composite']
             
             try:
-                # ✅ Извлекаем только имя колонки из формата "table|column"
-                if "|" in str(raw_db_column):
-                    _, db_column = str(raw_db_column).split("|", 1)
-                    self._log(f"Разбор '{raw_db_column}' → db_column='{db_column}', table='{table_name}'", "DEBUG")
-                else:
-                    db_column = str(raw_db_column)
+                db_column = self._parse_db_column(mapping['db_column'])
                 
                 if is_composite and db_columns_json:
-                    value = self._get_composite_value(table_name, db_columns_json, selections)
+                    value = self._get_composite_value(table_name, db_columns_json, selections, source_rows)
                     source = f"COMPOSITE({table_name})"
                 else:
-                    selected_id = selections.get(table_name)
-                    
-                    # ✅ ЯВНАЯ ПОДДЕРЖКА ПОДПИСАНТА И ДРУГИХ ВЫБИРАЕМЫХ ТАБЛИЦ
-                    if selected_id and table_name in self.tables_with_selection:
-                        value = self._get_value_from_record(table_name, db_column, selected_id)
-                        source = f"{table_name}.id={selected_id}"
-                        
-                    elif table_name == 'signatories' and selected_id is None:
-                        # Специальная обработка: если шаблон требует подписанта, но он не выбран
-                        value = ""
-                        source = "signatories (не выбрано)"
-                        
-                    elif table_name in self.tables_with_selection and selected_id is None:
+                    source_key = self._resolve_source(table_name, selections)
+                    if source_key is None:
+                        # Таблица с выбором записи (в т.ч. подписант), но запись не выбрана
                         value = ""
                         source = f"{table_name} (не выбрано)"
                     else:
-                        # Фоллбэк на основные социально-демографические данные
-                        value = self._get_value_from_social_data(db_column)
-                        source = "social_data"
+                        value = source_rows.get(source_key, {}).get(db_column, "")
+                        source = "social_data" if source_key[1] is None else f"{source_key[0]}.id={source_key[1]}"
                 
                 if value is not None and str(value).strip() != "":
                     context[field_name] = value
@@ -140,26 +132,160 @@ class DocGenerationEngine:
                     
             except Exception as e:
                 self._log(f"❌ Ошибка получения {{{field_name}}}: {e}", "ERROR")
-                import traceback
                 traceback.print_exc()
         
         self._log("=" * 80, "INFO")
         self._log(f"КОНТЕКСТ СОБРАН: {mappings_count} переменных заполнено из {len(mapping_list)}", "SUCCESS")
-        self._log("=" * 80, "INFO")
         return context
-    def _get_composite_value(self, table_hint, db_columns_json, selections):
+
+    def _parse_db_column(self, raw_db_column):
+        # ✅ Извлекаем только имя колонки из формата "table|column"
+        if "|" in str(raw_db_column):
+            _, db_column = str(raw_db_column).split("|", 1)
+            return db_column
+        return str(raw_db_column)
+
+    def _resolve_source(self, table_name, selections):
+        """
+        Определяет источник значения: (таблица, id записи) для выбираемых таблиц,
+        ('social_data', None) для социально-демографических данных,
+        None — если таблица требует выбора записи, а запись не выбрана.
+        """
+        selected_id = selections.get(table_name)
+        if table_name in self.tables_with_selection:
+            return (table_name, selected_id) if selected_id else None
+        return ("social_data", None)
+
+    def _resolve_composite_source(self, col, table_hint, selections):
+        t = self._get_table_by_column(col) or table_hint
+        sid = selections.get(t)
+        if sid and t in self.tables_with_selection:
+            return (t, sid)
+        return ("social_data", None)
+
+    def _iter_composite_columns(self, db_columns_json):
+        db_columns = json.loads(db_columns_json) if isinstance(db_columns_json, str) else db_columns_json
+        return db_columns or []
+
+    def _plan_context_fetch(self, mapping_list, selections):
+        """Группирует все нужные колонки по источникам: {(table, id): set(columns)}"""
+        plan = {}
+        for mapping in mapping_list:
+            table_name = mapping['table_name']
+            try:
+                if mapping['is_composite'] and mapping['db_columns']:
+                    for col_info in self._iter_composite_columns(mapping['db_columns']):
+                        col = col_info.get('column')
+                        if not col: continue
+                        key = self._resolve_composite_source(col, table_name, selections)
+                        plan.setdefault(key, set()).add(col)
+                else:
+                    key = self._resolve_source(table_name, selections)
+                    if key is not None:
+                        plan.setdefault(key, set()).add(self._parse_db_column(mapping['db_column']))
+            except Exception as e:
+                self._log(f"Ошибка планирования поля '{mapping.get('field_name')}': {e}", "ERROR")
+        
+        for (table, rid), cols in plan.items():
+            self._log(f"План: {table}{'' if rid is None else f'.id={rid}'} → {len(cols)} колонок", "DATA")
+        return plan
+
+    def _fetch_planned_rows(self, plan):
+        """Выполняет по одному запросу на источник; при ошибке — поколоночный фоллбэк"""
+        rows = {}
+        for key, columns in plan.items():
+            row = self._fetch_source_row(key, columns)
+            if row is None:
+                table, rid = key
+                self._log(f"Пакетная выборка {table} не удалась, переход на поколоночные запросы", "WARN")
+                row = {}
+                for col in columns:
+                    self._query_count += 1
+                    if rid is None:
+                        row[col] = self._get_value_from_social_data(col)
+                    else:
+                        row[col] = self._get_value_from_record(table, col, rid)
+            rows[key] = row
+        return rows
+
+    def _fetch_source_row(self, key, columns):
+        """
+        Одна выборка всех колонок источника с JOIN на справочники LOOKUP_TABLES.
+        Возвращает {column: отформатированное значение} или None при ошибке SQL.
+        """
+        table, rid = key
+        if not re.match(r'^\w+$', table):
+            self._log(f"  ⚠️ Некорректная таблица: '{table}'", "WARN")
+            return {}
+        
+        valid_columns, select_parts, joins = self.build_select_parts(columns)
+        if not valid_columns:
+            return {}
+        
+        if rid is None:
+            where = "WHERE s.krd_id = :krd_id ORDER BY s.id DESC LIMIT 1"
+        else:
+            where = "WHERE s.id = :rid"
+        sql = f"SELECT {', '.join(select_parts)} FROM krd.{table} s {' '.join(joins)} {where}"
+        
+        q = QSqlQuery(self.db)
+        q.prepare(sql)
+        if rid is None:
+            q.bindValue(":krd_id", self.krd_id)
+        else:
+            q.bindValue(":rid", rid)
+        self._query_count += 1
+        self._log(f"  🔍 SQL ({table}): {len(valid_columns)} колонок, {len(joins)} справочников", "DEBUG")
+        
+        if not q.exec():
+            self._log(f"  ❌ Ошибка SQL: {q.lastError().text()}", "ERROR")
+            self._log(f"  📝 Запрос: {q.lastQuery()}", "ERROR")
+            return None
+        
+        if not q.next():
+            self._log(f"  ⚠️ Строка источника {table} не найдена", "WARN")
+            return {col: "" for col in valid_columns}
+        return {col: self._format_value(q.value(i)) for i, col in enumerate(valid_columns)}
+
+    def build_select_parts(self, columns):
+        """
+        Готовит список выборки по колонкам источника (алиас s) с JOIN на справочники LOOKUP_TABLES.
+        Returns:
+            tuple: (допустимые колонки, выражения SELECT, строки JOIN)
+        """
+        valid_columns = []
+        for col in sorted(columns):
+            if re.match(r'^\w+$', col):
+                valid_columns.append(col)
+            else:
+                self._log(f"  ⚠️ Некорректное имя колонки: '{col}'", "WARN")
+        
+        select_parts = []
+        joins = []
+        for i, col in enumerate(valid_columns):
+            if col in self.lookup_tables:
+                ref_table, ref_col = self.lookup_tables[col]
+                alias = f"lk{i}"
+                select_parts.append(f"{alias}.{ref_col}")
+                joins.append(f"LEFT JOIN {ref_table} {alias} ON s.{col} = {alias}.id")
+            else:
+                select_parts.append(f"s.{col}")
+        return valid_columns, select_parts, joins
+
+    def _get_composite_value(self, table_hint, db_columns_json, selections, source_rows=None):
         try:
-            db_columns = json.loads(db_columns_json) if isinstance(db_columns_json, str) else db_columns_json
+            db_columns = self._iter_composite_columns(db_columns_json)
             if not db_columns: return None
             parts = []
             for col_info in db_columns:
                 col = col_info.get('column')
                 sep = col_info.get('separator', '')
                 if not col: continue
-                t = self._get_table_by_column(col) or table_hint
-                sid = selections.get(t)
-                if sid and t in self.tables_with_selection:
-                    val = self._get_value_from_record(t, col, sid)
+                key = self._resolve_composite_source(col, table_hint, selections)
+                if source_rows is not None and key in source_rows:
+                    val = source_rows[key].get(col, "")
+                elif key[1] is not None:
+                    val = self._get_value_from_record(key[0], col, key[1])
                 else:
                     val = self._get_value_from_social_data(col)
                 if val:
@@ -252,128 +378,128 @@ class DocGenerationEngine:
             return val.toString("dd.MM.yyyy")
         return str(val)
 
-    def apply_to_docx(self, template_bytes, context):
+    def load_compiled_template(self, template_id):
+        """
+        Возвращает скомпилированный шаблон из общего кэша.
+        Файл шаблона скачивается и разбирается только при смене (updated_at, хеш содержимого) шаблона.
+        """
+        q = QSqlQuery(self.db)
+        q.prepare("""
+            SELECT name, updated_at, COALESCE(template_hash, octet_length(template_data)::text)
+            FROM krd.document_templates WHERE id = :tid
+        """)
+        q.bindValue(":tid", template_id)
+        if not q.exec() or not q.next():
+            raise Exception("Шаблон не найден в БД")
+        name = q.value(0)
+        updated_at = q.value(1)
+        cache_key = (template_id, updated_at.toString("yyyy-MM-ddTHH:mm:ss.zzz") if hasattr(updated_at, 'toString') else str(updated_at), q.value(2))
+        
+        compiled = template_cache.get(cache_key)
+        if compiled is not None:
+            self._log(f"Шаблон '{name}' взят из кэша ({len(compiled.locations)} абзацев с переменными)", "SUCCESS")
+            return compiled
+        
+        q_data = QSqlQuery(self.db)
+        q_data.prepare("SELECT template_hash, template_data FROM krd.document_templates WHERE id = :tid")
+        q_data.bindValue(":tid", template_id)
+        if not q_data.exec() or not q_data.next():
+            raise Exception("Шаблон не найден в БД")
+        template_bytes = load_file_data(self.db, q_data.value(0), q_data.value(1))
+        if not template_bytes:
+            raise Exception("Файл шаблона отсутствует в БД")
+        
+        compiled = CompiledTemplate(template_bytes, self.placeholder_pattern, template_id=template_id, name=name)
+        template_cache.put(cache_key, compiled)
+        self._log(f"Шаблон '{name}' скомпилирован: {len(compiled.locations)} абзацев с переменными, "
+                  f"{len(compiled.variables)} переменных, sha256={compiled.content_hash[:12]}", "SUCCESS")
+        return compiled
+
+    def render_compiled(self, compiled, context):
+        """
+        Рендерит документ по скомпилированному шаблону целиком в памяти.
+        Обрабатываются только абзацы из индекса шаблона, по одной регулярной замене на абзац.
+        Returns:
+            tuple: (bytes готового документа, количество замен)
+        """
         self._log("=" * 80, "INFO")
         self._log("НАЧАЛО ГЕНЕРАЦИИ ДОКУМЕНТА", "INFO")
         self._log("=" * 80, "INFO")
+        self._log(f"Шаблон: {compiled.size} байт, абзацев с переменными: {len(compiled.locations)}", "DATA")
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp:
-            tmp.write(template_bytes)
-            template_path = tmp.name
-        
-        try:
-            self._log(f"Загрузка шаблона: {len(template_bytes)} байт", "DATA")
-            doc = Document(template_path)
-            
+        if self.debug_mode:
             self._log("\n" + "=" * 80, "TEXT")
             self._log("📄 ТЕКСТ ШАБЛОНА (ДО ГЕНЕРАЦИИ)", "TEXT")
             self._log("=" * 80, "TEXT")
-            template_text_lines = self._extract_all_text(doc)
-            for line in template_text_lines: self._log(line, "TEXT")
-            if not template_text_lines: self._log("⚠️ ШАБЛОН ПУСТОЙ!", "ERROR")
-            self._log(f"\nВСЕГО строк текста в шаблоне: {len(template_text_lines)}", "DATA")
-            self._log("=" * 80, "TEXT")
-            
-            template_vars = set()
-            self._log("\n🔍 ПОИСК ПЕРЕМЕННЫХ В ШАБЛОНЕ:", "INFO")
-            for paragraph in doc.paragraphs: template_vars.update(self.placeholder_pattern.findall(paragraph.text))
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for paragraph in cell.paragraphs: template_vars.update(self.placeholder_pattern.findall(paragraph.text))
-            for section in doc.sections:
-                for paragraph in section.header.paragraphs: template_vars.update(self.placeholder_pattern.findall(paragraph.text))
-                for paragraph in section.footer.paragraphs: template_vars.update(self.placeholder_pattern.findall(paragraph.text))
-            
-            self._log(f"ВСЕГО найдено переменных в шаблоне: {len(template_vars)}", "SUCCESS")
+            for line in compiled.text_lines: self._log(line, "TEXT")
+            if not compiled.text_lines: self._log("⚠️ ШАБЛОН ПУСТОЙ!", "ERROR")
+            self._log(f"\nВСЕГО строк текста в шаблоне: {len(compiled.text_lines)}", "DATA")
+            self._log(f"ВСЕГО найдено переменных в шаблоне: {len(compiled.variables)}", "SUCCESS")
             
             context_vars = set(context.keys())
-            missing_in_context = template_vars - context_vars
-            unused_in_template = context_vars - template_vars
-            
-            if missing_in_context:
-                self._log(f"\n⚠️ ПЕРЕМЕННЫЕ В ШАБЛОНЕ, НО НЕТ В КОНТЕКСТЕ ({len(missing_in_context)}):", "WARN")
-                for var in sorted(missing_in_context): self._log(f"   {{{var}}}", "WARN")
+            unused_in_template = context_vars - compiled.variables
             if unused_in_template:
                 self._log(f"\n⚠️ ПЕРЕМЕННЫЕ В КОНТЕКСТЕ, НО НЕТ В ШАБЛОНЕ ({len(unused_in_template)}):", "WARN")
                 for var in sorted(unused_in_template): self._log(f"   {{{var}}}", "WARN")
-            
-            self._log("\n🔄 ЗАМЕНА ПЕРЕМЕННЫХ:", "INFO")
-            replacements = 0
-            replacement_stats = {}
-            
-            for paragraph in doc.paragraphs: replacements += self._replace_in_paragraph(paragraph, context, replacement_stats)
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for paragraph in cell.paragraphs: replacements += self._replace_in_paragraph(paragraph, context, replacement_stats)
-            for section in doc.sections:
-                for paragraph in section.header.paragraphs: replacements += self._replace_in_paragraph(paragraph, context, replacement_stats)
-                for paragraph in section.footer.paragraphs: replacements += self._replace_in_paragraph(paragraph, context, replacement_stats)
-            
-            self._log(f"\nВСЕГО заменено: {replacements}", "SUCCESS")
-            if replacement_stats:
-                self._log("\n📊 СТАТИСТИКА ЗАМЕН ПО ПЕРЕМЕННЫМ:", "DATA")
-                for var, count in sorted(replacement_stats.items(), key=lambda x: x[1], reverse=True):
-                    self._log(f"   {{{var}}}: {count} раз(а)", "DATA")
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as out_file:
-                doc.save(out_file.name)
-                output_path = out_file.name
-            
-            output_size = os.path.getsize(output_path)
-            self._log(f"\n💾 СОХРАНЕНИЕ РЕЗУЛЬТАТА:", "SUCCESS")
-            self._log(f"  Путь: {output_path}", "DATA")
-            self._log(f"  Размер: {output_size} байт", "DATA")
-            
-            self._log("\n" + "=" * 80, "TEXT")
-            self._log("📄 ТЕКСТ ГОТОВОГО ДОКУМЕНТА (ПОСЛЕ ГЕНЕРАЦИИ)", "TEXT")
-            self._log("=" * 80, "TEXT")
-            result_doc = Document(output_path)
-            result_text_lines = self._extract_all_text(result_doc)
-            for line in result_text_lines: self._log(line, "TEXT")
-            self._log(f"\nВСЕГО строк текста в готовом документе: {len(result_text_lines)}", "DATA")
-            self._log("=" * 80, "TEXT")
-            
-            remaining_vars = set()
-            for paragraph in result_doc.paragraphs: remaining_vars.update(self.placeholder_pattern.findall(paragraph.text))
-            for table in result_doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        for paragraph in cell.paragraphs: remaining_vars.update(self.placeholder_pattern.findall(paragraph.text))
-            if remaining_vars:
-                self._log(f"\n⚠️ В ИТОГОВОМ ДОКУМЕНТЕ ОСТАЛИСЬ ПЕРЕМЕННЫЕ ({len(remaining_vars)}):", "WARN")
-                for var in sorted(remaining_vars): self._log(f"   {{{var}}}", "WARN")
-            else:
-                self._log("\n✅ Все переменные заменены успешно", "SUCCESS")
-            
-            self._log("\n" + "=" * 80, "INFO")
-            self._log("📊 СРАВНЕНИЕ ДО/ПОСЛЕ", "INFO")
-            self._log("=" * 80, "INFO")
-            self._log(f"Строк в шаблоне: {len(template_text_lines)}", "DATA")
-            self._log(f"Строк в готовом документе: {len(result_text_lines)}", "DATA")
-            self._log(f"Заменено переменных: {replacements}", "DATA")
-            self._log(f"Осталось переменных: {len(remaining_vars)}", "DATA")
-            self._log("=" * 80, "INFO")
-            self._log("ГЕНЕРАЦИЯ ЗАВЕРШЕНА", "SUCCESS")
-            self._log("=" * 80, "INFO")
-            return output_path, replacements
-        finally:
-            if os.path.exists(template_path): os.unlink(template_path)
+        
+        doc = compiled.new_document()
+        body_paragraphs = doc.paragraphs if any(loc[1][0] == 'body' for loc in compiled.locations) else None
+        
+        self._log("\n🔄 ЗАМЕНА ПЕРЕМЕННЫХ:", "INFO")
+        replacements = 0
+        replacement_stats = {}
+        # Переменные без значения в контексте остаются в документе как есть
+        remaining_vars = set()
+        for label, locator, names in compiled.locations:
+            paragraph = compiled.resolve(doc, locator, body_paragraphs)
+            replacements += self._replace_in_paragraph(paragraph, context, replacement_stats, remaining_vars)
+        
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        document_bytes = buffer.getvalue()
+        
+        self._log(f"\nВСЕГО заменено: {replacements}", "SUCCESS")
+        if self.debug_mode and replacement_stats:
+            self._log("\n📊 СТАТИСТИКА ЗАМЕН ПО ПЕРЕМЕННЫМ:", "DATA")
+            for var, count in sorted(replacement_stats.items(), key=lambda x: x[1], reverse=True):
+                self._log(f"   {{{var}}}: {count} раз(а)", "DATA")
+        self._log(f"\n💾 РЕЗУЛЬТАТ: {len(document_bytes)} байт (в памяти)", "SUCCESS")
+        
+        if remaining_vars:
+            self._log(f"\n⚠️ В ИТОГОВОМ ДОКУМЕНТЕ ОСТАЛИСЬ ПЕРЕМЕННЫЕ ({len(remaining_vars)}):", "WARN")
+            for var in sorted(remaining_vars): self._log(f"   {{{var}}}", "WARN")
+        else:
+            self._log("\n✅ Все переменные заменены успешно", "SUCCESS")
+        
+        self._log("\n" + "=" * 80, "INFO")
+        self._log("📊 СРАВНЕНИЕ ДО/ПОСЛЕ", "INFO")
+        self._log("=" * 80, "INFO")
+        self._log(f"Строк в шаблоне: {len(compiled.text_lines)}", "DATA")
+        self._log(f"Заменено переменных: {replacements}", "DATA")
+        self._log(f"Осталось переменных: {len(remaining_vars)}", "DATA")
+        self._log("=" * 80, "INFO")
+        self._log("ГЕНЕРАЦИЯ ЗАВЕРШЕНА", "SUCCESS")
+        self._log("=" * 80, "INFO")
+        return document_bytes, replacements
 
-    def _replace_in_paragraph(self, paragraph, context, stats_dict=None):
+    def _replace_in_paragraph(self, paragraph, context, stats_dict=None, missing=None):
         original_text = paragraph.text
         if not original_text: return 0
         
-        new_text = original_text
         replacements = 0
-        for var_name, value in context.items():
-            placeholder = f"{{{{{var_name}}}}}"
-            if placeholder in new_text:
-                count = new_text.count(placeholder)
-                replacements += count
-                new_text = new_text.replace(placeholder, str(value))
-                if stats_dict is not None: stats_dict[var_name] = stats_dict.get(var_name, 0) + count
+        
+        def _substitute(match):
+            nonlocal replacements
+            var_name = match.group(1)
+            if var_name not in context:
+                if missing is not None: missing.add(var_name)
+                return match.group(0)
+            replacements += 1
+            if stats_dict is not None: stats_dict[var_name] = stats_dict.get(var_name, 0) + 1
+            return str(context[var_name])
+        
+        # ✅ Одна регулярная замена на абзац вместо перебора всех ключей контекста
+        new_text = self.placeholder_pattern.sub(_substitute, original_text)
         
         if replacements > 0:
             self._log(f"  Замена в абзаце: {replacements} переменных", "DATA")
@@ -410,18 +536,19 @@ class DocGenerationEngine:
         return replacements
 
     def save_to_database(self, request_type_id, recipient_id, issue_number, document_bytes, signatory_id=None):
+        document_hash = put_blob(self.db, document_bytes)
         q = QSqlQuery(self.db)
         q.prepare("""
             INSERT INTO krd.outgoing_requests
-            (krd_id, request_type_id, recipient_id, issue_date, issue_number, document_data, signatory_id)
-            VALUES (:krd_id, :request_type_id, :recipient_id, CURRENT_DATE, :issue_number, :document_data, :signatory_id)
+            (krd_id, request_type_id, recipient_id, issue_date, issue_number, document_hash, signatory_id)
+            VALUES (:krd_id, :request_type_id, :recipient_id, CURRENT_DATE, :issue_number, :document_hash, :signatory_id)
             RETURNING id
         """)
         q.bindValue(":krd_id", self.krd_id)
         q.bindValue(":request_type_id", request_type_id)
         q.bindValue(":recipient_id", recipient_id)
         q.bindValue(":issue_number", issue_number)
-        q.bindValue(":document_data", QByteArray(document_bytes))
+        q.bindValue(":document_hash", document_hash)
         q.bindValue(":signatory_id", signatory_id) # <-- Сохраняем ID подписанта
         
         if not q.exec(): 
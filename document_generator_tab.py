@@ -4,8 +4,8 @@
 ✅ АВТООБНОВЛЕНИЕ СПИСКОВ С repaint() И blockSignals()
 ✅ ПОЛНАЯ СОВМЕСТИМОСТЬ С QPSQL (:param вместо ?)
 ✅ КОРРЕКТНАЯ ПЕРЕДАЧА ID АДРЕСАТА В ДВИЖОК
+✅ ОПТИМИЗИРОВАНО: Записи КРД, подписанты и шаблоны для списков — из общей карточки (krd_aggregate)
 """
-import os
 import json
 import re
 import traceback
@@ -27,6 +27,8 @@ from composite_field_widget import CompositeFieldWidget
 from field_mapping_manager import FieldMappingManager
 from database_handler import DatabaseHandler
 from doc_generation_engine import DocGenerationEngine
+from krd_aggregate import KrdCard
+from reference_cache import reference_rows
 
 # ✅ ИМПОРТ ЕДИНОЙ КАРТЫ КОЛОНОК
 try:
@@ -38,11 +40,20 @@ class DocumentGeneratorTab(QWidget):
     """Главная вкладка генерации документов с автообновлением списков"""
     request_saved = pyqtSignal()
 
-    def __init__(self, krd_id, db_connection, audit_logger=None):
+    # Части карточки для списков выбора записей: (атрибут ComboBox, метка, подпись записи)
+    RELATED_PARTS = {
+        'addresses': ('address_combo', "🏠", lambda r: ", ".join(r.get(k) or '' for k in ('region', 'town', 'street', 'house'))),
+        'service_places': ('service_place_combo', "🎖️", lambda r: f"{r.get('place_name') or ''} ({r.get('postal_town') or ''})"),
+        'soch_episodes': ('soch_episode_combo', "⚠️", lambda r: f"{r.get('soch_date') or ''} - {r.get('soch_location') or ''}"),
+        'incoming_orders': ('incoming_order_combo', "📥", lambda r: f"{r.get('order_number') or ''} от {r.get('order_date') or ''} ({r.get('initiator_full_name') or ''})"),
+    }
+
+    def __init__(self, krd_id, db_connection, audit_logger=None, card=None):
         super().__init__()
         self.krd_id = krd_id
         self.db = db_connection
         self.audit_logger = audit_logger
+        self.card = card or KrdCard(db_connection, krd_id)
         self.template_variables = []
         self.db_columns = DB_COLUMNS_MAP.copy() # ✅ ЗАГРУЖАЕМ ИЗ ЕДИНОГО ИСТОЧНИКА
         self.current_template_id = None
@@ -64,9 +75,12 @@ class DocumentGeneratorTab(QWidget):
         
         self.tmpl_mgr.template_changed.connect(self.load_document_templates)
         self.init_ui()
-        self.load_document_templates()
-        self.load_related_records()
-        self.load_signatories()
+        self.card.require(*self.RELATED_PARTS, 'signatories', 'templates')
+        self._fill_templates()
+        for part in self.RELATED_PARTS:
+            self._fill_related_combo(part)
+        self._fill_signatories()
+        self.card.changed.connect(self._on_card_changed)
         
     def init_ui(self):
         layout = QVBoxLayout()
@@ -173,35 +187,37 @@ class DocumentGeneratorTab(QWidget):
         return widget
 
     def load_related_records(self):
-        """Перезагружает выпадающие списки с защитой от рекурсии сигналов"""
-        if not hasattr(self, 'address_combo'): return
-        
-        print(f"\n🔄 [AUTO-UPDATE] Начало обновления ComboBox для КРД-{self.krd_id}")
-        queries = [
-            (self.address_combo, "SELECT id, COALESCE(region,'')||', '||COALESCE(town,'')||', '||COALESCE(street,'')||', '||COALESCE(house,'') FROM krd.addresses WHERE krd_id=:krd_id AND (is_deleted = FALSE OR is_deleted IS NULL) ORDER BY id DESC", "🏠"),
-            (self.service_place_combo, "SELECT id, COALESCE(place_name,'')||' ('||COALESCE(postal_town,'')||')' FROM krd.service_places WHERE krd_id=:krd_id AND (is_deleted = FALSE OR is_deleted IS NULL) ORDER BY id DESC", "🎖️"),
-            (self.soch_episode_combo, "SELECT id, COALESCE(soch_date::text,'')||' - '||COALESCE(soch_location,'') FROM krd.soch_episodes WHERE krd_id=:krd_id AND (is_deleted = FALSE OR is_deleted IS NULL) ORDER BY soch_date DESC", "⚠️"),
-            (self.incoming_order_combo, "SELECT id, CONCAT(order_number, ' от ', order_date::text, ' (', initiator_full_name, ')') FROM krd.incoming_orders WHERE krd_id=:krd_id AND (is_deleted = FALSE OR is_deleted IS NULL) ORDER BY id DESC", "📥")
-        ]
-        
-        for combo, sql, label in queries:
-            combo.blockSignals(True)
-            current_id = combo.currentData()
-            combo.clear()
-            combo.addItem("— Не выбрано —", None)
-            
-            q = QSqlQuery(self.db)
-            q.prepare(sql)
-            q.bindValue(":krd_id", self.krd_id)
-            if q.exec():
-                while q.next(): combo.addItem(f"{label} {q.value(1)}", q.value(0))
-            
-            if current_id is not None:
-                idx = combo.findData(current_id)
-                if idx >= 0: combo.setCurrentIndex(idx)
-            combo.blockSignals(False)
-            combo.repaint()
-        print("✅ [AUTO-UPDATE] Обновление завершено\n")
+        """Перечитывает записи КРД для списков выбора — один запрос, обновляются и вкладки этих записей"""
+        print(f"🔄 [AUTO-UPDATE] Обновление списков записей для КРД-{self.krd_id}")
+        self.card.refresh(*self.RELATED_PARTS)
+
+    def _on_card_changed(self, part):
+        if part in self.RELATED_PARTS:
+            self._fill_related_combo(part)
+        elif part == 'signatories':
+            self._fill_signatories()
+        elif part == 'templates':
+            self._fill_templates()
+
+    def _fill_related_combo(self, part):
+        """Заполняет список выбора из карточки с сохранением выбора и защитой от рекурсии сигналов"""
+        combo_attr, label, describe = self.RELATED_PARTS[part]
+        combo = getattr(self, combo_attr)
+        rows = [r for r in self.card.get(part) or [] if not r.get('is_deleted')]
+        if part == 'incoming_orders':
+            rows.sort(key=lambda r: r['id'], reverse=True)
+
+        combo.blockSignals(True)
+        current_id = combo.currentData()
+        combo.clear()
+        combo.addItem("— Не выбрано —", None)
+        for row in rows:
+            combo.addItem(f"{label} {describe(row)}", row['id'])
+        if current_id is not None:
+            idx = combo.findData(current_id)
+            if idx >= 0: combo.setCurrentIndex(idx)
+        combo.blockSignals(False)
+        combo.repaint()
 
     def on_incoming_order_selected(self, index): self.selected_incoming_order_id = self.incoming_order_combo.currentData()
     def on_address_selected(self, index): self.selected_address_id = self.address_combo.currentData()
@@ -230,18 +246,17 @@ class DocumentGeneratorTab(QWidget):
         return tables
 
     def load_document_templates(self):
+        self.card.refresh('templates')
+
+    def _fill_templates(self):
         self.template_combo.clear()
         self.template_combo.addItem("— Не выбрано —", None)
-        q = QSqlQuery(self.db)
-        q.prepare("SELECT id, name FROM krd.document_templates WHERE is_deleted=FALSE ORDER BY name")
-        if q.exec():
-            while q.next(): self.template_combo.addItem(q.value(1), q.value(0))
+        for row in self.card.get('templates') or []:
+            self.template_combo.addItem(row['name'], row['id'])
 
     def _get_default_request_type_id(self):
-        q = QSqlQuery(self.db)
-        q.prepare("SELECT id FROM krd.request_types ORDER BY name LIMIT 1")
-        if q.exec() and q.next(): return q.value(0)
-        return None
+        request_types = reference_rows(self.db, 'request_types')
+        return request_types[0][0] if request_types else None
 
     def _get_used_source_tables(self, template_id):
         query = QSqlQuery(self.db)
@@ -291,23 +306,14 @@ class DocumentGeneratorTab(QWidget):
         }
         
         try:
-            q = QSqlQuery(self.db)
-            q.prepare("SELECT template_data, name FROM krd.document_templates WHERE id = :tid")
-            q.bindValue(":tid", tid)
-            if not q.exec() or not q.next(): raise Exception("Шаблон не найден в БД")
-                
-            tpl_name = q.value(1)
-            tpl_data = bytes(q.value(0)) if not isinstance(q.value(0), bytes) else q.value(0)
+            compiled = self.engine.load_compiled_template(tid)
+            tpl_name = compiled.name
             
             context = self.engine.build_context(tid, selections)
-            output_path, replacements = self.engine.apply_to_docx(tpl_data, context)
+            doc_bytes, replacements = self.engine.render_compiled(compiled, context)
             
             num = self.engine.generate_issue_number()
-            with open(output_path, 'rb') as f: doc_bytes = f.read()
-                
-            # Найдите строку:
             request_id = self.engine.save_to_database(rt_id, rec_id, num, doc_bytes, self.selected_signatory_id)
-            os.unlink(output_path)
             
             QMessageBox.information(self, "Успех", f"Документ успешно сгенерирован!\n📄 Шаблон: {tpl_name}\n🔢 Номер: {num}\n🔄 Заменено переменных: {replacements}")
             self.request_saved.emit()
@@ -319,21 +325,16 @@ class DocumentGeneratorTab(QWidget):
         # ✅ ТЕПЕРЬ ВОЗВРАЩАЕМ ЕДИНУЮ КАРТУ ВМЕСТО ХАРДКОДА
         return self.db_columns
     def load_signatories(self):
-        """Загрузка списка подписантов в ComboBox"""
+        """Перечитывает список подписантов из базы"""
+        self.card.refresh('signatories')
+
+    def _fill_signatories(self):
+        """Заполнение ComboBox подписантов из карточки"""
         current_id = self.signatory_combo.currentData()
         self.signatory_combo.clear()
         self.signatory_combo.addItem("— Не выбрано —", None)
-        
-        q = QSqlQuery(self.db)
-        q.prepare("""
-            SELECT id, full_name || ' (' || COALESCE(rank, '') || ', ' || COALESCE(garrison, '') || ')' 
-            FROM krd.signatories 
-            WHERE is_deleted = FALSE 
-            ORDER BY full_name
-        """)
-        if q.exec():
-            while q.next():
-                self.signatory_combo.addItem(q.value(1), q.value(0))
+        for row in self.card.get('signatories') or []:
+            self.signatory_combo.addItem(row['name'], row['id'])
                 
         if current_id is not None:
             idx = self.signatory_combo.findData(current_id)
@@ -5,16 +5,25 @@
 ✅ ЧИСТЫЕ ЗАГОЛОВКИ: Убраны префиксы названий таблиц из заголовков Excel
 ✅ БЕЗОПАСНОСТЬ: Все SQL-запросы используют bindValue
 ✅ ФОРМАТИРОВАНИЕ: Корректные aRGB цвета для openpyxl
+✅ ОПТИМИЗИРОВАНО: Каждая секция читается одним запросом по всем КРД (krd_id = ANY(:ids)) вместо 6×N запросов
+✅ ОПТИМИЗИРОВАНО: Выбираются только поля, отмеченные в report_config["fields"]; слияние секций по krd_id
+✅ ОПТИМИЗИРОВАНО: Потоковая запись списка (write_only + именованные стили), чтение серверными курсорами
+✅ ДОБАВЛЕНО: Прогресс по КРД и отмена экспорта списка (недописанный файл удаляется)
 """
 from PyQt6.QtSql import QSqlQuery
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill, NamedStyle
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils import get_column_letter
 from openpyxl.cell.cell import MergedCell
 import os
 import traceback
 
 
+class ExportCancelled(Exception):
+    """Экспорт прерван пользователем"""
+
+
 class KrdExcelExporter:
     """Экспорт данных КРД в Excel с поддержкой конфигурации отчета"""
 
@@ -94,6 +103,78 @@ class KrdExcelExporter:
         }
     }
 
+    # Порядок секций в плоском списке
+    FLAT_SECTION_ORDER = ["social_data", "addresses", "service_places", "incoming_orders", "soch_episodes", "outgoing_requests"]
+
+    # Источники секций: FROM с JOIN на справочники, выражения для вычисляемых полей
+    # (остальные поля берутся как <alias>.<поле>), сортировка записей внутри КРД
+    SECTION_SOURCES = {
+        "social_data": {
+            "alias": "s",
+            "from": """krd.social_data s
+                LEFT JOIN krd.krd kr ON s.krd_id = kr.id
+                LEFT JOIN krd.categories c ON s.category_id = c.id
+                LEFT JOIN krd.ranks r ON s.rank_id = r.id
+                LEFT JOIN krd.statuses st ON kr.status_id = st.id""",
+            "columns": {
+                "krd_number": "'КРД-' || s.krd_id",
+                "krd_status": "COALESCE(st.name, 'Не задан')",
+                "category_name": "c.name",
+                "rank_name": "r.name",
+            },
+            "order": "s.id DESC",
+            "latest_only": True,
+        },
+        "addresses": {
+            "alias": "a",
+            "from": "krd.addresses a",
+            "columns": {},
+            "order": "a.id DESC",
+        },
+        "service_places": {
+            "alias": "s",
+            "from": """krd.service_places s
+                LEFT JOIN krd.military_units m ON s.military_unit_id = m.id
+                LEFT JOIN krd.garrisons g ON s.garrison_id = g.id
+                LEFT JOIN krd.positions p ON s.position_id = p.id""",
+            "columns": {"military_unit_name": "m.name", "garrison_name": "g.name", "position_name": "p.name"},
+            "order": "s.id DESC",
+        },
+        "incoming_orders": {
+            "alias": "i",
+            "from": "krd.incoming_orders i LEFT JOIN krd.military_units m ON i.military_unit_id = m.id",
+            "columns": {"military_unit_name": "m.name"},
+            "order": "i.receipt_date DESC",
+        },
+        "soch_episodes": {
+            "alias": "e",
+            "from": "krd.soch_episodes e",
+            "columns": {},
+            "order": "e.soch_date DESC",
+        },
+        "outgoing_requests": {
+            "alias": "r",
+            "from": """krd.outgoing_requests r
+                LEFT JOIN krd.request_types t ON r.request_type_id = t.id
+                LEFT JOIN krd.military_units m ON r.military_unit_id = m.id
+                LEFT JOIN krd.recipients rc ON r.recipient_id = rc.id""",
+            "columns": {
+                "request_type_name": "t.name", "military_unit_name": "m.name",
+                "recipient_name": "rc.name", "recipient_contacts": "rc.contacts",
+                "postal_index": "rc.postal_index", "postal_region": "rc.postal_region",
+                "postal_town": "rc.postal_town", "postal_street": "rc.postal_street",
+                "postal_house": "rc.postal_house",
+            },
+            "order": "r.issue_date DESC",
+        },
+    }
+
+    HEADER_STYLE = "krd_list_header"
+    CELL_STYLE = "krd_list_cell"
+    WIDTH_SAMPLE_ROWS = 500      # По скольким первым строкам считается ширина колонок
+    MAX_COLUMN_WIDTH = 40
+    CURSOR_FETCH_SIZE = 1000     # Строк за один FETCH серверного курсора
+
     def __init__(self, db_connection, krd_id=None, report_config=None):
         self.db = db_connection
         self.krd_id = krd_id
@@ -141,8 +222,18 @@ class KrdExcelExporter:
         """Вспомогательный метод для вывода в консоль"""
         print(f"[{level}] {message}")
 
-    def export_multiple_krd_to_excel(self, file_path, krd_ids=None):
-        """✅ ЭКСПОРТ СПИСКА: Все данные на одном листе в виде плоской таблицы"""
+    def export_multiple_krd_to_excel(self, file_path, krd_ids=None, progress_callback=None, cancel_check=None):
+        """
+        ✅ ЭКСПОРТ СПИСКА: Все данные на одном листе в виде плоской таблицы.
+        Потоковая запись (write_only): строки уходят в файл сразу, секции читаются
+        серверными курсорами порциями по CURSOR_FETCH_SIZE — память не растет с числом КРД.
+        Args:
+            progress_callback: callable(обработано КРД, всего КРД, записано строк) — после каждой КРД
+            cancel_check: callable() -> bool; при True экспорт прерывается с ExportCancelled
+        """
+        in_transaction = False
+        wb = None
+        saving = False
         try:
             self._log("EXPORT", "🚀 " + "="*60)
             self._log("EXPORT", "🚀 НАЧАЛО ЭКСПОРТА СПИСКА КРД")
@@ -154,16 +245,22 @@ class KrdExcelExporter:
                 raise Exception("Не указан список КРД для экспорта")
 
             self._log("EXPORT", f"📋 Всего записей для экспорта: {len(krd_ids)}")
-            self.wb.remove(self.wb.active)
-            ws = self.wb.create_sheet("Список КРД")
-            
-            # Вызываем метод для заполнения таблицы
-            current_row = self._fill_flat_list_table(ws, krd_ids)
+            wb = Workbook(write_only=True)
+            self._register_named_styles(wb)
+            ws = wb.create_sheet("Список КРД")
+
+            # Курсоры PostgreSQL живут только внутри транзакции
+            in_transaction = self.db.transaction()
+            if not in_transaction:
+                self._log("WARN", f"⚠️ Транзакция не открыта, чтение без курсоров: {self.db.lastError().text()}")
+            current_row = self._write_flat_list_table(ws, krd_ids, in_transaction, progress_callback, cancel_check)
+            if in_transaction:
+                self.db.commit()
+                in_transaction = False
             
-            self._adjust_column_widths(ws)
-            
-            self._log("EXPORT", f"💾 Сохранение файла: {file_path}")
-            self.wb.save(file_path)
+            self._log("EXPORT", f"💾 Сохранение файла: {file_path} (строк: {current_row - 1})")
+            saving = True
+            wb.save(file_path)
             self._cleanup_temp_files()
             
             self._log("EXPORT", "✅ " + "="*60)
@@ -171,333 +268,249 @@ class KrdExcelExporter:
             self._log("EXPORT", "✅ " + "="*60)
             return True
         except Exception as e:
-            self._log("ERROR", f"✗ ОШИБКА ЭКСПОРТА: {e}")
-            traceback.print_exc()
+            if isinstance(e, ExportCancelled):
+                self._log("EXPORT", "⚠️ Экспорт отменен пользователем")
+            else:
+                self._log("ERROR", f"✗ ОШИБКА ЭКСПОРТА: {e}")
+                traceback.print_exc()
+            if in_transaction:
+                self.db.rollback()
+            self._discard_workbook(wb, file_path if saving else None)
             self._cleanup_temp_files()
             raise
 
-    def _fill_flat_list_table(self, ws, krd_ids):
+    def _discard_workbook(self, wb, partial_path=None):
+        """Удаляет временные файлы потоковых листов и недописанный файл отчета"""
+        for ws in (wb.worksheets if wb is not None else []):
+            writer = getattr(ws, "_writer", None)
+            if writer is None:
+                continue
+            try:
+                writer.close()
+                writer.cleanup()
+            except Exception:
+                pass
+        if partial_path and os.path.exists(partial_path):
+            try:
+                os.remove(partial_path)
+                self._log("EXPORT", f"🗑️ Удален недописанный файл: {partial_path}")
+            except OSError as e:
+                self._log("WARN", f"⚠️ Не удалось удалить недописанный файл: {e}")
+
+    def _register_named_styles(self, wb):
+        """Общие именованные стили: в файл попадает один стиль на все ячейки, а не копия на каждую"""
+        wb.add_named_style(NamedStyle(
+            name=self.HEADER_STYLE, font=self.header_font, fill=self.header_fill,
+            alignment=self.header_alignment, border=self.thin_border
+        ))
+        wb.add_named_style(NamedStyle(name=self.CELL_STYLE, border=self.thin_border))
+
+    def _styled_row(self, ws, values, style):
+        row = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = style
+            row.append(cell)
+        return row
+
+    def _write_flat_list_table(self, ws, krd_ids, use_cursors=True, progress_callback=None, cancel_check=None):
         """
-        Заполнение Excel-листа в виде ЕДИНОГО СПИСКА.
+        Заполнение Excel-листа в виде ЕДИНОГО СПИСКА (потоково).
         ✅ Убраны префиксы таблиц из заголовков.
         ✅ Корректная работа с множественными данными (адреса, места службы).
+        ✅ Каждая секция читается одним запросом по всем КРД и сливается по krd_id.
+        ✅ Ширина колонок считается по мере выдачи первых WIDTH_SAMPLE_ROWS строк:
+           в write_only-режиме ее нужно задать до первой записанной строки.
         """
-        row = 1
-        sections = self.report_config.get("sections", [])
-        fields_config = self.report_config.get("fields", {})
-
-        self._log("DEBUG", "📐 Формирование заголовков таблицы...")
-        
-        # Формируем единый список колонок для шапки
-        columns = []
-        
-        # 1. Основные данные (Social Data)
-        all_soc = self.AVAILABLE_FIELDS["social_data"]["fields"]
-        
-        # Проверяем, есть ли настройки полей для этой секции в конфиге
-        if "social_data" in fields_config:
-            soc_fields = fields_config["social_data"]
-            selected_soc = [(k, v) for k, v in all_soc if k in soc_fields]
-        else:
-            selected_soc = all_soc
-            
-        columns.extend([(k, v, "social") for k, v in selected_soc])
-
-        # 2. Секции с множественными данными
-        for sec_key in ["addresses", "service_places", "incoming_orders", "soch_episodes", "outgoing_requests"]:
-            if sec_key in sections:
-                all_sec = self.AVAILABLE_FIELDS[sec_key]["fields"]
-                
-                # Проверяем настройки полей для текущей секции
-                if sec_key in fields_config:
-                    sec_fields = fields_config[sec_key]
-                    selected_sec = [(k, v) for k, v in all_sec if k in sec_fields]
-                else:
-                    selected_sec = all_sec
-                
-                # ✅ ИСПРАВЛЕНО: Убран префикс с названием таблицы (было f"[{sec_key.upper()}] {v}")
-                # Теперь добавляем просто (k, v, sec_key)
-                columns.extend([(k, v, sec_key) for k, v in selected_sec])
-
+        columns = self._get_selected_columns()
         self._log("DEBUG", f"📊 Сформировано {len(columns)} колонок")
 
-        # Рисуем шапку
-        for c, (_, field_name, _) in enumerate(columns, 1):
-            cell = ws.cell(row=row, column=c, value=field_name)
-            cell.font = self.header_font
-            cell.fill = self.header_fill
-            cell.alignment = self.header_alignment
-            cell.border = self.thin_border
-        row += 1
-
-        # Заполняем данными
-        for krd_idx, krd_id in enumerate(krd_ids, 1):
-            self._log("DATA", f"📝 Обработка КРД-{krd_id} ({krd_idx}/{len(krd_ids)})...")
-            
-            # Загружаем данные
-            social = self._load_social_data_for_krd(krd_id)
-            if not social:
-                self._log("WARN", f"⚠️ Нет социальных данных для КРД-{krd_id}. Пропуск.")
-                continue
-
-            # Загружаем списки связанных данных (если секция включена в конфиг)
-            addresses = self._load_addresses_for_krd(krd_id) if "addresses" in sections else []
-            service_places = self._load_service_places_for_krd(krd_id) if "service_places" in sections else []
-            incoming_orders = self._load_incoming_orders_for_krd(krd_id) if "incoming_orders" in sections else []
-            soch_episodes = self._load_soch_episodes_for_krd(krd_id) if "soch_episodes" in sections else []
-            outgoing_requests = self._load_outgoing_requests_for_krd(krd_id) if "outgoing_requests" in sections else []
+        widths = [0] * len(columns)
+        sample = []
+        row = 1
 
-            # Определяем, сколько строк нужно для этой КРД (максимум из всех связанных списков)
-            list_counts = [len(lst) for lst in [addresses, service_places, incoming_orders, soch_episodes, outgoing_requests]]
-            max_rows = max([1] + list_counts)
-            
-            self._log("DEBUG", f"   📏 Строк для КРД-{krd_id}: {max_rows}")
+        def emit(values, style):
+            nonlocal sample
+            if sample is not None:
+                for i, value in enumerate(values):
+                    if value:
+                        widths[i] = max(widths[i], len(str(value)))
+                sample.append((values, style))
+                if len(sample) < self.WIDTH_SAMPLE_ROWS:
+                    return
+                flush_sample()
+                return
+            ws.append(self._styled_row(ws, values, style))
+
+        def flush_sample():
+            nonlocal sample
+            for i, width in enumerate(widths, 1):
+                ws.column_dimensions[get_column_letter(i)].width = min(width + 3, self.MAX_COLUMN_WIDTH)
+            for values, style in sample:
+                ws.append(self._styled_row(ws, values, style))
+            sample = None
+
+        emit([field_name for _, field_name, _ in columns], self.HEADER_STYLE)
+        row += 1
 
-            # Заполняем строки
-            for r_idx in range(max_rows):
-                for c_idx, (key, _, sec_type) in enumerate(columns, 1):
-                    value = ""
-                    
-                    # Логика заполнения в зависимости от типа колонки
-                    if sec_type == "social":
-                        # Соц. данные только в самой первой строке (r_idx == 0)
-                        if r_idx == 0:
-                            val = social.get(key)
-                            value = self._format_date(val) if key.endswith('_date') else (val or '')
-                        else:
-                            value = "" # Остальные строки пустые для соц. данных
-                    
-                    elif sec_type == "addresses" and len(addresses) > 0:
-                        if r_idx < len(addresses):
-                            val = addresses[r_idx].get(key)
-                            value = self._format_date(val) if key.endswith('_date') else (val or '')
-                    
-                    elif sec_type == "service_places" and len(service_places) > 0:
-                        if r_idx < len(service_places):
-                            val = service_places[r_idx].get(key)
-                            value = val or '' 
-                    
-                    elif sec_type == "incoming_orders" and len(incoming_orders) > 0:
-                        if r_idx < len(incoming_orders):
-                            val = incoming_orders[r_idx].get(key)
-                            value = self._format_date(val) if key.endswith('_date') else (val or '')
-                            
-                    elif sec_type == "soch_episodes" and len(soch_episodes) > 0:
-                        if r_idx < len(soch_episodes):
-                            val = soch_episodes[r_idx].get(key)
-                            value = self._format_date(val) if key.endswith('_date') else (val or '')
-
-                    elif sec_type == "outgoing_requests" and len(outgoing_requests) > 0:
-                        if r_idx < len(outgoing_requests):
-                            val = outgoing_requests[r_idx].get(key)
-                            value = self._format_date(val) if key.endswith('_date') else (val or '')
-
-                    # Записываем в ячейку
-                    ws.cell(row=row, column=c_idx, value=value).border = self.thin_border
-                
+        total = len(set(krd_ids))
+        for done, krd_rows in enumerate(self._iter_krd_rows(columns, krd_ids, use_cursors), 1):
+            for values in krd_rows:
+                emit(values, self.CELL_STYLE)
                 row += 1
+            if progress_callback:
+                progress_callback(done, total, row - 2)
+            if cancel_check and cancel_check():
+                raise ExportCancelled()
+        if sample is not None:
+            flush_sample()
 
         self._log("DEBUG", f"🏁 Заполнение таблицы завершено. Последняя строка: {row}")
         return row
 
-    # ================= ЗАГРУЗЧИКИ ДАННЫХ (БЕЗОПАСНЫЕ SQL) =================
-    def _load_social_data_for_krd(self, krd_id):
-        q = QSqlQuery(self.db)
-        q.prepare(""" SELECT kr.id as krd_id, s.tab_number, s.personal_number, 
-                   c.name as category_name, r.name as rank_name,
-                   COALESCE(st.name, 'Не задан') as krd_status, 
-                   s.surname, s.name, s.patronymic, s.birth_date, 
-                   s.birth_place_town, s.birth_place_district, s.birth_place_region, s.birth_place_country,
-                   s.drafted_by_commissariat, s.draft_date, s.povsk, s.selection_date, 
-                   s.education, s.criminal_record, s.social_media_account, s.bank_card_number,
-                   s.passport_series, s.passport_number, s.passport_issue_date, s.passport_issued_by,
-                   s.military_id_series, s.military_id_number, s.military_id_issue_date, s.military_id_issued_by,
-                   s.appearance_features, s.personal_marks, s.federal_search_info, 
-                   s.military_contacts, s.relatives_info
-            FROM krd.social_data s
-            LEFT JOIN krd.krd kr ON s.krd_id = kr.id
-            LEFT JOIN krd.categories c ON s.category_id = c.id
-            LEFT JOIN krd.ranks r ON s.rank_id = r.id
-            LEFT JOIN krd.statuses st ON kr.status_id = st.id
-            WHERE s.krd_id = :krd_id ORDER BY s.id DESC LIMIT 1""")
-        q.bindValue(":krd_id", krd_id)
-        if not q.exec():
-            self._log("SQL", f"❌ Ошибка SQL (social_data): {q.lastError().text()}")
-            return {}
-        if q.next():
-            return {
-                 "krd_number": f"КРД-{q.value('krd_id')}",
-                "krd_status": q.value("krd_status"), # ✅ ВОЗВРАЩАЕМ СТАТУС
-                "tab_number": q.value("tab_number") or "", 
-                "personal_number": q.value("personal_number") or "",
-                "category_name": q.value("category_name") or "", 
-                "rank_name": q.value("rank_name") or "", 
-                "surname": q.value("surname") or "",
-                "name": q.value("name") or "", 
-                "patronymic": q.value("patronymic") or "", 
-                "birth_date": q.value("birth_date"),
-                "birth_place_town": q.value("birth_place_town") or "", 
-                "birth_place_district": q.value("birth_place_district") or "",
-                "birth_place_region": q.value("birth_place_region") or "", 
-                "birth_place_country": q.value("birth_place_country") or "",
-                "drafted_by_commissariat": q.value("drafted_by_commissariat") or "", 
-                "draft_date": q.value("draft_date"),
-                "povsk": q.value("povsk") or "", 
-                "selection_date": q.value("selection_date"), 
-                "education": q.value("education") or "",
-                "criminal_record": q.value("criminal_record") or "", 
-                "social_media_account": q.value("social_media_account") or "",
-                "bank_card_number": q.value("bank_card_number") or "", 
-                "passport_series": q.value("passport_series") or "",
-                "passport_number": q.value("passport_number") or "", 
-                "passport_issue_date": q.value("passport_issue_date"),
-                "passport_issued_by": q.value("passport_issued_by") or "", 
-                "military_id_series": q.value("military_id_series") or "",
-                "military_id_number": q.value("military_id_number") or "", 
-                "military_id_issue_date": q.value("military_id_issue_date"),
-                "military_id_issued_by": q.value("military_id_issued_by") or "", 
-                "appearance_features": q.value("appearance_features") or "",
-                "personal_marks": q.value("personal_marks") or "", 
-                "federal_search_info": q.value("federal_search_info") or "",
-                "military_contacts": q.value("military_contacts") or "", 
-                "relatives_info": q.value("relatives_info") or ""
-                }
-        return {}
-
-    def _load_addresses_for_krd(self, krd_id):
-        q = QSqlQuery(self.db)
-        q.prepare("SELECT * FROM krd.addresses WHERE krd_id = :krd_id ORDER BY id DESC")
-        q.bindValue(":krd_id", krd_id)
-        if not q.exec():
-            self._log("SQL", f"❌ Ошибка SQL (addresses): {q.lastError().text()}")
+    def _get_selected_columns(self):
+        """Единый список колонок отчета: [(поле, заголовок, секция)] по sections/fields конфигурации"""
+        sections = self.report_config.get("sections", [])
+        fields_config = self.report_config.get("fields", {})
+        columns = []
+        for sec_key in self.FLAT_SECTION_ORDER:
+            # Основные данные выгружаются всегда, остальные секции — если включены
+            if sec_key != "social_data" and sec_key not in sections:
+                continue
+            all_fields = self.AVAILABLE_FIELDS[sec_key]["fields"]
+            if sec_key in fields_config:
+                selected = [(k, v) for k, v in all_fields if k in fields_config[sec_key]]
+            else:
+                selected = all_fields
+            columns.extend([(k, v, sec_key) for k, v in selected])
+        return columns
+
+    def _iter_krd_rows(self, columns, krd_ids, use_cursors=False):
+        """
+        Слияние секций по krd_id: на каждую КРД отдает список строк листа
+        (соц. данные в первой строке, связанные записи — построчно).
+        """
+        krd_ids = sorted(set(krd_ids))
+        section_keys = {}
+        for key, _, sec_key in columns:
+            section_keys.setdefault(sec_key, []).append(key)
+        list_sections = [sec for sec in self.FLAT_SECTION_ORDER if sec != "social_data" and sec in section_keys]
+
+        def open_section(sec, keys):
+            return self._iter_section_groups(sec, keys, krd_ids, f"export_{sec}" if use_cursors else None)
+
+        social_rows = open_section("social_data", section_keys.get("social_data", []))
+        cursors = {sec: open_section(sec, section_keys[sec]) for sec in list_sections}
+        pending = {sec: next(cursor, None) for sec, cursor in cursors.items()}
+
+        def take(sec, krd_id):
+            # Группы в обоих потоках упорядочены по krd_id — сдвигаемся до нужной КРД
+            while pending[sec] is not None and pending[sec][0] < krd_id:
+                pending[sec] = next(cursors[sec], None)
+            if pending[sec] is not None and pending[sec][0] == krd_id:
+                rows = pending[sec][1]
+                pending[sec] = next(cursors[sec], None)
+                return rows
             return []
-        results = []
-        record = q.record()
-        field_count = record.count()
-        field_names = [record.fieldName(i) for i in range(field_count)]
-        
-        while q.next():
-            row_dict = {}
-            for field_name in field_names:
-                row_dict[field_name] = q.value(field_name) or ""
-            results.append(row_dict)
-            
-        self._log("DATA", f"   📍 Загружено адресов: {len(results)}")
-        return results
 
-    def _load_service_places_for_krd(self, krd_id):
-        q = QSqlQuery(self.db)
-        q.prepare("""
-            SELECT s.place_name, s.military_unit_number, m.name as military_unit_name, 
-                   g.name as garrison_name, p.name as position_name, s.commanders,
-                   s.postal_index, s.postal_region, s.postal_district, s.postal_town, 
-                   s.postal_street, s.postal_house, s.place_contacts
-            FROM krd.service_places s
-            LEFT JOIN krd.military_units m ON s.military_unit_id = m.id
-            LEFT JOIN krd.garrisons g ON s.garrison_id = g.id
-            LEFT JOIN krd.positions p ON s.position_id = p.id
-            WHERE s.krd_id = :krd_id ORDER BY s.id DESC
-        """)
-        q.bindValue(":krd_id", krd_id)
-        if not q.exec():
-            self._log("SQL", f"❌ Ошибка SQL (service_places): {q.lastError().text()}")
-            return []
-            
-        results = []
-        while q.next():
-            results.append({
-                "place_name": q.value("place_name") or "",
-                "military_unit_number": q.value("military_unit_number") or "", # ✅ НОВОЕ ПОЛЕ
-                "military_unit_name": q.value("military_unit_name") or "",
-                "garrison_name": q.value("garrison_name") or "", 
-                "position_name": q.value("position_name") or "",
-                "commanders": q.value("commanders") or "", 
-                "postal_index": q.value("postal_index") or "",
-                "postal_region": q.value("postal_region") or "", 
-                "postal_district": q.value("postal_district") or "",
-                "postal_town": q.value("postal_town") or "", 
-                "postal_street": q.value("postal_street") or "",
-                "postal_house": q.value("postal_house") or "", 
-                "place_contacts": q.value("place_contacts") or ""
-            })
-        self._log("DATA", f"   🎖️ Загружено мест службы: {len(results)}")
-        return results
-
-    def _load_incoming_orders_for_krd(self, krd_id):
-        q = QSqlQuery(self.db)
-        q.prepare("""SELECT i.initiator_full_name, i.order_date, i.order_number, i.receipt_date, i.receipt_number, 
-            i.postal_index, i.postal_region, i.postal_district, i.postal_town, i.postal_street, i.postal_house, 
-            i.initiator_contacts, i.our_response_date, i.our_response_number, m.name as military_unit_name 
-            FROM krd.incoming_orders i 
-            LEFT JOIN krd.military_units m ON i.military_unit_id = m.id 
-            WHERE i.krd_id = :krd_id ORDER BY i.receipt_date DESC""")
-        q.bindValue(":krd_id", krd_id)
-        if not q.exec():
-            self._log("SQL", f"❌ Ошибка SQL (incoming_orders): {q.lastError().text()}")
-            return []
-        results = []
-        while q.next():
-            results.append({
-                "initiator_full_name": q.value("initiator_full_name") or "", "order_date": q.value("order_date"),
-                "order_number": q.value("order_number") or "", "receipt_date": q.value("receipt_date"),
-                "receipt_number": q.value("receipt_number") or "", "postal_index": q.value("postal_index") or "",
-                "postal_region": q.value("postal_region") or "", "postal_district": q.value("postal_district") or "",
-                "postal_town": q.value("postal_town") or "", "postal_street": q.value("postal_street") or "",
-                "postal_house": q.value("postal_house") or "", "initiator_contacts": q.value("initiator_contacts") or "",
-                "our_response_date": q.value("our_response_date"), "our_response_number": q.value("our_response_number") or "",
-                "military_unit_name": q.value("military_unit_name") or ""
-            })
-        self._log("DATA", f"   📬 Загружено поручений: {len(results)}")
-        return results
-
-    def _load_soch_episodes_for_krd(self, krd_id):
-        q = QSqlQuery(self.db)
-        q.prepare("""SELECT soch_date, soch_location, order_date_number, witnesses, reasons, weapon_info, clothing, 
-            movement_options, search_date, found_by, notification_date, notification_number 
-            FROM krd.soch_episodes 
-            WHERE krd_id = :krd_id ORDER BY soch_date DESC""")
-        q.bindValue(":krd_id", krd_id)
-        if not q.exec():
-            self._log("SQL", f"❌ Ошибка SQL (soch_episodes): {q.lastError().text()}")
-            return []
-        results = []
-        while q.next():
-            results.append({
-                "soch_date": q.value("soch_date"), "soch_location": q.value("soch_location") or "",
-                "order_date_number": q.value("order_date_number") or "", "witnesses": q.value("witnesses") or "",
-                "reasons": q.value("reasons") or "", "weapon_info": q.value("weapon_info") or "",
-                "clothing": q.value("clothing") or "", "movement_options": q.value("movement_options") or "",
-                "search_date": q.value("search_date"), "found_by": q.value("found_by") or "",
-                "notification_date": q.value("notification_date"), "notification_number": q.value("notification_number") or ""
-            })
-        self._log("DATA", f"   ⚠️ Загружено эпизодов СОЧ: {len(results)}")
-        return results
-
-    def _load_outgoing_requests_for_krd(self, krd_id):
+        total = len(krd_ids)
+        for krd_idx, (krd_id, social) in enumerate(social_rows, 1):
+            related = {sec: take(sec, krd_id) for sec in list_sections}
+            max_rows = max([1] + [len(rows) for rows in related.values()])
+            if krd_idx % 1000 == 0:
+                self._log("DATA", f"📝 Обработано КРД: {krd_idx} (последняя КРД-{krd_id}, всего запрошено {total})")
+
+            krd_rows = []
+            for r_idx in range(max_rows):
+                values = []
+                for key, _, sec_key in columns:
+                    if sec_key == "social_data":
+                        # Соц. данные только в самой первой строке
+                        record = social[0] if r_idx == 0 else None
+                    else:
+                        rows = related[sec_key]
+                        record = rows[r_idx] if r_idx < len(rows) else None
+                    values.append(self._format_cell(key, record.get(key)) if record else "")
+                krd_rows.append(values)
+            yield krd_rows
+
+    def _format_cell(self, key, val):
+        return self._format_date(val) if key.endswith('_date') else (val or '')
+
+    # ================= ЗАГРУЗЧИКИ ДАННЫХ (МНОЖЕСТВЕННЫЕ ЗАПРОСЫ) =================
+    def _build_section_query(self, sec_key, keys, krd_ids):
+        """SELECT только выбранных полей секции для множества КРД, упорядоченный по krd_id"""
+        source = self.SECTION_SOURCES[sec_key]
+        alias = source["alias"]
+        select_parts = [f"{alias}.krd_id"]
+        for key in keys:
+            expr = source["columns"].get(key, f"{alias}.{key}")
+            select_parts.append(f"{expr} AS {key}")
+        distinct = f"DISTINCT ON ({alias}.krd_id) " if source.get("latest_only") else ""
+        # Номера подставляются литералом массива (только int): DECLARE CURSOR не принимает параметры через QtSql
+        ids_literal = "{" + ",".join(str(int(k)) for k in krd_ids) + "}"
+        return f"""
+            SELECT {distinct}{', '.join(select_parts)}
+            FROM {source['from']}
+            WHERE {alias}.krd_id = ANY('{ids_literal}'::integer[])
+            ORDER BY {alias}.krd_id, {source['order']}
+        """
+
+    def _iter_query_rows(self, sql, cursor_name=None):
+        """
+        Построчный обход запроса. С cursor_name строки читаются серверным курсором
+        порциями по CURSOR_FETCH_SIZE (требуется открытая транзакция).
+        """
         q = QSqlQuery(self.db)
-        q.prepare("""SELECT r.recipient_name, r.issue_date, r.issue_number, r.postal_index, r.postal_region, 
-            r.postal_district, r.postal_town, r.postal_street, r.postal_house, r.recipient_contacts, 
-            t.name as request_type_name, m.name as military_unit_name 
-            FROM krd.outgoing_requests r 
-            LEFT JOIN krd.request_types t ON r.request_type_id = t.id 
-            LEFT JOIN krd.military_units m ON r.military_unit_id = m.id 
-            WHERE r.krd_id = :krd_id ORDER BY r.issue_date DESC""")
-        q.bindValue(":krd_id", krd_id)
-        if not q.exec():
-            self._log("SQL", f"❌ Ошибка SQL (outgoing_requests): {q.lastError().text()}")
-            return []
-        results = []
-        while q.next():
-            results.append({
-                "request_type_name": q.value("request_type_name") or "", "recipient_name": q.value("recipient_name") or "",
-                "military_unit_name": q.value("military_unit_name") or "", "issue_date": q.value("issue_date"),
-                "issue_number": q.value("issue_number") or "", "postal_index": q.value("postal_index") or "",
-                "postal_region": q.value("postal_region") or "", "postal_town": q.value("postal_town") or "",
-                "postal_street": q.value("postal_street") or "", "postal_house": q.value("postal_house") or "",
-                "recipient_contacts": q.value("recipient_contacts") or ""
-            })
-        self._log("DATA", f"   📤 Загружено запросов: {len(results)}")
-        return results
+        q.setForwardOnly(True)
+        if cursor_name is None:
+            if not q.exec(sql):
+                raise Exception(q.lastError().text())
+            while q.next():
+                yield q
+            return
+
+        if not q.exec(f"DECLARE {cursor_name} NO SCROLL CURSOR FOR {sql}"):
+            raise Exception(q.lastError().text())
+        try:
+            while True:
+                if not q.exec(f"FETCH FORWARD {self.CURSOR_FETCH_SIZE} FROM {cursor_name}"):
+                    raise Exception(q.lastError().text())
+                fetched = 0
+                while q.next():
+                    fetched += 1
+                    yield q
+                if fetched < self.CURSOR_FETCH_SIZE:
+                    break
+        finally:
+            QSqlQuery(self.db).exec(f"CLOSE {cursor_name}")
+
+    def _iter_section_groups(self, sec_key, keys, krd_ids, cursor_name=None):
+        """Потоково отдает (krd_id, [строки секции]) в порядке возрастания krd_id"""
+        current_id, group, count = None, [], 0
+        try:
+            for q in self._iter_query_rows(self._build_section_query(sec_key, keys, krd_ids), cursor_name):
+                krd_id = q.value(0)
+                record = {key: q.value(i) for i, key in enumerate(keys, 1)}
+                if krd_id != current_id:
+                    if group:
+                        yield current_id, group
+                    current_id, group = krd_id, []
+                group.append(record)
+                count += 1
+        except Exception as e:
+            self._log("SQL", f"❌ Ошибка SQL ({sec_key}): {e}")
+            raise
+        if group:
+            yield current_id, group
+        self._log("DATA", f"   📦 {sec_key}: загружено строк {count}")
+
+    def _load_section_for_krd(self, sec_key, krd_id):
+        """Все поля секции для одной КРД (экспорт одной карточки)"""
+        keys = [k for k, _ in self.AVAILABLE_FIELDS[sec_key]["fields"]]
+        for _, rows in self._iter_section_groups(sec_key, keys, [krd_id]):
+            return rows
+        return []
 
     def _adjust_column_widths(self, ws):
         """Автоматическая подстройка ширины колонок"""
@@ -534,12 +547,12 @@ class KrdExcelExporter:
 
     def _fill_single_krd(self, ws):
         row = 1
-        social_data = self._load_social_data_for_krd(self.krd_id)
-        row = self._fill_section(ws, "СОЦИАЛЬНО-ДЕМОГРАФИЧЕСКИЕ ДАННЫЕ", self.AVAILABLE_FIELDS["social_data"]["fields"], [social_data], row)
+        social_data = self._load_section_for_krd("social_data", self.krd_id)
+        row = self._fill_section(ws, "СОЦИАЛЬНО-ДЕМОГРАФИЧЕСКИЕ ДАННЫЕ", self.AVAILABLE_FIELDS["social_data"]["fields"], social_data[:1], row)
         if "addresses" in self.report_config.get("sections", []):
-            row = self._fill_section(ws, "АДРЕСА", self.AVAILABLE_FIELDS["addresses"]["fields"], self._load_addresses_for_krd(self.krd_id), row)
+            row = self._fill_section(ws, "АДРЕСА", self.AVAILABLE_FIELDS["addresses"]["fields"], self._load_section_for_krd("addresses", self.krd_id), row)
         if "service_places" in self.report_config.get("sections", []):
-            row = self._fill_section(ws, "МЕСТА СЛУЖБЫ", self.AVAILABLE_FIELDS["service_places"]["fields"], self._load_service_places_for_krd(self.krd_id), row)
+            row = self._fill_section(ws, "МЕСТА СЛУЖБЫ", self.AVAILABLE_FIELDS["service_places"]["fields"], self._load_section_for_krd("service_places", self.krd_id), row)
         return row
 
     def _fill_section(self, ws, title, fields, data_list, start_row):
@@ -17,6 +17,7 @@ from PyQt6.QtGui import QRegularExpressionValidator, QFont
 from PyQt6.QtSql import QSqlQuery
 from autocomplete_helper import AutocompleteHelper
 from reference_editor_dialog import ReferenceEditorDialog
+from reference_cache import fill_reference_combo
 
 
 class IncomingOrderDialog(QDialog):
@@ -326,29 +327,11 @@ class IncomingOrderDialog(QDialog):
 
     def load_initiator_types(self):
         """Загрузка типов инициаторов с сохранением выбора"""
-        current_id = self.initiator_type_combo.currentData()
-        self.initiator_type_combo.clear()
-        self.initiator_type_combo.addItem("— Выберите тип —", None)
-        query = QSqlQuery(self.db)
-        query.exec("SELECT id, name FROM krd.initiator_types ORDER BY name")
-        while query.next():
-            self.initiator_type_combo.addItem(query.value(1), query.value(0))
-        if current_id is not None:
-            idx = self.initiator_type_combo.findData(current_id)
-            if idx >= 0: self.initiator_type_combo.setCurrentIndex(idx)
+        fill_reference_combo(self.initiator_type_combo, self.db, 'initiator_types', "— Выберите тип —")
 
     def load_military_units(self):
         """Загрузка военных управлений с сохранением выбора"""
-        current_id = self.initiator_military_unit_combo.currentData()
-        self.initiator_military_unit_combo.clear()
-        self.initiator_military_unit_combo.addItem("— Выберите управление —", None)
-        query = QSqlQuery(self.db)
-        query.exec("SELECT id, name FROM krd.military_units ORDER BY name")
-        while query.next():
-            self.initiator_military_unit_combo.addItem(query.value(1), query.value(0))
-        if current_id is not None:
-            idx = self.initiator_military_unit_combo.findData(current_id)
-            if idx >= 0: self.initiator_military_unit_combo.setCurrentIndex(idx)
+        fill_reference_combo(self.initiator_military_unit_combo, self.db, 'military_units', "— Выберите управление —")
 
     def setup_autocomplete_fields(self):
         """Настройка автодополнения для почтовых полей"""
@@ -495,7 +478,7 @@ class IncomingOrderDialog(QDialog):
             for key, value in data.items(): query.bindValue(f":{key}", value)
             if not query.exec(): raise Exception(f"Ошибка SQL: {query.lastError().text()}")
             self.db.commit()
-            self.autocomplete_helper.clear_cache()
+            self.autocomplete_helper.add_saved_values(data)
             QMessageBox.information(self, "Успех", "Поручение успешно " + ("обновлено" if self.is_edit else "добавлено"))
             super().accept()
         except Exception as e:
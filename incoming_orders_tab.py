@@ -7,26 +7,37 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QTableView, QMessageBox, QHeaderView, QAbstractItemView
 )
-from PyQt6.QtSql import QSqlQuery, QSqlQueryModel
+from PyQt6.QtSql import QSqlQuery
 from PyQt6.QtCore import Qt, pyqtSignal 
 from PyQt6.QtGui import QFont
 from incoming_order_dialog import IncomingOrderDialog
+from krd_aggregate import CardTableModel, KrdCard
 from ui_helpers import is_reader  # 🔒 Импорт проверки роли
 
 class IncomingOrdersTab(QWidget):
     """Вкладка входящих поручений на розыск"""
     data_changed = pyqtSignal()
+
+    # (ключ строки карточки, заголовок колонки)
+    COLUMNS = [
+        ('id', 'ID'), ('initiator_full_name', 'Инициатор'), ('order_date', 'Дата поручения'),
+        ('order_number', 'Номер поручения'), ('receipt_date', 'Дата поступления'),
+        ('receipt_number', 'Входящий номер'),
+    ]
     
-    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None):
+    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None, card=None):
         super().__init__()
         self.krd_id = krd_id
         self.db = db_connection
         self.audit_logger = audit_logger
         self.user_info = user_info or {}
         self.is_read_only = is_reader(self.user_info)  # 🔒 Флаг режима чтения
+        # Данные карточки (общие для всех вкладок окна)
+        self.card = card or KrdCard(db_connection, krd_id)
+        self.card.changed.connect(self._on_card_changed)
         
         self.init_ui()
-        self.load_data()
+        self._show_rows()
     
     def init_ui(self):
         """Инициализация интерфейса"""
@@ -42,7 +53,7 @@ class IncomingOrdersTab(QWidget):
         layout.addWidget(title_label)
         
         # Таблица входящих поручений
-        self.orders_model = QSqlQueryModel()
+        self.orders_model = CardTableModel(self.COLUMNS)
         self.orders_table = QTableView()
         self.orders_table.setModel(self.orders_model)
         self.orders_table.setAlternatingRowColors(True)
@@ -88,24 +99,15 @@ class IncomingOrdersTab(QWidget):
         layout.addLayout(button_layout)
     
     def load_data(self):
-        """Загрузка данных из базы"""
-        query = QSqlQuery(self.db)
-        query.prepare("""
-            SELECT 
-                id,
-                initiator_full_name as "Инициатор",
-                order_date as "Дата поручения",
-                order_number as "Номер поручения",
-                receipt_date as "Дата поступления",
-                receipt_number as "Входящий номер"
-            FROM krd.incoming_orders
-            WHERE krd_id = ?
-            ORDER BY receipt_date DESC
-        """)
-        query.addBindValue(self.krd_id)
-        query.exec()
-        self.orders_model.setQuery(query)
-        
+        """Перечитывает поручения карточки из базы"""
+        self.card.refresh('incoming_orders')
+
+    def _on_card_changed(self, part):
+        if part == 'incoming_orders':
+            self._show_rows()
+
+    def _show_rows(self):
+        self.orders_model.set_rows(self.card.get('incoming_orders'))
         # Скрыть ID колонку
         self.orders_table.setColumnHidden(0, True)
     
@@ -0,0 +1,213 @@
+"""
+Карточка КРД целиком за один запрос
+✅ ОПТИМИЗИРОВАНО: КРД, соц. данные, дочерние таблицы и справочники карточки — один SELECT json_build_object(...)
+✅ ОПТИМИЗИРОВАНО: Вкладки читают общий объект KrdCard вместо собственных запросов при открытии
+✅ ДОБАВЛЕНО: Обновление отдельных частей карточки (refresh) после изменения дочерней таблицы — тоже одним запросом
+✅ ОПТИМИЗИРОВАНО: Статусы, категории и звания берутся из кэша справочников (reference_cache), а не из запроса карточки
+"""
+import json
+import re
+import time
+
+from PyQt6.QtCore import QAbstractTableModel, QDate, QModelIndex, QObject, Qt, pyqtSignal
+from PyQt6.QtSql import QSqlQuery
+
+from photo_store import photo_columns_sql
+from reference_cache import reference_rows
+
+
+# Колонки krd.social_data, которые показывает и сохраняет вкладка соц. данных (без BYTEA фото)
+SOCIAL_DATA_COLUMNS = [
+    "surname", "name", "patronymic", "birth_date",
+    "birth_place_town", "birth_place_district", "birth_place_region", "birth_place_country",
+    "tab_number", "personal_number", "category_id", "rank_id",
+    "drafted_by_commissariat", "draft_date", "povsk", "selection_date", "education",
+    "criminal_record", "social_media_account", "bank_card_number",
+    "passport_series", "passport_number", "passport_issue_date", "passport_issued_by",
+    "military_id_series", "military_id_number", "military_id_issue_date", "military_id_issued_by",
+    "appearance_features", "personal_marks", "federal_search_info", "military_contacts", "relatives_info",
+]
+
+# Части карточки, нужные только вкладке запросов (не загружаются для роли 'reader')
+REQUEST_PARTS = ('outgoing_requests', 'signatories', 'templates')
+
+# Части-справочники из кэша справочников: [{'id', 'name'}]
+REFERENCE_PARTS = ('statuses', 'categories', 'ranks')
+
+
+def _json_list(select_sql, order_sql):
+    """Подзапрос → JSON-массив строк (пустой массив, если строк нет)"""
+    return f"(SELECT COALESCE(json_agg(row_to_json(x) ORDER BY {order_sql}), '[]') FROM ({select_sql}) x)"
+
+
+def _reference(table, order_sql, label_sql="name", where_sql="TRUE"):
+    return _json_list(f"SELECT id, {label_sql} AS name FROM krd.{table} WHERE {where_sql}", order_sql)
+
+
+def _part_queries():
+    """Подзапрос каждой части карточки; все используют параметр :krd_id"""
+    return {
+        'krd': "(SELECT json_build_object('id', id, 'status_id', status_id) FROM krd.krd WHERE id = :krd_id)",
+        'social_data': f"""(SELECT row_to_json(x) FROM (
+            SELECT id, {", ".join(SOCIAL_DATA_COLUMNS)}, {photo_columns_sql()}
+            FROM krd.social_data WHERE krd_id = :krd_id ORDER BY id DESC LIMIT 1) x)""",
+        'addresses': _json_list("""
+            SELECT id, region, district, town, street, house, building, letter, apartment, room,
+                   check_date, check_result, COALESCE(is_deleted, FALSE) AS is_deleted
+            FROM krd.addresses WHERE krd_id = :krd_id""", "x.id DESC"),
+        'incoming_orders': _json_list("""
+            SELECT id, initiator_full_name, order_date, order_number, receipt_date, receipt_number,
+                   COALESCE(is_deleted, FALSE) AS is_deleted
+            FROM krd.incoming_orders WHERE krd_id = :krd_id""", "x.receipt_date DESC, x.id DESC"),
+        'service_places': _json_list("""
+            SELECT s.id, s.place_name, COALESCE(s.military_unit_number, '—') AS military_unit_number,
+                   m.name AS military_unit_name, g.name AS garrison_name, p.name AS position_name,
+                   s.place_contacts, s.postal_town, COALESCE(s.is_deleted, FALSE) AS is_deleted
+            FROM krd.service_places s
+            LEFT JOIN krd.military_units m ON s.military_unit_id = m.id
+            LEFT JOIN krd.garrisons g ON s.garrison_id = g.id
+            LEFT JOIN krd.positions p ON s.position_id = p.id
+            WHERE s.krd_id = :krd_id""", "x.id DESC"),
+        'soch_episodes': _json_list("""
+            SELECT id, soch_date, soch_location, order_date_number, found_by, search_date, notification_number
+            FROM krd.soch_episodes
+            WHERE krd_id = :krd_id AND (is_deleted = FALSE OR is_deleted IS NULL)""", "x.soch_date DESC, x.id DESC"),
+        'outgoing_requests': _json_list("""
+            SELECT o.id, rt.name AS request_type, COALESCE(r.name, 'Не указан') AS recipient,
+                   o.issue_date, o.issue_number, o.response_status,
+                   COALESCE(o.response_number, '') AS response_number
+            FROM krd.outgoing_requests o
+            LEFT JOIN krd.request_types rt ON o.request_type_id = rt.id
+            LEFT JOIN krd.recipients r ON o.recipient_id = r.id
+            WHERE o.krd_id = :krd_id AND o.is_deleted = FALSE""", "x.issue_date DESC, x.id DESC"),
+        'signatories': _reference(
+            'signatories', "x.name",
+            label_sql="full_name || ' (' || COALESCE(rank, '') || ', ' || COALESCE(garrison, '') || ')'",
+            where_sql="is_deleted = FALSE"),
+        'templates': _reference('document_templates', "x.name", where_sql="is_deleted = FALSE"),
+    }
+
+
+CARD_PARTS = tuple(_part_queries()) + REFERENCE_PARTS
+
+
+class KrdAggregateLoader:
+    """Загрузка частей карточки КРД одним запросом"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def load(self, krd_id, parts=CARD_PARTS):
+        """Карточка с заранее загруженными частями parts (остальные догружаются по требованию)"""
+        card = KrdCard(self.db, krd_id)
+        card.data.update(self.load_parts(krd_id, parts))
+        return card
+
+    def load_parts(self, krd_id, parts):
+        """{часть: данные} для перечисленных частей; при ошибке запроса — только справочники"""
+        parts = list(dict.fromkeys(parts))
+        data = {p: [{'id': ref_id, 'name': name} for ref_id, name in reference_rows(self.db, p)]
+                for p in parts if p in REFERENCE_PARTS}
+        queries = _part_queries()
+        parts = [p for p in parts if p in queries]
+        if not parts:
+            return data
+        started = time.perf_counter()
+        select = ",\n".join(f"'{p}', {queries[p]}" for p in parts)
+        q = QSqlQuery(self.db)
+        q.prepare(f"SELECT json_build_object({select})")
+        q.bindValue(":krd_id", krd_id)
+        if not q.exec() or not q.next():
+            print(f"⚠️ [CARD] Ошибка загрузки карточки КРД-{krd_id}: {q.lastError().text()}")
+            return data
+        data.update(json.loads(q.value(0)))
+        print(f"🗂️ [CARD] КРД-{krd_id}: {len(parts)} частей карточки за {(time.perf_counter() - started) * 1000:.0f} мс")
+        return data
+
+
+class KrdCard(QObject):
+    """
+    Данные карточки КРД в памяти: {часть: dict | list | None}.
+    Вкладки читают свою часть через get(), после изменения таблицы вызывают refresh(часть),
+    а сигнал changed(часть) обновляет все вкладки, которые показывают эту часть.
+    """
+    changed = pyqtSignal(str)
+
+    def __init__(self, db, krd_id, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.krd_id = krd_id
+        self.data = {}
+        self._loader = KrdAggregateLoader(db)
+
+    def require(self, *parts):
+        """Догружает одним запросом части, которых еще нет в карточке"""
+        missing = [p for p in parts if p not in self.data]
+        if missing:
+            self.data.update(self._loader.load_parts(self.krd_id, missing))
+
+    def get(self, part):
+        self.require(part)
+        return self.data.get(part)
+
+    def refresh(self, *parts):
+        """Перечитывает части из базы одним запросом и оповещает вкладки"""
+        self.data.update(self._loader.load_parts(self.krd_id, parts))
+        for part in parts:
+            self.changed.emit(part)
+
+    def reload(self):
+        """Перечитывает все загруженные части (например, после восстановления версии)"""
+        if self.data:
+            self.refresh(*self.data)
+
+
+_ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def card_value(row, key):
+    """Значение поля строки карточки; даты (колонки *_date) — QDate, как из QSqlQuery"""
+    value = row.get(key)
+    if key.endswith("_date") and isinstance(value, str) and _ISO_DATE_RE.match(value):
+        return QDate.fromString(value, Qt.DateFormat.ISODate)
+    return value
+
+
+class CardRecord:
+    """Строка карточки с интерфейсом value(имя) как у QSqlQuery"""
+
+    def __init__(self, row):
+        self.row = row or {}
+
+    def value(self, key):
+        return card_value(self.row, key)
+
+
+class CardTableModel(QAbstractTableModel):
+    """Табличная модель только для чтения над строками карточки; columns — [(ключ, заголовок)]"""
+
+    def __init__(self, columns, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.rows = []
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = list(rows or [])
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        return card_value(self.rows[index.row()], self.columns[index.column()][0])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.columns[section][1]
+        return super().headerData(section, orientation, role)
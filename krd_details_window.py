@@ -4,11 +4,15 @@
 ✅ ДОБАВЛЕНО: Безопасные именованные параметры (:krd_id) во всех SQL-запросах
 ✅ ОПТИМИЗИРОВАНО: Автоматическая подписка на сигналы изменений вкладок для автосохранения
 ✅ УПРОЩЕНО: Логика Advisory Locks без избыточных проверок
+✅ ДОБАВЛЕНО: Публикация захвата/снятия блокировки через pg_notify (krd_lock_notifier)
+✅ ОПТИМИЗИРОВАНО: Вкладки создаются лениво (lazy_tabs): при открытии — только видимая, остальные после отрисовки
+✅ ДОБАВЛЕНО: Замер времени от вызова конструктора до готовности карточки к работе
+✅ ОПТИМИЗИРОВАНО: Данные всех вкладок и справочники карточки загружаются одним запросом (krd_aggregate)
 """
+import time
 import traceback
-import json
 from PyQt6.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QTabWidget, QMessageBox,
+    QDialog, QVBoxLayout, QHBoxLayout, QMessageBox,
     QComboBox, QPushButton, QLabel, QWidget, QHeaderView, QAbstractItemView
 )
 from PyQt6.QtGui import QCloseEvent, QStandardItemModel, QStandardItem
@@ -16,6 +20,8 @@ from PyQt6.QtSql import QSqlQuery
 from PyQt6.QtCore import pyqtSignal, Qt, QTimer
 
 from ui_helpers import is_reader, apply_readonly_mode
+from lazy_tabs import LazyTabWidget
+from krd_aggregate import CARD_PARTS, REQUEST_PARTS, KrdAggregateLoader
 from social_data_tab import SocialDataTab
 from addresses_tab import AddressesTab
 from incoming_orders_tab import IncomingOrdersTab
@@ -25,6 +31,7 @@ from outgoing_requests_tab import OutgoingRequestsTab
 from krd_version_manager import KrdVersionManager
 from krd_version_history_dialog import KrdVersionHistoryDialog
 from krd_version_preview_window import KrdVersionPreviewWindow
+from krd_lock_notifier import publish_lock_change
 
 
 class KrdDetailsWindow(QDialog):
@@ -34,6 +41,8 @@ class KrdDetailsWindow(QDialog):
     def __init__(self, krd_id: int, db_connection, user_info: dict, audit_logger=None, preview_version_id=None):
         # ✅ Независимое окно (родитель None) для корректного управления фокусом в Linux
         super().__init__(None)
+        self._open_started = time.perf_counter()
+        self.open_to_interactive_ms = None
         
         self.krd_id = krd_id
         self.db = db_connection
@@ -43,7 +52,9 @@ class KrdDetailsWindow(QDialog):
         self.current_username = user_info.get('username', 'Неизвестный')
         self.previous_tab_index = -1
         self.version_mgr = KrdVersionManager(db_connection)
+        # Созданные вкладки (порядок создания); несозданные загрузят актуальные данные при создании
         self._tabs_list = []
+        self.card = None
         
         # Параметры режима предпросмотра версии
         self.preview_version_id = preview_version_id
@@ -102,6 +113,11 @@ class KrdDetailsWindow(QDialog):
         main_layout = QVBoxLayout(self)
         main_layout.setContentsMargins(0, 0, 0, 0)
         main_layout.setSpacing(0)
+
+        # Вся карточка (КРД, вкладки, справочники) — один запрос; вкладки читают ее, а не базу
+        parts = [p for p in CARD_PARTS if p not in REQUEST_PARTS] if is_reader(self.user_info) else CARD_PARTS
+        self.card = KrdAggregateLoader(self.db).load(self.krd_id, parts)
+        self.card.changed.connect(self._on_card_changed)
         
         # === ВЕРХНЯЯ ПАНЕЛЬ (HEADER) ===
         header_widget = QWidget()
@@ -142,36 +158,30 @@ class KrdDetailsWindow(QDialog):
         main_layout.addWidget(self.preview_banner)
         
         # === ВКЛАДКИ ===
-        self.tabs = QTabWidget()
-        self.social_data_tab = SocialDataTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        self.addresses_tab = AddressesTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        self.incoming_orders_tab = IncomingOrdersTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        self.service_places_tab = ServicePlacesTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        self.soch_episodes_tab = SochEpisodesTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        
-        self._tabs_list = [
-            self.social_data_tab, self.addresses_tab, self.incoming_orders_tab,
-            self.service_places_tab, self.soch_episodes_tab
+        # (атрибут окна, класс вкладки, заголовок); виджет создается при первом показе вкладки
+        tab_specs = [
+            ('social_data_tab', SocialDataTab, "👤 Социально-демографические данные"),
+            ('addresses_tab', AddressesTab, "🏠 Адреса проживания"),
+            ('incoming_orders_tab', IncomingOrdersTab, "📬 Входящие поручения"),
+            ('service_places_tab', ServicePlacesTab, "🎖️ Места службы"),
+            ('soch_episodes_tab', SochEpisodesTab, "⚠️ Сведения о СОЧ"),
         ]
-        
-        self.tabs.addTab(self.social_data_tab, "👤 Социально-демографические данные")
-        self.tabs.addTab(self.addresses_tab, "🏠 Адреса проживания")
-        self.tabs.addTab(self.incoming_orders_tab, "📬 Входящие поручения")
-        self.tabs.addTab(self.service_places_tab, "🎖️ Места службы")
-        self.tabs.addTab(self.soch_episodes_tab, "⚠️ Сведения о СОЧ")
-        
         if not is_reader(self.user_info):
-            self.outgoing_requests_tab = OutgoingRequestsTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-            self.tabs.addTab(self.outgoing_requests_tab, " Запросы и поручения")
-            self._tabs_list.append(self.outgoing_requests_tab)
-            
-            # ✅ Подключение сигналов изменений к генератору документов
-            if hasattr(self.outgoing_requests_tab, 'generator_tab') and self.outgoing_requests_tab.generator_tab is not None:
-                for tab in [self.addresses_tab, self.service_places_tab, self.soch_episodes_tab, self.incoming_orders_tab]:
-                    if hasattr(tab, 'data_changed'):
-                        tab.data_changed.connect(self.outgoing_requests_tab.generator_tab.load_related_records)
+            tab_specs.append(('outgoing_requests_tab', OutgoingRequestsTab, " Запросы и поручения"))
         else:
             self.outgoing_requests_tab = None
+
+        self.tabs = LazyTabWidget()
+        self.tabs.tab_built.connect(self._on_tab_built)
+        self._tab_attrs = []
+        for attr, tab_class, label in tab_specs:
+            setattr(self, attr, None)
+            self._tab_attrs.append(attr)
+            self.tabs.add_lazy_tab(
+                lambda tab_class=tab_class: tab_class(
+                    self.krd_id, self.db, self.audit_logger, self.user_info, card=self.card), label)
+        # Видимая (первая) вкладка уже создана при добавлении — окно открывается с данными
+        self.previous_tab_index = self.tabs.currentIndex()
             
         self.tabs.currentChanged.connect(self._on_tab_switched)
         main_layout.addWidget(self.tabs)
@@ -179,35 +189,48 @@ class KrdDetailsWindow(QDialog):
         # Загрузка статусов после построения UI
         self._load_statuses()
 
+    # =========================================================================
+    # === ЛЕНИВЫЕ ВКЛАДКИ ===
+    # =========================================================================
+    def _on_tab_built(self, index, widget):
+        # Списки генератора документов обновляются сами — через сигнал карточки changed
+        setattr(self, self._tab_attrs[index], widget)
+        self._tabs_list.append(widget)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.open_to_interactive_ms is None:
+            self.open_to_interactive_ms = 0
+            # Срабатывает после завершения текущей отрисовки — окно готово к вводу
+            QTimer.singleShot(0, self._on_first_paint_done)
+
+    def _on_first_paint_done(self):
+        self.open_to_interactive_ms = (time.perf_counter() - self._open_started) * 1000
+        print(f"⏱️ [KRD] Карточка КРД-{self.krd_id} готова к работе за {self.open_to_interactive_ms:.0f} мс")
+        if not self.preview_mode:
+            self.tabs.prefetch()
+
     # =========================================================================
     # === ЛОГИКА СТАТУСОВ ===
     # =========================================================================
     def _load_statuses(self):
+        """Список статусов и текущий статус — из карточки"""
         self.status_combo.blockSignals(True)
         self.status_combo.clear()
-        q = QSqlQuery(self.db)
-        q.prepare("SELECT id, name FROM krd.statuses ORDER BY id")
-        if q.exec():
-            current_status_id = self._get_current_status_id()
-            found_current = False
-            while q.next():
-                sid, sname = q.value(0), q.value(1)
-                self.status_combo.addItem(sname, sid)
-                if sid == current_status_id:
-                    found_current = True
-            if found_current:
-                idx = self.status_combo.findData(current_status_id)
-                if idx >= 0: self.status_combo.setCurrentIndex(idx)
+        current_status_id = self._get_current_status_id()
+        for status in self.card.get('statuses') or []:
+            self.status_combo.addItem(status['name'], status['id'])
+        idx = self.status_combo.findData(current_status_id)
+        if idx >= 0: self.status_combo.setCurrentIndex(idx)
         self.status_combo.blockSignals(False)
 
     def _get_current_status_id(self):
-        if not self.krd_id: return 1
-        q = QSqlQuery(self.db)
-        q.prepare("SELECT status_id FROM krd.krd WHERE id = :id")
-        q.bindValue(":id", self.krd_id)
-        if q.exec() and q.next():
-            return q.value(0)
-        return 1
+        krd = self.card.get('krd') if self.krd_id else None
+        return krd['status_id'] if krd else 1
+
+    def _on_card_changed(self, part):
+        if part in ('krd', 'statuses'):
+            self._load_statuses()
 
     def _on_status_changed(self, index):
         if self.preview_mode: return
@@ -223,7 +246,9 @@ class KrdDetailsWindow(QDialog):
             q.bindValue(":id", self.krd_id)
             if not q.exec():
                 QMessageBox.critical(self, "Ошибка БД", f"Не удалось сохранить статус:\n{q.lastError().text()}")
-                self._load_statuses()
+                self.card.refresh('krd')
+            elif self.card.data.get('krd'):
+                self.card.data['krd']['status_id'] = new_status_id
         except Exception as e:
             print(f"❌ Ошибка сохранения статуса: {e}")
 
@@ -231,7 +256,7 @@ class KrdDetailsWindow(QDialog):
         try:
             from reference_editor_dialog import ReferenceEditorDialog
             dlg = ReferenceEditorDialog(self.db, self, initial_table='statuses')
-            dlg.data_changed.connect(self._load_statuses)
+            dlg.data_changed.connect(lambda _table: self.card.refresh('statuses'))
             dlg.exec()
         except Exception as e:
             traceback.print_exc()
@@ -249,6 +274,7 @@ class KrdDetailsWindow(QDialog):
             query.prepare("SELECT pg_try_advisory_lock(:krd_id)")
             query.bindValue(":krd_id", int(self.krd_id))
             if query.exec() and query.next() and query.value(0):
+                publish_lock_change(self.db, self.krd_id, locked=True)
                 return True, ""
             return False, f"Запись №{self.krd_id} сейчас открыта в другой сессии."
         except Exception as e:
@@ -259,14 +285,16 @@ class KrdDetailsWindow(QDialog):
             query = QSqlQuery(self.db)
             query.prepare("SELECT pg_advisory_unlock(:krd_id)")
             query.bindValue(":krd_id", int(self.krd_id))
-            query.exec()
+            if query.exec() and query.next() and query.value(0):
+                publish_lock_change(self.db, self.krd_id, locked=False)
         except Exception as e:
             print(f"❌ Ошибка снятия блокировки: {e}")
 
     def closeEvent(self, event: QCloseEvent):
         # Сохраняем текущую вкладку перед закрытием
         if hasattr(self, 'tabs') and self.tabs is not None:
-            current_widget = self.tabs.currentWidget()
+            self.tabs.stop_prefetch()
+            current_widget = self.tabs.tab_content(self.tabs.currentIndex())
             if current_widget and not self.preview_mode:
                 self._save_widget_silent(current_widget)
                 
@@ -278,10 +306,10 @@ class KrdDetailsWindow(QDialog):
 
     def _on_tab_switched(self, new_index):
         if self.previous_tab_index != -1 and self.previous_tab_index != new_index:
-            prev_widget = self.tabs.widget(self.previous_tab_index)
+            prev_widget = self.tabs.tab_content(self.previous_tab_index)
             if prev_widget and not self.preview_mode:
                 self._save_widget_silent(prev_widget)
-            self.previous_tab_index = new_index
+        self.previous_tab_index = new_index
 
     def _on_field_changed(self):
         """Триггер автосохранения при изменении данных в любой вкладке"""
@@ -294,6 +322,8 @@ class KrdDetailsWindow(QDialog):
         if self.preview_mode: return
         if hasattr(widget, 'save_data'):
             try:
+                # Снапшот снимается и тогда, когда save_data() нечего сохранять: изменения могли быть
+                # записаны автосохранением раньше. Без изменений krd.capture_version версию не создает
                 widget.save_data()
                 if self.version_mgr.capture_snapshot(self.krd_id, self.current_user_id, "Автосохранение"):
                     print(f"✅ Снапшот версии сохранен для КРД-{self.krd_id}")
@@ -341,14 +371,13 @@ class KrdDetailsWindow(QDialog):
     def _load_version_snapshot(self):
         """Загружает снапшот версии и переводит окно в режим предпросмотра"""
         if not self.preview_version_id: return
-        q = QSqlQuery(self.db)
-        q.prepare("SELECT snapshot_data FROM krd.krd_versions WHERE id = :id")
-        q.bindValue(":id", self.preview_version_id)
-        if q.exec() and q.next():
+        snapshot = self.version_mgr.get_snapshot(self.preview_version_id)
+        if snapshot is not None:
             try:
-                snapshot = json.loads(q.value(0))
                 self.preview_banner.show()
                 self.preview_banner.setText(f"👁️ РЕЖИМ ПРЕДПРОСМОТРА: Версия #{self.preview_version_id}. Данные доступны только для чтения.")
+                # Снапшот заполняет все вкладки — создаем оставшиеся
+                self.tabs.ensure_all_built()
                 
                 # Отключаем таймеры автосохранения
                 for tab in self._tabs_list:
@@ -364,15 +393,16 @@ class KrdDetailsWindow(QDialog):
                         btn.setEnabled(True)
                         
                 self._apply_snapshot_to_all_tabs(snapshot)
-            except json.JSONDecodeError as e:
-                print(f"❌ Ошибка парсинга JSON снапшота: {e}")
+            except Exception as e:
+                print(f"❌ Ошибка применения снапшота: {e}")
 
     def restore_version_from_db(self, version_id: int):
-        if self.version_mgr and self.version_mgr.rollback_to(version_id, self.krd_id):
-            QMessageBox.information(self, "Успех", f"✅ КРД восстановлена до версии #{version_id}")
-            self._load_statuses()
-            if hasattr(self, 'social_data_tab') and self.social_data_tab:
-                self.social_data_tab.load_data()
+        counts = self.version_mgr.rollback_to(version_id, self.krd_id) if self.version_mgr else None
+        if counts is not None:
+            details = "\n".join(f"• {table}: {rows}" for table, rows in counts.items())
+            QMessageBox.information(self, "Успех", f"✅ КРД восстановлена до версии #{version_id}\n{details}")
+            # Карточка перечитывается одним запросом, вкладки и статус обновляются по сигналу changed
+            self.card.reload()
         else:
             QMessageBox.critical(self, "Ошибка", "Не удалось восстановить версию. Проверьте логи.")
 
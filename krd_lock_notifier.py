@@ -0,0 +1,137 @@
+"""
+Подсистема оповещения о занятости КРД (LISTEN/NOTIFY PostgreSQL)
+✅ ДОБАВЛЕНО: publish_lock_change — публикация захвата/снятия advisory lock через pg_notify
+✅ ДОБАВЛЕНО: KrdLockListener — подписка через QSqlDriver.subscribeToNotification
+   (драйвер QPSQL слушает сокет соединения через QSocketNotifier, опрос таблицы не нужен)
+✅ ДОБАВЛЕНО: Редкая сверка только по pg_locks (на случай аварийного разрыва сессии без NOTIFY)
+"""
+import json
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtSql import QSqlDriver, QSqlQuery
+
+
+LOCK_CHANNEL = "krd_locks"
+
+# Сверка с pg_locks: стоимость пропорциональна числу блокировок, а не размеру krd.krd
+RECONCILE_INTERVAL_MS = 60000
+# Интервал сверки, если драйвер не поддерживает уведомления
+FALLBACK_INTERVAL_MS = 3000
+
+
+def publish_lock_change(db, krd_id, locked):
+    """
+    Оповещает все рабочие места о захвате (locked=True) или снятии блокировки КРД.
+    Владелец берется из application_name текущей сессии (как в колонке "Занято пользователем").
+    """
+    try:
+        query = QSqlQuery(db)
+        query.prepare("""
+            SELECT pg_notify(:channel, json_build_object(
+                'krd_id', CAST(:krd_id AS integer),
+                'owner', CASE WHEN :locked THEN current_setting('application_name') END
+            )::text)
+        """)
+        query.bindValue(":channel", LOCK_CHANNEL)
+        query.bindValue(":krd_id", int(krd_id))
+        query.bindValue(":locked", bool(locked))
+        if not query.exec():
+            print(f"⚠️ [LOCKS] Ошибка публикации блокировки: {query.lastError().text()}")
+    except Exception as e:
+        print(f"⚠️ [LOCKS] Исключение при публикации блокировки: {e}")
+
+
+class KrdLockListener(QObject):
+    """
+    Слушатель канала krd_locks.
+    Сигнал lock_changed(krd_id, owner) — owner равен None, если запись освобождена.
+    """
+    lock_changed = pyqtSignal(int, object)
+
+    def __init__(self, db_connection, parent=None):
+        super().__init__(parent)
+        self.db = db_connection
+        self._known_locks = {}
+        self._subscribed = False
+
+        self._reconcile_timer = QTimer(self)
+        self._reconcile_timer.timeout.connect(self.reconcile)
+
+    def start(self):
+        """Подписывается на канал и запускает сверку. Возвращает True, если работают push-уведомления"""
+        driver = self.db.driver()
+        if driver.hasFeature(QSqlDriver.DriverFeature.EventNotifications):
+            driver.notification.connect(self._on_notification)
+            self._subscribed = driver.subscribeToNotification(LOCK_CHANNEL)
+
+        if self._subscribed:
+            print(f"✅ [LOCKS] Подписка на канал '{LOCK_CHANNEL}' оформлена")
+        else:
+            print(f"⚠️ [LOCKS] Уведомления недоступны, переход на сверку pg_locks каждые {FALLBACK_INTERVAL_MS} мс")
+
+        self._known_locks = self._load_current_locks() or {}
+        self._reconcile_timer.start(RECONCILE_INTERVAL_MS if self._subscribed else FALLBACK_INTERVAL_MS)
+        return self._subscribed
+
+    def stop(self):
+        self._reconcile_timer.stop()
+        if self._subscribed:
+            driver = self.db.driver()
+            driver.unsubscribeFromNotification(LOCK_CHANNEL)
+            try:
+                driver.notification.disconnect(self._on_notification)
+            except TypeError:
+                pass
+            self._subscribed = False
+
+    def _on_notification(self, name, source, payload):
+        if name != LOCK_CHANNEL:
+            return
+        try:
+            data = json.loads(payload) if isinstance(payload, str) else {}
+            krd_id = int(data['krd_id'])
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ [LOCKS] Некорректное уведомление '{payload}': {e}")
+            return
+        self._apply(krd_id, data.get('owner') or None)
+
+    def _apply(self, krd_id, owner):
+        if owner:
+            if self._known_locks.get(krd_id) == owner:
+                return
+            self._known_locks[krd_id] = owner
+        else:
+            if krd_id not in self._known_locks:
+                return
+            del self._known_locks[krd_id]
+        self.lock_changed.emit(krd_id, owner)
+
+    def _load_current_locks(self):
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        if not query.exec("""
+            SELECT pl.objid::bigint, COALESCE(NULLIF(lk.application_name, ''), lk.usename::text, '?')
+            FROM pg_locks pl
+            LEFT JOIN pg_stat_activity lk ON lk.pid = pl.pid
+            WHERE pl.locktype = 'advisory'
+              AND pl.classid = 0
+              AND pl.objsubid = 1
+              AND pl.granted = true
+        """):
+            print(f"⚠️ [LOCKS] Ошибка чтения pg_locks: {query.lastError().text()}")
+            return None
+        locks = {}
+        while query.next():
+            locks[int(query.value(0))] = query.value(1) or ""
+        return locks
+
+    def reconcile(self):
+        """Сверяет известные блокировки с pg_locks и оповещает только об отличиях"""
+        current = self._load_current_locks()
+        if current is None:
+            return
+        for krd_id in list(self._known_locks):
+            if krd_id not in current:
+                self._apply(krd_id, None)
+        for krd_id, owner in current.items():
+            self._apply(krd_id, owner)
@@ -0,0 +1,248 @@
+"""
+Поиск КРД в главном окне
+✅ ОПТИМИЗИРОВАНО: Генерируемые колонки social_data.search_fio / search_docs с нормализованными ФИО и номерами документов
+✅ ОПТИМИЗИРОВАНО: GIN-индексы pg_trgm по ФИО (подстрока и опечатки) и по массиву номеров документов
+✅ ДОБАВЛЕНО: Разбор строки поиска — номер КРД, дата рождения, номер документа идут в точные индексные условия,
+   текст — в триграммный поиск с ранжированием по похожести
+✅ ОПТИМИЗИРОВАНО: Колонки и индексы создает migrate_db.py, клиент при запуске только проверяет их наличие
+"""
+import re
+from datetime import date
+
+from PyQt6.QtSql import QSqlQuery
+
+
+# Порог word_similarity для поиска с опечатками ("Ивонов" → "Иванов")
+WORD_SIMILARITY_THRESHOLD = 0.5
+
+# Номера КРД не длиннее этого ищутся и как подстрока (как в прежнем поиске: "12" → КРД-12, 112, 120...)
+SHORT_NUMBER_LENGTH = 4
+
+# Нормализация: нижний регистр, ё → е; документы — только буквы и цифры
+_NORMALIZE_FUNCTION = """
+    CREATE OR REPLACE FUNCTION krd.search_normalize(p_text text) RETURNS text AS $$
+        SELECT lower(translate(p_text, 'Ёё', 'Ее'))
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+"""
+
+_DOC_NORMALIZE_FUNCTION = """
+    CREATE OR REPLACE FUNCTION krd.search_doc_normalize(p_text text) RETURNS text AS $$
+        SELECT NULLIF(regexp_replace(krd.search_normalize(p_text), '[^[:alnum:]]', '', 'g'), '')
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+"""
+
+# ФИО одной строкой без пропущенных частей. concat_ws в генерируемой колонке недопустим (он STABLE),
+# поэтому склейка выполняется внутри IMMUTABLE-функции через coalesce и ||
+_FIO_NORMALIZE_FUNCTION = """
+    CREATE OR REPLACE FUNCTION krd.search_normalize_fio(p_surname text, p_name text, p_patronymic text)
+    RETURNS text AS $$
+        SELECT NULLIF(krd.search_normalize(btrim(regexp_replace(
+            coalesce(p_surname, '') || ' ' || coalesce(p_name, '') || ' ' || coalesce(p_patronymic, ''),
+            '\\s+', ' ', 'g'))), '')
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+"""
+
+_SEARCH_MIGRATION = [
+    _NORMALIZE_FUNCTION,
+    _DOC_NORMALIZE_FUNCTION,
+    _FIO_NORMALIZE_FUNCTION,
+    """
+    ALTER TABLE krd.social_data ADD COLUMN IF NOT EXISTS search_fio text
+        GENERATED ALWAYS AS (krd.search_normalize_fio(surname, name, patronymic)) STORED
+    """,
+    # Номер документа индексируется и отдельно: поиск без серии и записи без серии
+    """
+    ALTER TABLE krd.social_data ADD COLUMN IF NOT EXISTS search_docs text[]
+        GENERATED ALWAYS AS (array_remove(ARRAY[
+            krd.search_doc_normalize(coalesce(passport_series, '') || passport_number),
+            krd.search_doc_normalize(passport_number),
+            krd.search_doc_normalize(coalesce(military_id_series, '') || military_id_number),
+            krd.search_doc_normalize(military_id_number),
+            krd.search_doc_normalize(tab_number),
+            krd.search_doc_normalize(personal_number)], NULL)) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_social_data_search_docs ON krd.social_data USING gin (search_docs)",
+    "CREATE INDEX IF NOT EXISTS idx_social_data_birth_date ON krd.social_data (birth_date)",
+]
+
+_TRGM_MIGRATION = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS idx_social_data_search_fio_trgm ON krd.social_data USING gin (search_fio gin_trgm_ops)",
+]
+
+# Состояние схемы поиска для текущего сеанса (выставляется check_search_schema)
+_search_columns_ready = False
+_trgm_ready = False
+
+
+def _exec(db, sql):
+    query = QSqlQuery(db)
+    if not query.exec(sql):
+        raise Exception(f"{query.lastError().text()}\n📝 SQL: {sql.strip()[:200]}")
+    return query
+
+
+def install_search_schema(db):
+    """
+    Миграция (migrate_db.py): функции нормализации, генерируемые колонки и индексы поиска.
+    ADD COLUMN ... STORED переписывает social_data под ACCESS EXCLUSIVE — только вне работы клиентов.
+    Без прав на pg_trgm поиск по ФИО работает через LIKE по нормализованной колонке.
+    """
+    for sql in _SEARCH_MIGRATION:
+        _exec(db, sql)
+    try:
+        for sql in _TRGM_MIGRATION:
+            _exec(db, sql)
+    except Exception as e:
+        print(f"⚠️ [SEARCH] pg_trgm недоступен, поиск с опечатками будет отключен: {e}")
+
+
+def check_search_schema(db):
+    """
+    Проверка при запуске клиента (без DDL): колонки поиска и триграммный индекс на месте.
+    Для сеанса db выставляется порог похожести.
+    """
+    global _search_columns_ready, _trgm_ready
+    try:
+        query = _exec(db, """
+            SELECT
+                (SELECT count(*) FROM information_schema.columns
+                 WHERE table_schema = 'krd' AND table_name = 'social_data'
+                   AND column_name IN ('search_fio', 'search_docs')) = 2,
+                to_regclass('krd.idx_social_data_search_fio_trgm') IS NOT NULL
+        """)
+        query.next()
+        _search_columns_ready = bool(query.value(0))
+        _trgm_ready = _search_columns_ready and bool(query.value(1))
+    except Exception as e:
+        print(f"⚠️ [SEARCH] Не удалось проверить схему поиска, используется прежний поиск: {e}")
+        _search_columns_ready = _trgm_ready = False
+        return False
+    if not _search_columns_ready:
+        print("⚠️ [SEARCH] Колонки поиска не созданы, используется прежний поиск — выполните migrate_db.py")
+        return False
+    if _trgm_ready:
+        try:
+            _exec(db, f"SET pg_trgm.word_similarity_threshold = {WORD_SIMILARITY_THRESHOLD}")
+        except Exception as e:
+            print(f"⚠️ [SEARCH] Порог похожести не установлен, поиск с опечатками отключен: {e}")
+            _trgm_ready = False
+    else:
+        print("ℹ️ [SEARCH] Индекс pg_trgm не создан, поиск с опечатками отключен")
+    return True
+
+
+def _normalize(text):
+    return text.lower().replace("ё", "е")
+
+
+class KrdSearch:
+    """
+    Разобранная строка поиска: условие WHERE (с префиксом AND), параметры
+    и выражение релевантности для сортировки (None — у запроса нет ранжирования).
+    """
+
+    def __init__(self, where_sql, params, rank_sql=None):
+        self.where_sql = where_sql
+        self.params = params
+        self.rank_sql = rank_sql
+
+    def bind(self, query):
+        for name, value in self.params.items():
+            query.bindValue(name, value)
+
+
+_KRD_NUMBER_RE = re.compile(r"^(?:крд|№)?\s*-?\s*(\d{1,9})$", re.IGNORECASE)
+_DATE_RE = re.compile(r"^(\d{1,2})[./-](\d{1,2})[./-](\d{2}|\d{4})$")
+_ISO_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+# Неполная дата рождения: "12.05", "12.05.19"
+_PARTIAL_DATE_RE = re.compile(r"^\d{1,2}[./-]\d{1,2}(?:[./-]\d{0,3})?$")
+
+
+def _parse_date(text):
+    m = _DATE_RE.match(text)
+    if m:
+        day, month, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        if year < 100:
+            year += 2000 if year <= date.today().year % 100 else 1900
+    else:
+        m = _ISO_DATE_RE.match(text)
+        if not m:
+            return None
+        year, month, day = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_search_query(text):
+    """Строка поиска → KrdSearch (None для пустой строки)"""
+    text = (text or "").strip()
+    if not text:
+        return None
+
+    if not _search_columns_ready:
+        return _legacy_search(text)
+
+    # Дата рождения
+    birth_date = _parse_date(text)
+    if birth_date:
+        return KrdSearch("AND s.birth_date = CAST(:birth_date AS date)",
+                         {":birth_date": birth_date.isoformat()})
+
+    # Неполная дата — подстрока даты рождения без индекса, как в прежнем поиске
+    if _PARTIAL_DATE_RE.match(text):
+        return KrdSearch("AND TO_CHAR(s.birth_date, 'DD.MM.YYYY') LIKE :date_like",
+                         {":date_like": "%" + re.sub(r"[/-]", ".", text) + "%"})
+
+    doc = re.sub(r"[^0-9a-zа-я]", "", _normalize(text))
+
+    # Номер КРД (цифры) — тот же номер может быть табельным/личным номером
+    m = _KRD_NUMBER_RE.match(text)
+    if m:
+        number = m.group(1)
+        if len(number) <= SHORT_NUMBER_LENGTH:
+            # Короткий номер — еще и подстрока номера КРД (просмотр krd.krd без индекса)
+            return KrdSearch("""
+                AND (CAST(k.id AS text) LIKE :krd_like OR k.id IN (
+                    SELECT sd.krd_id FROM krd.social_data sd WHERE sd.search_docs @> ARRAY[CAST(:doc AS text)]
+                ))
+            """, {":krd_like": f"%{number}%", ":doc": number})
+        return KrdSearch("""
+            AND k.id IN (
+                SELECT CAST(:krd_id AS integer)
+                UNION ALL
+                SELECT sd.krd_id FROM krd.social_data sd WHERE sd.search_docs @> ARRAY[CAST(:doc AS text)]
+            )
+        """, {":krd_id": int(number), ":doc": number})
+
+    # Номер документа: серия (до 4 букв или цифр) и номер, разделители игнорируются — "45 10 123456", "АБ-1234567"
+    if re.fullmatch(r"[\w\s\-]+", text) and re.fullmatch(r"[a-zа-я]{0,4}\d{4,}", doc):
+        return KrdSearch("AND s.search_docs @> ARRAY[CAST(:doc AS text)]", {":doc": doc})
+
+    # ФИО: подстрока по нормализованной колонке, с pg_trgm — и похожие слова (опечатки)
+    query = re.sub(r"\s+", " ", _normalize(text))
+    like = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    if _trgm_ready:
+        return KrdSearch(
+            "AND (s.search_fio LIKE :fio_like OR CAST(:fio AS text) <% s.search_fio)",
+            {":fio_like": like, ":fio": query},
+            # float8: граница keyset-страницы возвращается из Python без потери точности real
+            rank_sql="CAST(word_similarity(CAST(:fio AS text), s.search_fio) AS double precision)",
+        )
+    return KrdSearch("AND s.search_fio LIKE :fio_like", {":fio_like": like})
+
+
+def _legacy_search(text):
+    """Поиск до миграции схемы (без индексов)"""
+    return KrdSearch("""
+        AND (
+            LOWER(s.surname) LIKE LOWER(:search) OR
+            LOWER(s.name) LIKE LOWER(:search) OR
+            LOWER(s.patronymic) LIKE LOWER(:search) OR
+            LOWER(k.id::text) LIKE LOWER(:search) OR
+            LOWER(s.surname || ' ' || s.name || ' ' || s.patronymic) LIKE LOWER(:search) OR
+            TO_CHAR(s.birth_date, 'DD.MM.YYYY') LIKE LOWER(:search)
+        )
+    """, {":search": f"%{text}%"})
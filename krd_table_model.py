@@ -0,0 +1,288 @@
+"""
+Модель таблицы КРД для главного окна с серверной постраничной загрузкой
+✅ ОПТИМИЗИРОВАНО: Keyset-пагинация по (ключ сортировки, k.id) вместо загрузки всей выборки в QSqlQueryModel
+✅ ОПТИМИЗИРОВАНО: Ограниченный LRU-кэш страниц; вытесненная страница перечитывается по сохраненной границе
+✅ ОПТИМИЗИРОВАНО: Отдельный легкий COUNT(*) без JOIN на pg_locks/pg_stat_activity для счетчика записей
+✅ ОПТИМИЗИРОВАНО: Смена сортировки/поиска загружает только первую страницу, остальные — по мере прокрутки
+✅ ОПТИМИЗИРОВАНО: Поиск через krd_search — индексные условия вместо шести LIKE по выражениям, ранжирование по похожести ФИО
+✅ ДОБАВЛЕНО: set_lock_owner — точечное обновление колонки "Занято пользователем" по уведомлению
+"""
+from collections import OrderedDict
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtSql import QSqlQuery
+
+from krd_search import parse_search_query
+
+
+KRD_TABLE_HEADERS = [
+    "№ КРД", "Фамилия", "Имя", "Отчество", "Дата рождения", "Статус", "Занято пользователем"
+]
+
+# Индекс колонки с ключом сортировки в выборке (идет сразу после видимых колонок)
+_SORT_KEY_COLUMN = len(KRD_TABLE_HEADERS)
+LOCK_COLUMN = 6
+NOT_LOCKED_TEXT = "🟢 Не занято"
+
+
+class KrdTableModel(QAbstractTableModel):
+    """
+    Виртуализированная модель списка КРД.
+    Строки подгружаются страницами по PAGE_SIZE через keyset-условие
+    (sort_key, k.id) > (:last_key, :last_id), в памяти держится не более MAX_CACHED_PAGES страниц.
+    """
+    PAGE_SIZE = 200
+    MAX_CACHED_PAGES = 10
+
+    _FROM_SQL = """
+        FROM krd.krd k
+        LEFT JOIN krd.social_data s ON k.id = s.krd_id
+        LEFT JOIN krd.statuses st ON k.status_id = st.id
+        LEFT JOIN pg_locks pl ON pl.locktype = 'advisory'
+            AND pl.classid = 0
+            AND pl.objid = k.id
+            AND pl.objsubid = 1
+            AND pl.granted = true
+        LEFT JOIN pg_stat_activity lk ON lk.pid = pl.pid
+    """
+
+    _PAGE_SQL = """
+        SELECT
+            k.id,
+            COALESCE(s.surname, ''),
+            COALESCE(s.name, ''),
+            COALESCE(s.patronymic, ''),
+            s.birth_date,
+            COALESCE(st.name, 'Неизвестен'),
+            COALESCE(lk.application_name, '{not_locked}'),
+            {sort_field}
+        {from_sql}
+        WHERE k.is_deleted = FALSE {filter_sql} {keyset_sql}
+        ORDER BY {sort_field} {sort_order}, k.id {sort_order}
+        LIMIT :limit
+    """
+
+    def __init__(self, db_connection, parent=None):
+        super().__init__(parent)
+        self.db = db_connection
+        self.sort_field = "k.id"
+        self.sort_ascending = False
+        self.search_query = ""
+        self.last_error = ""
+        self._search = None
+
+        self._total_count = 0
+        self._row_count = 0
+        self._at_end = True
+        # _page_bounds[i] — ключ (sort_key, id) последней строки перед страницей i; для страницы 0 — None
+        self._page_bounds = [None]
+        self._pages = OrderedDict()
+
+    # =========================================================================
+    # === ПАРАМЕТРЫ ВЫБОРКИ ===
+    # =========================================================================
+    def set_sort(self, sort_field, order):
+        """Меняет сортировку и перечитывает только первую страницу"""
+        self.sort_field = sort_field
+        self.sort_ascending = order == Qt.SortOrder.AscendingOrder
+        return self.reload()
+
+    def set_search(self, text):
+        """Меняет строку поиска и перечитывает только первую страницу"""
+        self.search_query = (text or "").strip()
+        return self.reload()
+
+    def total_count(self):
+        """Количество записей по текущему фильтру (отдельный COUNT)"""
+        return self._total_count
+
+    # =========================================================================
+    # === ЗАГРУЗКА ===
+    # =========================================================================
+    def reload(self):
+        """Сбрасывает кэш, пересчитывает COUNT и загружает первую страницу"""
+        self.beginResetModel()
+        self._pages.clear()
+        self._page_bounds = [None]
+        self._row_count = 0
+        self._at_end = False
+        self.last_error = ""
+        self._search = parse_search_query(self.search_query)
+
+        ok = self._load_total_count()
+        if ok:
+            rows = self._fetch_page(0)
+            if rows is None:
+                ok = False
+                self._at_end = True
+            else:
+                self._append_page(rows)
+        else:
+            self._at_end = True
+        self.endResetModel()
+        return ok
+
+    def set_lock_owner(self, krd_id, owner):
+        """
+        Обновляет колонку занятости у строки krd_id, если она в кэше.
+        Строки вне кэша не трогаются: при подгрузке они придут из БД уже актуальными.
+        """
+        text = owner or NOT_LOCKED_TEXT
+        for page_index, rows in self._pages.items():
+            for offset, row in enumerate(rows):
+                if row[0] == krd_id:
+                    if row[LOCK_COLUMN] != text:
+                        row[LOCK_COLUMN] = text
+                        model_row = page_index * self.PAGE_SIZE + offset
+                        idx = self.index(model_row, LOCK_COLUMN)
+                        self.dataChanged.emit(idx, idx)
+                    return True
+        return False
+
+    def _load_total_count(self):
+        query = QSqlQuery(self.db)
+        if self._search:
+            # JOIN на social_data нужен только при поиске
+            query.prepare(f"""
+                SELECT COUNT(*)
+                FROM krd.krd k
+                LEFT JOIN krd.social_data s ON k.id = s.krd_id
+                WHERE k.is_deleted = FALSE {self._search.where_sql}
+            """)
+            self._search.bind(query)
+        else:
+            query.prepare("SELECT COUNT(*) FROM krd.krd k WHERE k.is_deleted = FALSE")
+
+        if query.exec() and query.next():
+            self._total_count = int(query.value(0) or 0)
+            return True
+        self._total_count = 0
+        self.last_error = query.lastError().text()
+        print(f"⚠️ [KrdTableModel] Ошибка подсчета записей: {self.last_error}")
+        return False
+
+    def _effective_sort(self):
+        """
+        Поиск по ФИО при сортировке по умолчанию (№ КРД) выдает сначала самые похожие записи;
+        явно выбранная сортировка по другой колонке сохраняется
+        """
+        if self._search and self._search.rank_sql and self.sort_field == "k.id":
+            return self._search.rank_sql, False
+        return self.sort_field, self.sort_ascending
+
+    def _fetch_page(self, page_index):
+        """Загружает одну страницу по keyset-границе. Возвращает список строк или None при ошибке"""
+        bound = self._page_bounds[page_index]
+        sort_field, ascending = self._effective_sort()
+        sort_order = "ASC" if ascending else "DESC"
+        keyset_sql = ""
+        if bound is not None:
+            op = ">" if ascending else "<"
+            keyset_sql = f"AND ({sort_field}, k.id) {op} (:last_key, :last_id)"
+
+        query = QSqlQuery(self.db)
+        query.setForwardOnly(True)
+        query.prepare(self._PAGE_SQL.format(
+            sort_field=sort_field,
+            sort_order=sort_order,
+            from_sql=self._FROM_SQL,
+            filter_sql=self._search.where_sql if self._search else "",
+            keyset_sql=keyset_sql,
+            not_locked=NOT_LOCKED_TEXT
+        ))
+        if self._search:
+            self._search.bind(query)
+        if bound is not None:
+            query.bindValue(":last_key", bound[0])
+            query.bindValue(":last_id", bound[1])
+        query.bindValue(":limit", self.PAGE_SIZE)
+
+        if not query.exec():
+            self.last_error = query.lastError().text()
+            print(f"⚠️ [KrdTableModel] Ошибка загрузки страницы {page_index}: {self.last_error}")
+            return None
+
+        rows = []
+        while query.next():
+            rows.append([query.value(i) for i in range(_SORT_KEY_COLUMN + 1)])
+        return rows
+
+    def _append_page(self, rows):
+        page_index = len(self._page_bounds) - 1
+        self._store_page(page_index, rows)
+        self._row_count += len(rows)
+        if len(rows) < self.PAGE_SIZE:
+            self._at_end = True
+        else:
+            last = rows[-1]
+            self._page_bounds.append((last[_SORT_KEY_COLUMN], last[0]))
+
+    def _store_page(self, page_index, rows):
+        self._pages[page_index] = rows
+        self._pages.move_to_end(page_index)
+        while len(self._pages) > self.MAX_CACHED_PAGES:
+            self._pages.popitem(last=False)
+
+    def _get_page(self, page_index):
+        rows = self._pages.get(page_index)
+        if rows is not None:
+            self._pages.move_to_end(page_index)
+            return rows
+        if page_index >= len(self._page_bounds):
+            return None
+        rows = self._fetch_page(page_index)
+        if rows is None:
+            return None
+        self._store_page(page_index, rows)
+        return rows
+
+    def _get_row(self, row):
+        page = self._get_page(row // self.PAGE_SIZE)
+        offset = row % self.PAGE_SIZE
+        if page is None or offset >= len(page):
+            return None
+        return page[offset]
+
+    # =========================================================================
+    # === ИНТЕРФЕЙС QAbstractTableModel ===
+    # =========================================================================
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(KRD_TABLE_HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self._at_end
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._at_end:
+            return
+        rows = self._fetch_page(len(self._page_bounds) - 1)
+        if not rows:
+            self._at_end = True
+            return
+        first = self._row_count
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._append_page(rows)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        row = self._get_row(index.row())
+        if row is None:
+            return None
+        return row[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if (orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole
+                and 0 <= section < len(KRD_TABLE_HEADERS)):
+            return KRD_TABLE_HEADERS[section]
+        return super().headerData(section, orientation, role)
@@ -0,0 +1,46 @@
+"""
+Применение дельт снапшотов КРД в формате JSON Patch (RFC 6902)
+✅ ДОБАВЛЕНО: apply_patch — восстановление снапшота из предыдущего и дельты
+Дельты строит серверная krd.jsonb_diff_patch (операции add/remove/replace).
+Массивы строк 1:N сравниваются поэлементно (снапшот упорядочен по id), хвост добавляется/удаляется.
+"""
+import copy
+
+
+def _unescape(token):
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def apply_patch(doc, ops, in_place=False):
+    """Применяет операции JSON Patch к doc (по умолчанию к копии) и возвращает результат"""
+    if not in_place:
+        doc = copy.deepcopy(doc)
+    for op in ops:
+        path = op["path"]
+        if path == "":
+            doc = copy.deepcopy(op.get("value"))
+            continue
+        tokens = [_unescape(t) for t in path.split("/")[1:]]
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        kind = op["op"]
+        if isinstance(parent, list):
+            index = len(parent) if last == "-" else int(last)
+            if kind == "add":
+                parent.insert(index, copy.deepcopy(op["value"]))
+            elif kind == "remove":
+                del parent[index]
+            elif kind == "replace":
+                parent[index] = copy.deepcopy(op["value"])
+            else:
+                raise ValueError(f"Неподдерживаемая операция: {kind}")
+        else:
+            if kind in ("add", "replace"):
+                parent[last] = copy.deepcopy(op["value"])
+            elif kind == "remove":
+                del parent[last]
+            else:
+                raise ValueError(f"Неподдерживаемая операция: {kind}")
+    return doc
@@ -1,57 +1,245 @@
 """
 Менеджер версионирования КРД
 Отвечает за создание снапшотов, получение истории и транзакционный откат.
+✅ ОПТИМИЗИРОВАНО: Версии хранятся дельтами JSON Patch к предыдущей версии, полный снимок — каждые KEYFRAME_INTERVAL версий
+✅ ОПТИМИЗИРОВАНО: Если данные не изменились с последней версии, запись не создается
+✅ ДОБАВЛЕНО: get_snapshot — восстановление версии от ближайшего полного снимка
+✅ ОПТИМИЗИРОВАНО: krd.capture_version — снимок строится и записывается на сервере за один запрос,
+   номер версии выдается под блокировкой строки krd.krd_version_heads
+✅ ОПТИМИЗИРОВАНО: rollback_to — восстановление набором (jsonb_populate_recordset), по оператору на таблицу
 """
 from PyQt6.QtSql import QSqlQuery
 import json
 import traceback
 
+from krd_version_delta import apply_patch
+
+
+# Полный снимок (keyframe) не реже чем через столько версий — ограничивает длину цепочки дельт
+KEYFRAME_INTERVAL = 20
+
+# Головная версия КРД: номер, последний keyframe и полный снимок — сервер считает дельту без воспроизведения цепочки
+_VERSION_HEADS_TABLE = """
+    CREATE TABLE IF NOT EXISTS krd.krd_version_heads (
+        krd_id integer PRIMARY KEY REFERENCES krd.krd(id) ON DELETE CASCADE,
+        version_number integer,
+        keyframe_number integer,
+        snapshot jsonb
+    )
+"""
+
+# Разница двух jsonb в формате JSON Patch (применяется krd_version_delta.apply_patch)
+_DIFF_FUNCTION = """
+    CREATE OR REPLACE FUNCTION krd.jsonb_diff_patch(p_old jsonb, p_new jsonb, p_path text DEFAULT '')
+    RETURNS jsonb AS $$
+    DECLARE
+        v_ops jsonb := '[]'::jsonb;
+        v_key text;
+        v_child text;
+        v_old_len integer;
+        v_new_len integer;
+        v_common integer;
+        i integer;
+    BEGIN
+        IF p_old = p_new THEN
+            RETURN v_ops;
+        END IF;
+        IF jsonb_typeof(p_old) = 'object' AND jsonb_typeof(p_new) = 'object' THEN
+            FOR v_key IN SELECT k FROM jsonb_object_keys(p_old) AS k LOOP
+                IF NOT p_new ? v_key THEN
+                    v_ops := v_ops || jsonb_build_array(jsonb_build_object(
+                        'op', 'remove', 'path', p_path || '/' || replace(replace(v_key, '~', '~0'), '/', '~1')));
+                END IF;
+            END LOOP;
+            FOR v_key IN SELECT k FROM jsonb_object_keys(p_new) AS k LOOP
+                v_child := p_path || '/' || replace(replace(v_key, '~', '~0'), '/', '~1');
+                IF p_old ? v_key THEN
+                    v_ops := v_ops || krd.jsonb_diff_patch(p_old -> v_key, p_new -> v_key, v_child);
+                ELSE
+                    v_ops := v_ops || jsonb_build_array(jsonb_build_object(
+                        'op', 'add', 'path', v_child, 'value', p_new -> v_key));
+                END IF;
+            END LOOP;
+            RETURN v_ops;
+        END IF;
+        IF jsonb_typeof(p_old) = 'array' AND jsonb_typeof(p_new) = 'array' THEN
+            v_old_len := jsonb_array_length(p_old);
+            v_new_len := jsonb_array_length(p_new);
+            v_common := LEAST(v_old_len, v_new_len);
+            FOR i IN 0 .. v_common - 1 LOOP
+                v_ops := v_ops || krd.jsonb_diff_patch(p_old -> i, p_new -> i, p_path || '/' || i);
+            END LOOP;
+            FOR i IN v_common .. v_new_len - 1 LOOP
+                v_ops := v_ops || jsonb_build_array(jsonb_build_object(
+                    'op', 'add', 'path', p_path || '/' || i, 'value', p_new -> i));
+            END LOOP;
+            FOR i IN REVERSE v_old_len - 1 .. v_common LOOP
+                v_ops := v_ops || jsonb_build_array(jsonb_build_object('op', 'remove', 'path', p_path || '/' || i));
+            END LOOP;
+            RETURN v_ops;
+        END IF;
+        RETURN jsonb_build_array(jsonb_build_object('op', 'replace', 'path', p_path, 'value', p_new));
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+# Строки 1:N упорядочены по id: дельта между версиями сравнивает строки поэлементно
+_CAPTURE_FUNCTION = """
+    CREATE OR REPLACE FUNCTION krd.capture_version(p_krd_id integer, p_user_id integer, p_description text,
+                                                   p_keyframe_interval integer DEFAULT 20)
+    RETURNS integer AS $$
+    DECLARE
+        v_head krd.krd_version_heads%ROWTYPE;
+        v_snapshot jsonb;
+        v_delta jsonb;
+        v_version integer;
+        v_keyframe boolean;
+    BEGIN
+        INSERT INTO krd.krd_version_heads (krd_id) VALUES (p_krd_id) ON CONFLICT (krd_id) DO NOTHING;
+        -- Блокировка строки головы сериализует выдачу номеров версий одной КРД
+        SELECT * INTO v_head FROM krd.krd_version_heads WHERE krd_id = p_krd_id FOR UPDATE;
+
+        IF v_head.version_number IS NULL THEN
+            -- Голова еще не заполнялась: берем последнюю версию журнала (снимок — только если это keyframe)
+            SELECT COALESCE(MAX(version_number), 0), COALESCE(MAX(version_number) FILTER (WHERE is_keyframe), 0)
+            INTO v_head.version_number, v_head.keyframe_number
+            FROM krd.krd_versions WHERE krd_id = p_krd_id;
+            SELECT snapshot_data INTO v_head.snapshot FROM krd.krd_versions
+            WHERE krd_id = p_krd_id AND version_number = v_head.version_number AND is_keyframe;
+            UPDATE krd.krd_version_heads
+            SET version_number = v_head.version_number, keyframe_number = v_head.keyframe_number,
+                snapshot = v_head.snapshot
+            WHERE krd_id = p_krd_id;
+        END IF;
+
+        v_snapshot := jsonb_build_object(
+            'krd', (SELECT row_to_json(k) FROM krd.krd k WHERE id = p_krd_id),
+            'social_data', (SELECT row_to_json(s) FROM krd.social_data s WHERE krd_id = p_krd_id),
+            'addresses', (SELECT jsonb_agg(row_to_json(a) ORDER BY a.id) FROM krd.addresses a WHERE krd_id = p_krd_id),
+            'service_places', (SELECT jsonb_agg(row_to_json(sp) ORDER BY sp.id) FROM krd.service_places sp WHERE krd_id = p_krd_id),
+            'soch_episodes', (SELECT jsonb_agg(row_to_json(so) ORDER BY so.id) FROM krd.soch_episodes so WHERE krd_id = p_krd_id),
+            'incoming_orders', (SELECT jsonb_agg(row_to_json(io) ORDER BY io.id) FROM krd.incoming_orders io WHERE krd_id = p_krd_id)
+        );
+
+        IF v_head.snapshot IS NOT NULL THEN
+            IF v_head.snapshot = v_snapshot THEN
+                RETURN NULL;  -- Изменений нет
+            END IF;
+            v_delta := krd.jsonb_diff_patch(v_head.snapshot, v_snapshot);
+        END IF;
+
+        v_version := v_head.version_number + 1;
+        -- Полный снимок: нет базы для дельты, истек интервал keyframe или дельта не меньше самого снимка
+        v_keyframe := v_delta IS NULL
+                      OR v_version - v_head.keyframe_number >= p_keyframe_interval
+                      OR length(v_delta::text) >= length(v_snapshot::text);
+
+        INSERT INTO krd.krd_versions
+            (krd_id, version_number, created_by, description, is_keyframe, snapshot_data, delta_data)
+        VALUES (p_krd_id, v_version, p_user_id, p_description, v_keyframe,
+                CASE WHEN v_keyframe THEN v_snapshot END,
+                CASE WHEN v_keyframe THEN NULL ELSE v_delta END);
+
+        UPDATE krd.krd_version_heads
+        SET version_number = v_version,
+            keyframe_number = CASE WHEN v_keyframe THEN v_version ELSE v_head.keyframe_number END,
+            snapshot = v_snapshot
+        WHERE krd_id = p_krd_id;
+        RETURN v_version;
+    END;
+    $$ LANGUAGE plpgsql
+"""
+
+# Таблицы 1:N, восстанавливаемые при откате: (таблица krd.*, ключ в снимке)
+_RESTORE_TABLES = [
+    ('addresses', 'addresses'), ('service_places', 'service_places'),
+    ('soch_episodes', 'soch_episodes'), ('incoming_orders', 'incoming_orders'),
+]
+
+_STORAGE_MIGRATION = [
+    "ALTER TABLE krd.krd_versions ADD COLUMN IF NOT EXISTS is_keyframe boolean NOT NULL DEFAULT true",
+    "ALTER TABLE krd.krd_versions ADD COLUMN IF NOT EXISTS delta_data jsonb",
+    "ALTER TABLE krd.krd_versions ALTER COLUMN snapshot_data DROP NOT NULL",
+    "COMMENT ON COLUMN krd.krd_versions.delta_data IS 'JSON Patch к предыдущей версии (для is_keyframe = false)'",
+    "CREATE INDEX IF NOT EXISTS idx_krd_versions_keyframes ON krd.krd_versions (krd_id, version_number) WHERE is_keyframe",
+    _VERSION_HEADS_TABLE,
+    _DIFF_FUNCTION,
+    _CAPTURE_FUNCTION,
+]
+
+
+def ensure_version_storage(db):
+    """Колонки дельт в krd.krd_versions, таблица голов и серверные функции версионирования"""
+    for sql in _STORAGE_MIGRATION:
+        q = QSqlQuery(db)
+        if not q.exec(sql):
+            print(f"⚠️ [VERSION] Ошибка подготовки хранилища версий: {q.lastError().text()}")
+            return False
+    return True
+
+
 class KrdVersionManager:
     def __init__(self, db_connection):
         self.db = db_connection
 
     def capture_snapshot(self, krd_id: int, user_id: int, description: str = "Автосохранение") -> bool:
-        """Создаёт JSONB-снапшот всей КРД и сохраняет в krd_versions"""
-        try:
-            q = QSqlQuery(self.db)
-            q.prepare("SELECT COALESCE(MAX(version_number), 0) + 1 FROM krd.krd_versions WHERE krd_id = :krd_id")
-            q.bindValue(":krd_id", krd_id)
-            if q.exec() and q.next():
-                new_ver = q.value(0)
-            else:
-                return False
-
-            q2 = QSqlQuery(self.db)
-            q2.prepare("""
-                SELECT jsonb_build_object(
-                    'krd', (SELECT row_to_json(k) FROM krd.krd k WHERE id = :krd_id),
-                    'social_data', (SELECT row_to_json(s) FROM krd.social_data s WHERE krd_id = :krd_id),
-                    'addresses', (SELECT jsonb_agg(row_to_json(a)) FROM krd.addresses a WHERE krd_id = :krd_id),
-                    'service_places', (SELECT jsonb_agg(row_to_json(sp)) FROM krd.service_places sp WHERE krd_id = :krd_id),
-                    'soch_episodes', (SELECT jsonb_agg(row_to_json(so)) FROM krd.soch_episodes so WHERE krd_id = :krd_id),
-                    'incoming_orders', (SELECT jsonb_agg(row_to_json(io)) FROM krd.incoming_orders io WHERE krd_id = :krd_id)
-                )
-            """)
-            q2.bindValue(":krd_id", krd_id)
-            if not (q2.exec() and q2.next()):
-                return False
-            snapshot_json = q2.value(0)
-
-            q3 = QSqlQuery(self.db)
-            q3.prepare("""
-                INSERT INTO krd.krd_versions (krd_id, version_number, created_by, description, snapshot_data)
-                VALUES (:krd_id, :version, :user_id, :desc, :snapshot)
-            """)
-            q3.bindValue(":krd_id", krd_id)
-            q3.bindValue(":version", new_ver)
-            q3.bindValue(":user_id", user_id)
-            q3.bindValue(":desc", description)
-            q3.bindValue(":snapshot", snapshot_json)
-            return q3.exec()
-        except Exception as e:
-            print(f"❌ [VERSION] Ошибка создания снапшота: {e}")
-            traceback.print_exc()
+        """
+        Создает версию КРД одним вызовом krd.capture_version: снимок, дельта и номер версии — на сервере.
+        Возвращает False, если версия не создана (в т.ч. когда данные не изменились).
+        """
+        q = QSqlQuery(self.db)
+        q.prepare("SELECT krd.capture_version(:krd_id, :user_id, :desc, :keyframe_interval)")
+        q.bindValue(":krd_id", krd_id)
+        q.bindValue(":user_id", user_id)
+        q.bindValue(":desc", description)
+        q.bindValue(":keyframe_interval", KEYFRAME_INTERVAL)
+        if not (q.exec() and q.next()):
+            print(f"❌ [VERSION] Ошибка создания снапшота: {q.lastError().text()}")
             return False
+        if q.isNull(0):
+            print(f"ℹ️ [VERSION] КРД-{krd_id}: изменений нет, версия не создается")
+            return False
+        return True
+
+    def get_snapshot(self, version_id: int):
+        """Полный снапшот версии: ближайший предшествующий keyframe + дельты до нее. None, если версии нет"""
+        q = QSqlQuery(self.db)
+        q.prepare("SELECT krd_id, version_number FROM krd.krd_versions WHERE id = :id")
+        q.bindValue(":id", version_id)
+        if not (q.exec() and q.next()):
+            return None
+        return self._reconstruct(q.value(0), q.value(1))
+
+    def _reconstruct(self, krd_id: int, version_number: int):
+        q = QSqlQuery(self.db)
+        q.setForwardOnly(True)
+        q.prepare("""
+            SELECT version_number, is_keyframe, snapshot_data, delta_data
+            FROM krd.krd_versions
+            WHERE krd_id = :krd_id
+              AND version_number <= :version
+              AND version_number >= (
+                  SELECT MAX(version_number) FROM krd.krd_versions
+                  WHERE krd_id = :krd_id AND version_number <= :version AND is_keyframe
+              )
+            ORDER BY version_number
+        """)
+        q.bindValue(":krd_id", krd_id)
+        q.bindValue(":version", version_number)
+        if not q.exec():
+            print(f"❌ [VERSION] Ошибка чтения цепочки версий: {q.lastError().text()}")
+            return None
+        snapshot = None
+        try:
+            while q.next():
+                if q.value(1):
+                    snapshot = json.loads(q.value(2))
+                elif snapshot is not None:
+                    apply_patch(snapshot, json.loads(q.value(3)), in_place=True)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"❌ [VERSION] Повреждена цепочка версий КРД-{krd_id} (v{version_number}): {e}")
+            return None
+        return snapshot
 
     def get_versions(self, krd_id: int) -> list[dict]:
         """Возвращает список версий для КРД"""
@@ -76,51 +264,83 @@ class KrdVersionManager:
                 })
         return versions
 
-    def rollback_to(self, version_id: int, krd_id: int) -> bool:
-        """Транзакционный откат КРД к указанной версии"""
+    def rollback_to(self, version_id: int, krd_id: int):
+        """
+        Транзакционный откат КРД к указанной версии: по одному оператору на таблицу
+        (jsonb_populate_record/recordset на сервере). Возвращает {таблица: число строк} или None при ошибке.
+        """
+        data = self.get_snapshot(version_id)
+        if data is None:
+            return None
         if not self.db.transaction():
-            return False
+            return None
         try:
-            q = QSqlQuery(self.db)
-            q.prepare("SELECT snapshot_data FROM krd.krd_versions WHERE id = :id")
-            q.bindValue(":id", version_id)
-            if not (q.exec() and q.next()):
-                self.db.rollback()
-                return False
-
-            data = json.loads(q.value(0))
-
-            # 1:1 таблицы
-            if data.get('social_data'):
-                sd = data['social_data']
-                sd.pop('id', None)
-                sets = ", ".join([f"{k}=:{k}" for k in sd.keys()])
-                uq = QSqlQuery(self.db)
-                uq.prepare(f"UPDATE krd.social_data SET {sets} WHERE krd_id = :krd_id")
-                for k, v in sd.items(): uq.bindValue(f":{k}", v)
-                uq.bindValue(":krd_id", krd_id)
-                uq.exec()
-
-            # 1:N таблицы (полная замена)
-            for table, key in [('krd.addresses', 'addresses'), ('krd.service_places', 'service_places'),
-                               ('krd.soch_episodes', 'soch_episodes'), ('krd.incoming_orders', 'incoming_orders')]:
-                if data.get(key):
-                    dq = QSqlQuery(self.db)
-                    dq.prepare(f"DELETE FROM {table} WHERE krd_id = :krd_id")
-                    dq.bindValue(":krd_id", krd_id)
-                    dq.exec()
-                    for row_data in data[key]:
-                        iq = QSqlQuery(self.db)
-                        cols = ", ".join(row_data.keys())
-                        placeholders = ", ".join([f":{k}" for k in row_data.keys()])
-                        iq.prepare(f"INSERT INTO {table} ({cols}) VALUES ({placeholders})")
-                        for k, v in row_data.items(): iq.bindValue(f":{k}", v)
-                        iq.exec()
-
-            self.db.commit()
-            return True
+            columns = self._table_columns(['social_data'] + [t for t, _ in _RESTORE_TABLES])
+            counts = {}
+
+            # 1:1 таблица: обновляются колонки, сохраненные в снимке и существующие в текущей схеме
+            sd = data.get('social_data')
+            if sd:
+                cols = [c for c in sd if c in columns['social_data'] and c not in ('id', 'krd_id')]
+                if cols:
+                    sets = ", ".join(f'"{c}" = r."{c}"' for c in cols)
+                    counts['social_data'] = self._exec_restore(f"""
+                        UPDATE krd.social_data s SET {sets}
+                        FROM jsonb_populate_record(NULL::krd.social_data, CAST(:rows AS jsonb)) r
+                        WHERE s.krd_id = :krd_id
+                    """, krd_id, sd)
+
+            # 1:N таблицы: полная замена набором строк снимка (пустой набор — строк не было)
+            for table, key in _RESTORE_TABLES:
+                if key not in data:
+                    continue
+                rows = data[key] or []
+                deleted = self._exec_restore(f"DELETE FROM krd.{table} WHERE krd_id = :krd_id", krd_id)
+                inserted = 0
+                if rows:
+                    snapshot_cols = {c for row in rows for c in row}
+                    cols = ", ".join(f'"{c}"' for c in columns[table] if c in snapshot_cols)
+                    inserted = self._exec_restore(f"""
+                        INSERT INTO krd.{table} ({cols})
+                        SELECT {cols} FROM jsonb_populate_recordset(NULL::krd.{table}, CAST(:rows AS jsonb))
+                    """, None, rows)
+                counts[table] = inserted
+                print(f"♻️ [VERSION] {table}: удалено {deleted}, восстановлено {inserted}")
+
+            if not self.db.commit():
+                raise Exception(self.db.lastError().text())
+            print(f"✅ [VERSION] КРД-{krd_id} восстановлена до версии id={version_id}: {counts}")
+            return counts
         except Exception as e:
             self.db.rollback()
             print(f"❌ [VERSION] Ошибка отката: {e}")
             traceback.print_exc()
-            return False
\ No newline at end of file
+            return None
+
+    def _table_columns(self, tables):
+        """Колонки таблиц схемы krd в порядке объявления — одним запросом (генерируемые не записываются)"""
+        q = QSqlQuery(self.db)
+        q.prepare("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = 'krd' AND table_name = ANY(CAST(:tables AS text[]))
+              AND is_generated = 'NEVER'
+            ORDER BY table_name, ordinal_position
+        """)
+        q.bindValue(":tables", "{" + ",".join(tables) + "}")
+        if not q.exec():
+            raise Exception(q.lastError().text())
+        columns = {t: [] for t in tables}
+        while q.next():
+            columns[q.value(0)].append(q.value(1))
+        return columns
+
+    def _exec_restore(self, sql, krd_id, rows=None):
+        q = QSqlQuery(self.db)
+        q.prepare(sql)
+        if krd_id is not None:
+            q.bindValue(":krd_id", krd_id)
+        if rows is not None:
+            q.bindValue(":rows", json.dumps(rows, ensure_ascii=False))
+        if not q.exec():
+            raise Exception(f"{q.lastError().text()}\n📝 SQL: {sql.strip()[:200]}")
+        return q.numRowsAffected()
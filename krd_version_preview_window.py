@@ -3,14 +3,12 @@
 Легковесное окно для предпросмотра версии КРД.
 Полностью изолировано: без блокировок, без автосохранения, только чтение.
 """
-import json
 import traceback
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QTabWidget, QMessageBox,
     QComboBox, QPushButton, QLabel, QWidget, QAbstractItemView
 )
 from PyQt6.QtGui import QStandardItemModel, QStandardItem
-from PyQt6.QtSql import QSqlQuery
 from PyQt6.QtCore import Qt,QTimer
 
 from social_data_tab import SocialDataTab
@@ -20,6 +18,8 @@ from service_places_tab import ServicePlacesTab
 from soch_episodes_tab import SochEpisodesTab
 from outgoing_requests_tab import OutgoingRequestsTab
 from ui_helpers import apply_readonly_mode
+from krd_aggregate import CARD_PARTS, REQUEST_PARTS, KrdAggregateLoader
+from krd_version_manager import KrdVersionManager
 
 class KrdVersionPreviewWindow(QDialog):
     def __init__(self, db_connection, krd_id, version_id, user_info, audit_logger=None, parent=None):
@@ -67,6 +67,9 @@ class KrdVersionPreviewWindow(QDialog):
         header_layout.addWidget(self.status_combo)
         header_layout.addStretch()
         main_layout.addWidget(header_widget)
+        # Текущие данные КРД для вкладок и статуса — один запрос (затем поверх показывается снапшот версии)
+        self.card = KrdAggregateLoader(self.db).load(
+            self.krd_id, [p for p in CARD_PARTS if p not in REQUEST_PARTS])
         self.load_statuses()
 
         self.banner = QLabel("⏳ Загрузка данных...")
@@ -75,11 +78,11 @@ class KrdVersionPreviewWindow(QDialog):
         main_layout.addWidget(self.banner)
 
         self.tabs = QTabWidget()
-        self.social_data_tab = SocialDataTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        self.addresses_tab = AddressesTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        self.incoming_orders_tab = IncomingOrdersTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        self.service_places_tab = ServicePlacesTab(self.krd_id, self.db, self.audit_logger, self.user_info)
-        self.soch_episodes_tab = SochEpisodesTab(self.krd_id, self.db, self.audit_logger, self.user_info)
+        self.social_data_tab = SocialDataTab(self.krd_id, self.db, self.audit_logger, self.user_info, card=self.card)
+        self.addresses_tab = AddressesTab(self.krd_id, self.db, self.audit_logger, self.user_info, card=self.card)
+        self.incoming_orders_tab = IncomingOrdersTab(self.krd_id, self.db, self.audit_logger, self.user_info, card=self.card)
+        self.service_places_tab = ServicePlacesTab(self.krd_id, self.db, self.audit_logger, self.user_info, card=self.card)
+        self.soch_episodes_tab = SochEpisodesTab(self.krd_id, self.db, self.audit_logger, self.user_info, card=self.card)
         
         self.tabs.addTab(self.social_data_tab, "👤 Социально-демографические данные")
         self.tabs.addTab(self.addresses_tab, "🏠 Адреса проживания")
@@ -90,25 +93,19 @@ class KrdVersionPreviewWindow(QDialog):
         main_layout.addWidget(self.tabs)
 
     def load_statuses(self):
-        q = QSqlQuery(self.db)
-        q.exec("SELECT id, name FROM krd.statuses ORDER BY id")
-        q2 = QSqlQuery(self.db)
-        q2.prepare("SELECT status_id FROM krd.krd WHERE id = :id")
-        q2.bindValue(":id", self.krd_id)
-        current = q2.value(0) if q2.exec() and q2.next() else 1
-        while q.next():
-            self.status_combo.addItem(q.value(1), q.value(0))
+        krd = self.card.get('krd')
+        current = krd['status_id'] if krd else 1
+        for status in self.card.get('statuses') or []:
+            self.status_combo.addItem(status['name'], status['id'])
         idx = self.status_combo.findData(current)
         if idx >= 0: self.status_combo.setCurrentIndex(idx)
 
     def load_version_data(self):
         print(f"🟢 [PREVIEW] Загрузка данных для версии #{self.version_id}")
         try:
-            q = QSqlQuery(self.db)
-            q.prepare("SELECT snapshot_data FROM krd.krd_versions WHERE id = :id")
-            q.bindValue(":id", self.version_id)
-            if q.exec() and q.next():
-                snapshot = json.loads(q.value(0))
+            # Версия может храниться дельтой — снапшот собирается от ближайшего полного снимка
+            snapshot = KrdVersionManager(self.db).get_snapshot(self.version_id)
+            if snapshot is not None:
                 self.banner.setText("👁️ РЕЖИМ ПРЕДПРОСМОТРА: Историческая версия данных. Доступно только для чтения.")
                 self.banner.setStyleSheet("background-color: #fff3cd; color: #856404; padding: 10px; font-weight: bold; text-align: center;")
                 apply_readonly_mode(self, True)
@@ -0,0 +1,97 @@
+"""
+Вкладки с отложенным созданием
+✅ ОПТИМИЗИРОВАНО: Виджет вкладки (запросы, справочники, автодополнение) создается при первом показе
+✅ ДОБАВЛЕНО: Предзагрузка остальных вкладок после отрисовки окна — по одной за проход цикла событий
+✅ ДОБАВЛЕНО: Время создания каждой вкладки в журнале
+"""
+import time
+
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QLabel, QTabWidget, QVBoxLayout, QWidget
+
+
+class _LazyPage(QWidget):
+    """Страница QTabWidget: заглушка, пока фабрика не создала настоящий виджет"""
+
+    def __init__(self, factory, parent=None):
+        super().__init__(parent)
+        self.factory = factory
+        self.content = None
+        self._layout = QVBoxLayout(self)
+        self._layout.setContentsMargins(0, 0, 0, 0)
+        self._placeholder = QLabel("⏳ Загрузка...")
+        self._placeholder.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self._layout.addWidget(self._placeholder)
+
+    def build(self):
+        self.content = self.factory()
+        self._layout.removeWidget(self._placeholder)
+        self._placeholder.deleteLater()
+        self._placeholder = None
+        self._layout.addWidget(self.content)
+        return self.content
+
+
+class LazyTabWidget(QTabWidget):
+    """
+    QTabWidget, страницы которого создаются фабриками по требованию:
+    при переключении на вкладку, через ensure_built() или предзагрузкой prefetch().
+    """
+    tab_built = pyqtSignal(int, object)   # индекс вкладки, созданный виджет
+
+    # Пауза между предзагрузкой вкладок (мс) — ввод пользователя обрабатывается между ними
+    PREFETCH_INTERVAL_MS = 30
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._prefetch_queue = []
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.timeout.connect(self._prefetch_next)
+        # Подключено раньше обработчиков владельца: к их вызову виджет вкладки уже создан
+        self.currentChanged.connect(self.ensure_built)
+
+    def add_lazy_tab(self, factory, label):
+        return self.addTab(_LazyPage(factory), label)
+
+    def tab_content(self, index):
+        """Созданный виджет вкладки или None (вкладка еще не открывалась)"""
+        page = self.widget(index)
+        return page.content if isinstance(page, _LazyPage) else page
+
+    def built_widgets(self):
+        return [w for w in (self.tab_content(i) for i in range(self.count())) if w is not None]
+
+    def ensure_built(self, index):
+        page = self.widget(index)
+        if not isinstance(page, _LazyPage):
+            return page
+        if page.content is None:
+            started = time.perf_counter()
+            content = page.build()
+            print(f"🗂️ [TABS] Вкладка «{self.tabText(index).strip()}» создана за "
+                  f"{(time.perf_counter() - started) * 1000:.0f} мс")
+            self.tab_built.emit(index, content)
+        return page.content
+
+    def ensure_all_built(self):
+        self.stop_prefetch()
+        for index in range(self.count()):
+            self.ensure_built(index)
+
+    def prefetch(self):
+        """Создает оставшиеся вкладки в фоне цикла событий — по одной, с паузой PREFETCH_INTERVAL_MS"""
+        self._prefetch_queue = [i for i in range(self.count()) if self.tab_content(i) is None]
+        if self._prefetch_queue:
+            self._prefetch_timer.start(self.PREFETCH_INTERVAL_MS)
+
+    def stop_prefetch(self):
+        self._prefetch_queue = []
+        self._prefetch_timer.stop()
+
+    def _prefetch_next(self):
+        if not self._prefetch_queue:
+            return
+        self.ensure_built(self._prefetch_queue.pop(0))
+        if self._prefetch_queue:
+            self._prefetch_timer.start(self.PREFETCH_INTERVAL_MS)
@@ -13,6 +13,10 @@
 ✅ ДОБАВЛЕНО: Меню "Администрирование" (Пользователи, Удаленные, Аудит)
 ✅ УДАЛЕНО: Кнопки администрирования с Toolbar
 ✅ ИСПРАВЛЕНО: Баг с неотображаемым QFileDialog при экспорте (QTimer.singleShot)
+✅ ОПТИМИЗИРОВАНО: Таблица КРД на KrdTableModel (keyset-пагинация, LRU-кэш страниц, отдельный COUNT)
+✅ ОПТИМИЗИРОВАНО: Статус занятости по LISTEN/NOTIFY (KrdLockListener) вместо перезапроса таблицы раз в 3 секунды
+✅ ДОБАВЛЕНО: Пункт "Пакетная генерация документов" в меню "Отчеты"
+✅ ОПТИМИЗИРОВАНО: Меню смены статуса заполняется из кэша справочников (reference_cache)
 """
 
 import sys
@@ -26,7 +30,7 @@ from PyQt6.QtWidgets import (
     QMessageBox, QMenu, QFileDialog, QAbstractItemView, QProgressDialog, QLineEdit
 )
 from PyQt6.QtCore import Qt, QPoint, QDate, QTimer
-from PyQt6.QtSql import QSqlDatabase, QSqlQueryModel, QSqlQuery
+from PyQt6.QtSql import QSqlDatabase, QSqlQuery
 from PyQt6.QtGui import QAction, QFont
 
 # === ИМПОРТЫ ДЛЯ ЭКСПОРТА В EXCEL ===
@@ -40,7 +44,12 @@ from add_krd_window import AddKrdWindow
 from audit_logger import AuditLogger
 from export_helper import KrdExcelExporter
 from report_config_dialog import ReportConfigDialog
+from bulk_generation_dialog import BulkGenerationDialog
+from background_job import stop_active_jobs
 from theme_manager import ThemeManager
+from krd_table_model import KrdTableModel
+from krd_lock_notifier import KrdLockListener
+from reference_cache import reference_rows
 
 
 class MainWindow(QMainWindow):
@@ -64,14 +73,15 @@ class MainWindow(QMainWindow):
         # === ДЛЯ СОРТИРОВКИ ===
         self.sort_column = 0
         self.sort_order = Qt.SortOrder.DescendingOrder
+        # Выражения без NULL: используются в keyset-условии (sort_key, k.id) > (...)
         self.sort_column_names = {
-            0: "k.id",          # № КРД
-            1: "s.surname",     # Фамилия
-            2: "s.name",        # Имя
-            3: "s.patronymic",  # Отчество
-            4: "s.birth_date",  # Дата рождения
-            5: "st.name",       # Статус
-            6: "lk.usename"     # Занято пользователем (NULLS LAST обрабатывается PG по умолчанию)
+            0: "k.id",                                         # № КРД
+            1: "COALESCE(s.surname, '')",                      # Фамилия
+            2: "COALESCE(s.name, '')",                         # Имя
+            3: "COALESCE(s.patronymic, '')",                   # Отчество
+            4: "COALESCE(s.birth_date, DATE '0001-01-01')",    # Дата рождения
+            5: "COALESCE(st.name, '')",                        # Статус
+            6: "COALESCE(lk.application_name, '')"             # Занято пользователем
         }
         
         # Таймер для поиска с задержкой (debounce)
@@ -82,9 +92,9 @@ class MainWindow(QMainWindow):
         self.user_id = user_info.get('id')
         self.current_krd_window = None
 
-        # Таймер для обновления статуса занятости (раз в 3 секунды, чтобы не перегружать БД)
-        self.lock_timer = QTimer()
-        self.lock_timer.timeout.connect(self.update_lock_status)
+        # Слушатель изменений занятости: обновляет только затронутые строки модели
+        self.lock_listener = KrdLockListener(self.db, self)
+        self.lock_listener.lock_changed.connect(self.update_lock_status)
         
         self.init_ui()
         self.load_krd_data()
@@ -93,8 +103,8 @@ class MainWindow(QMainWindow):
         # Очистка зависших блокировок при старте
         self.cleanup_stale_locks_on_startup()
         
-        # Запускаем мониторинг блокировок (3000 мс = 3 секунды, оптимальный баланс)
-        self.lock_timer.start(3000)
+        # Запускаем мониторинг блокировок (push-уведомления + редкая сверка по pg_locks)
+        self.lock_listener.start()
     
     def init_ui(self):
         self.create_menu_bar()
@@ -132,6 +142,11 @@ class MainWindow(QMainWindow):
             generate_all_reports_action.setToolTip("Сгенерировать отчеты по всем КРД в базе данных с выбором шаблона")
             generate_all_reports_action.triggered.connect(self.on_generate_all_reports)
             reports_menu.addAction(generate_all_reports_action)
+
+            bulk_generation_action = QAction("📄 Пакетная генерация документов...", self)
+            bulk_generation_action.setToolTip("Сгенерировать документ по одному шаблону для множества КРД")
+            bulk_generation_action.triggered.connect(self.on_bulk_generation)
+            reports_menu.addAction(bulk_generation_action)
             
         # === МЕНЮ "СПРАВОЧНИКИ" ===
         ref_menu = menu_bar.addMenu("📚 Справочники")
@@ -272,7 +287,7 @@ class MainWindow(QMainWindow):
         search_layout.addWidget(QLabel("🔍 Поиск:"))
         
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Введите фамилию, имя, отчество или номер КРД...")
+        self.search_input.setPlaceholderText("ФИО, номер КРД, дата рождения или номер документа...")
         self.search_input.setMinimumHeight(35)
         self.search_input.textChanged.connect(self.on_search_text_changed)
         search_layout.addWidget(self.search_input)
@@ -287,7 +302,7 @@ class MainWindow(QMainWindow):
         
         layout.addLayout(search_layout)
         
-        self.table_model_krd = QSqlQueryModel()
+        self.table_model_krd = KrdTableModel(self.db, self)
         self.krd_table_view = QTableView()
         self.krd_table_view.setModel(self.table_model_krd)
         self.krd_table_view.setAlternatingRowColors(True)
@@ -335,62 +350,15 @@ class MainWindow(QMainWindow):
         self.load_krd_data()
         self.search_input.setFocus()
     
-    def _get_base_query(self):
-        """Формирует базовый SQL-запрос с учетом структуры колонок и блокировок"""
-        return """
-        SELECT
-            k.id AS "№ КРД",
-            COALESCE(s.surname, '') AS "Фамилия",
-            COALESCE(s.name, '') AS "Имя",
-            COALESCE(s.patronymic, '') AS "Отчество",
-            s.birth_date AS "Дата рождения", 
-            COALESCE(st.name, 'Неизвестен') AS "Статус",
-            CASE
-                WHEN lk.application_name IS NOT NULL THEN lk.application_name
-                ELSE '🟢 Не занято'
-            END AS "Занято пользователем"
-        FROM krd.krd k
-        LEFT JOIN krd.social_data s ON k.id = s.krd_id
-        LEFT JOIN krd.statuses st ON k.status_id = st.id
-        LEFT JOIN pg_locks pl ON pl.locktype = 'advisory'
-            AND pl.classid = 0
-            AND pl.objid = k.id
-            AND pl.objsubid = 1
-            AND pl.granted = true
-        LEFT JOIN pg_stat_activity lk ON lk.pid = pl.pid
-        WHERE k.is_deleted = FALSE
-        ORDER BY {sort_field} {sort_order}
-        """
-
     def load_krd_data(self):
-        """Загрузка данных КРД в таблицу"""
-        query = QSqlQuery(self.db)
-        sort_field = self.sort_column_names.get(self.sort_column, "k.id")
-        sort_order = "ASC" if self.sort_order == Qt.SortOrder.AscendingOrder else "DESC"
-        
-        base_sql = self._get_base_query().format(sort_field=sort_field, sort_order=sort_order)
-        
-        if self.search_query:
-            search_sql = base_sql.replace(
-                "WHERE k.is_deleted = FALSE",
-                """WHERE k.is_deleted = FALSE
-                AND (
-                LOWER(s.surname) LIKE LOWER(:search) OR
-                LOWER(s.name) LIKE LOWER(:search) OR
-                LOWER(s.patronymic) LIKE LOWER(:search) OR
-                LOWER(k.id::text) LIKE LOWER(:search) OR
-                LOWER(s.surname || ' ' || s.name || ' ' || s.patronymic) LIKE LOWER(:search) OR
-                TO_CHAR(s.birth_date, 'DD.MM.YYYY') LIKE LOWER(:search)
-                )"""
-            )
-            query.prepare(search_sql)
-            query.bindValue(":search", f"%{self.search_query}%")
-        else:
-            query.prepare(base_sql)
+        """Загрузка данных КРД в таблицу (только первая страница, остальное — при прокрутке)"""
+        model = self.table_model_krd
+        model.sort_field = self.sort_column_names.get(self.sort_column, "k.id")
+        model.sort_ascending = self.sort_order == Qt.SortOrder.AscendingOrder
+        model.search_query = self.search_query
         
-        if query.exec():
-            self.table_model_krd.setQuery(query)
-            count = self.table_model_krd.rowCount()
+        if model.reload():
+            count = model.total_count()
             if self.search_query:
                 self.found_count_label.setText(f"🔍 Найдено: {count} записей по запросу \"{self.search_query}\"")
             else:
@@ -398,11 +366,9 @@ class MainWindow(QMainWindow):
         else:
             self.found_count_label.setText("⚠️ Ошибка загрузки данных")
 
-    def update_lock_status(self):
-        """Обновляет таблицу для отображения актуального статуса блокировок"""
-        # Примечание: Полный перезапрос может быть тяжелым для больших БД. 
-        # 3 секунды (настройка в __init__) являются компромиссом между актуальностью и нагрузкой.
-        self.load_krd_data()
+    def update_lock_status(self, krd_id, owner):
+        """Точечно обновляет колонку "Занято пользователем" для одной КРД"""
+        self.table_model_krd.set_lock_owner(krd_id, owner)
     
     def on_selection_changed(self, selected, deselected):
         self.delete_krd_action.setEnabled(self.krd_table_view.selectionModel().hasSelection())
@@ -426,13 +392,8 @@ class MainWindow(QMainWindow):
         menu.exec(self.krd_table_view.mapToGlobal(position))
 
     def _fill_status_menu(self, menu, krd_id):
-        """Заполняет меню доступными статусами из БД"""
-        query = QSqlQuery(self.db)
-        query.exec("SELECT id, name FROM krd.statuses ORDER BY id")
-        
-        while query.next():
-            status_id = query.value(0)
-            status_name = query.value(1)
+        """Заполняет меню доступными статусами (из кэша справочников)"""
+        for status_id, status_name in reference_rows(self.db, 'statuses'):
             action = QAction(status_name, self)
             action.triggered.connect(lambda checked=False, sid=status_id, name=status_name: self.update_krd_status(krd_id, sid, name))
             menu.addAction(action)
@@ -484,6 +445,13 @@ class MainWindow(QMainWindow):
             traceback.print_exc()
             QMessageBox.critical(self, "Ошибка", f"Ошибка при подготовке отчета:\n{str(e)}")
     
+    def on_bulk_generation(self):
+        try:
+            BulkGenerationDialog(self.db, self, audit_logger=self.audit_logger).exec()
+        except Exception as e:
+            traceback.print_exc()
+            QMessageBox.critical(self, "Ошибка", f"Ошибка пакетной генерации:\n{str(e)}")
+
     def on_manage_templates(self):
         try:
             ReportConfigDialog(self.db, self).exec()
@@ -570,7 +538,9 @@ class MainWindow(QMainWindow):
     
     def closeEvent(self, event):
         self.audit_logger.log_user_logout()
-        self.lock_timer.stop()
+        self.lock_listener.stop()
+        stop_active_jobs()
+        self.audit_logger.close()
         super().closeEvent(event)
     
     def open_user_audit_window(self):
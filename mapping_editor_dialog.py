@@ -15,13 +15,14 @@ from PyQt6.QtWidgets import (
     QComboBox, QDialogButtonBox, QGroupBox, QTableWidgetItem, QCompleter
 )
 from ui_helpers import BaseDialog
-from PyQt6.QtCore import Qt, QByteArray
+from PyQt6.QtCore import Qt
 from PyQt6.QtSql import QSqlQuery
 from PyQt6.QtGui import QFont
 from docx import Document
 from composite_field_widget import CompositeFieldWidget
 from field_mapping_manager import FieldMappingManager
 from searchable_combo import SearchableComboBox
+from blob_store import load_file_data
 
 # ✅ ЕДИНЫЙ ИСТОЧНИК ДАННЫХ: Импорт включает get_field_description для корректного поиска
 try:
@@ -254,14 +255,13 @@ class MappingEditorDialog(BaseDialog):
         if not template_id: return
         
         query = QSqlQuery(self.db)
-        query.prepare("SELECT template_data FROM krd.document_templates WHERE id = ?")
+        query.prepare("SELECT template_hash, template_data FROM krd.document_templates WHERE id = ?")
         query.addBindValue(template_id)
         if not query.exec() or not query.next():
             self.template_variables = []
             return
 
-        data = query.value(0)
-        template_bytes = bytes(data) if isinstance(data, QByteArray) else (bytes(data) if data else b'')
+        template_bytes = load_file_data(self.db, query.value(0), query.value(1)) or b''
         if not template_bytes:
             self.template_variables = []
             return
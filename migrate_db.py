@@ -0,0 +1,92 @@
+"""
+Миграции схемы БД и периодическое обслуживание
+✅ ДОБАВЛЕНО: Изменения схемы и переносы данных выполняются здесь, отдельно от запуска клиентов:
+   клиент при старте только проверяет, что схема на месте, и не берет блокировок на таблицы
+Запускает администратор под владельцем таблиц схемы krd:
+    python migrate_db.py                  # миграции + обслуживание (после обновления)
+    python migrate_db.py --maintenance    # только обслуживание (по расписанию, раз в месяц)
+Параметры подключения: --host --port --dbname --user, пароль — из PGPASSWORD или запрашивается.
+Без параметров используется db_config.enc клиента.
+"""
+import argparse
+import getpass
+import os
+import sys
+import time
+
+from PyQt6.QtCore import QCoreApplication
+
+from config_manager import ConfigManager
+from db_connector import DatabaseConnector
+from audit_partitions import install_audit_partitioning, run_audit_maintenance
+from blob_store import install_blob_storage, migrate_inline_blobs, collect_unreferenced_blobs
+from krd_search import install_search_schema
+from photo_store import install_photo_storage
+
+
+# Однократные изменения схемы (каждый шаг сам проверяет, выполнен ли он)
+MIGRATIONS = [
+    ("Секционирование журнала аудита", install_audit_partitioning),
+    ("Колонки и индексы поиска КРД", install_search_schema),
+    ("Хеши фото и таблица миниатюр", install_photo_storage),
+    ("Хранилище файлов по хешу", install_blob_storage),
+    ("Перенос файлов из таблиц в хранилище", migrate_inline_blobs),
+]
+
+# Периодическое обслуживание
+MAINTENANCE = [
+    ("Секции журнала аудита", run_audit_maintenance),
+    ("Удаление файлов без ссылок", collect_unreferenced_blobs),
+]
+
+
+def _connect(args):
+    if args.host or args.dbname or args.user:
+        password = os.environ.get("PGPASSWORD") or getpass.getpass("Пароль БД: ")
+        connector = DatabaseConnector(host=args.host or "localhost", port=args.port, dbname=args.dbname or "krd_system",
+                                      user=args.user or "arm_user", password=password, ssl_mode=args.sslmode)
+    else:
+        db_config = ConfigManager().load_config()
+        if not db_config:
+            raise Exception("Нет параметров подключения: укажите --host/--dbname/--user или настройте клиент")
+        connector = DatabaseConnector(host=db_config['host'], port=db_config['port'], dbname=db_config['dbname'],
+                                      user=db_config['user'], password=db_config['password'], ssl_mode=args.sslmode)
+    success, msg = connector.connect()
+    if not success:
+        raise Exception(msg)
+    return connector.get_connection()
+
+
+def run_steps(db, steps):
+    for title, step in steps:
+        started = time.perf_counter()
+        print(f"▶️ {title}...")
+        step(db)
+        print(f"✅ {title}: {time.perf_counter() - started:.1f} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы БД АРМ и периодическое обслуживание")
+    parser.add_argument("--maintenance", action="store_true", help="только периодическое обслуживание")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--dbname")
+    parser.add_argument("--user")
+    parser.add_argument("--sslmode", default="require")
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    try:
+        db = _connect(args)
+        if not args.maintenance:
+            run_steps(db, MIGRATIONS)
+        run_steps(db, MAINTENANCE)
+    except Exception as e:
+        print(f"❌ Ошибка: {e}")
+        return 1
+    print("✅ Готово")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
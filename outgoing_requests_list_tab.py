@@ -3,22 +3,31 @@ from PyQt6.QtWidgets import (
     QLabel, QLineEdit, QHeaderView, QMessageBox, QMenu, QGridLayout
 )
 from PyQt6.QtCore import Qt, QPoint
-from PyQt6.QtSql import QSqlQueryModel, QSqlQuery
+from PyQt6.QtSql import QSqlQuery
 from PyQt6.QtGui import QFont, QAction
+from krd_aggregate import CardTableModel, KrdCard
 from request_filter_proxy import RequestFilterProxyModel
 from request_details_dialog import RequestDetailsDialog
 
 class OutgoingRequestsListTab(QWidget):
-    def __init__(self, krd_id, db_connection, audit_logger=None, parent=None):
+    # (ключ строки карточки, заголовок колонки); порядок колонок использует RequestFilterProxyModel
+    COLUMNS = [
+        ('id', 'ID'), ('request_type', 'Тип запроса'), ('recipient', 'Адресат'), ('issue_date', 'Дата'),
+        ('issue_number', 'Номер'), ('response_status', 'Статус ответа'), ('response_number', 'Номер ответа'),
+    ]
+
+    def __init__(self, krd_id, db_connection, audit_logger=None, parent=None, card=None):
         super().__init__(parent)
         self.krd_id = krd_id
         self.db = db_connection
         self.audit_logger = audit_logger
-        self.source_model = QSqlQueryModel()
+        self.card = card or KrdCard(db_connection, krd_id)
+        self.card.changed.connect(self._on_card_changed)
+        self.source_model = CardTableModel(self.COLUMNS)
         self.proxy_model = RequestFilterProxyModel()
         self.proxy_model.setSourceModel(self.source_model)
         self.init_ui()
-        self.load_requests()
+        self.source_model.set_rows(self.card.get('outgoing_requests'))
 
     def init_ui(self):
         layout = QVBoxLayout(self)
@@ -65,23 +74,12 @@ class OutgoingRequestsListTab(QWidget):
         layout.addLayout(btn_layout)
 
     def load_requests(self):
-        # ✅ ДОБАВЛЕНО: o.response_number как 7-я колонка (индекс 6)
-        sql = """
-            SELECT o.id as "ID", rt.name as "Тип запроса", COALESCE(r.name, 'Не указан') as "Адресат",
-                   o.issue_date as "Дата", o.issue_number as "Номер", o.response_status as "Статус ответа",
-                   COALESCE(o.response_number, '') as "Номер ответа"
-            FROM krd.outgoing_requests o
-            LEFT JOIN krd.request_types rt ON o.request_type_id = rt.id
-            LEFT JOIN krd.recipients r ON o.recipient_id = r.id
-            WHERE o.krd_id = :krd_id AND o.is_deleted = FALSE
-            ORDER BY o.issue_date DESC, o.id DESC
-        """
-        q = QSqlQuery(self.db)
-        q.prepare(sql); q.bindValue(":krd_id", self.krd_id)
-        if q.exec():
-            self.source_model.setQuery(q)
-        else:
-            print(f"⚠️ Ошибка load_requests: {q.lastError().text()}")
+        """Перечитывает список запросов карточки из базы"""
+        self.card.refresh('outgoing_requests')
+
+    def _on_card_changed(self, part):
+        if part == 'outgoing_requests':
+            self.source_model.set_rows(self.card.get('outgoing_requests'))
 
     def _get_source_id(self, proxy_index):
         source_idx = self.proxy_model.mapToSource(proxy_index)
@@ -6,28 +6,31 @@
 """
 from PyQt6.QtWidgets import QTabWidget
 from document_generator_tab import DocumentGeneratorTab
+from krd_aggregate import KrdCard
 from outgoing_requests_list_tab import OutgoingRequestsListTab
 from ui_helpers import is_reader  # 🔒 Импорт функции проверки роли
 
 class OutgoingRequestsTab(QTabWidget):
     """Главный контейнер вкладки запросов."""
     
-    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None):
+    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None, card=None):
         super().__init__()
         self.krd_id = krd_id
         self.db = db_connection
         self.audit_logger = audit_logger
         self.user_info = user_info or {}  # ✅ Сохраняем данные пользователя
+        # Данные карточки — общие для списка и генератора
+        self.card = card or KrdCard(db_connection, krd_id)
         
         # 1. Список запросов (история) — доступен всем (в режиме чтения кнопки удаляются внутри list_tab)
         # Передаем self как parent, чтобы list_tab мог при необходимости получить доступ к user_info
-        self.list_tab = OutgoingRequestsListTab(self.krd_id, self.db, self.audit_logger, self)
+        self.list_tab = OutgoingRequestsListTab(self.krd_id, self.db, self.audit_logger, self, card=self.card)
         self.addTab(self.list_tab, "📋 Список запросов")
         
         # 🔒 2. Генерация документов — только для НЕ читателей
         if not is_reader(self.user_info):
             # Создаем вкладку генерации
-            self.generator_tab = DocumentGeneratorTab(self.krd_id, self.db, self.audit_logger)
+            self.generator_tab = DocumentGeneratorTab(self.krd_id, self.db, self.audit_logger, card=self.card)
             
             # Вставляем вкладку генерации ПЕРЕД списком (индекс 0), чтобы она была первой
             self.insertTab(0, self.generator_tab, "📄 Генерация запросов")
@@ -0,0 +1,355 @@
+"""
+Фотографии военнослужащего (krd.social_data.photo_*): миниатюры и загрузка оригиналов
+✅ ОПТИМИЗИРОВАНО: Карточка читает только хеши фото — BYTEA оригиналов (до 5 МБ) не передаются при открытии
+✅ ОПТИМИЗИРОВАНО: Миниатюры 180×240 хранятся в krd.photo_thumbnails по хешу содержимого и генерируются один раз
+✅ ОПТИМИЗИРОВАНО: Дисковый LRU-кэш миниатюр по хешу содержимого — повторное открытие карточки без запросов к БД
+✅ ДОБАВЛЕНО: PhotoLoadJob — миниатюры и оригиналы загружаются и масштабируются в рабочем потоке,
+   миниатюры только что сохраненных фото строятся там же
+✅ ОПТИМИЗИРОВАНО: Колонки хешей и таблицу миниатюр создает migrate_db.py, клиент при запуске только проверяет их
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+
+from PyQt6.QtCore import Qt, QObject, QThread, QBuffer, QByteArray, QIODevice, QStandardPaths, pyqtSignal
+from PyQt6.QtGui import QImage
+from PyQt6.QtSql import QSqlQuery
+
+from connection_pool import get_connection_pool
+
+
+PHOTO_TYPES = ['civilian', 'military_headgear', 'military_no_headgear', 'distinctive_marks']
+
+THUMBNAIL_WIDTH = 180
+THUMBNAIL_HEIGHT = 240
+THUMBNAIL_QUALITY = 85
+
+# Объем дискового кэша миниатюр (одна миниатюра — около 10-20 КБ)
+THUMBNAIL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Хеш считается на сервере при записи фото — любым клиентом, в т.ч. при откате версии
+_HASH_COLUMNS = [
+    f"""
+    ALTER TABLE krd.social_data ADD COLUMN IF NOT EXISTS photo_{pt}_hash text
+        GENERATED ALWAYS AS (CASE WHEN octet_length(photo_{pt}) > 0
+                                  THEN encode(sha256(photo_{pt}), 'hex') END) STORED
+    """
+    for pt in PHOTO_TYPES
+]
+
+_PHOTO_MIGRATION = _HASH_COLUMNS + [
+    """
+    CREATE TABLE IF NOT EXISTS krd.photo_thumbnails (
+        content_hash text PRIMARY KEY,
+        thumbnail bytea NOT NULL,
+        created_at timestamp NOT NULL DEFAULT now()
+    )
+    """,
+]
+
+# Состояние схемы для текущего сеанса (выставляется check_photo_storage)
+_photo_storage_ready = False
+
+_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def install_photo_storage(db):
+    """
+    Миграция (migrate_db.py): колонки хешей фото и таблица миниатюр.
+    Генерируемые колонки переписывают social_data (хеш каждого фото) — только вне работы клиентов.
+    """
+    for sql in _PHOTO_MIGRATION:
+        query = QSqlQuery(db)
+        if not query.exec(sql):
+            raise Exception(f"{query.lastError().text()}\n📝 SQL: {sql.strip()[:200]}")
+
+
+def check_photo_storage(db):
+    """Проверка при запуске клиента (без DDL): колонки хешей и таблица миниатюр на месте"""
+    global _photo_storage_ready
+    query = QSqlQuery(db)
+    query.prepare("""
+        SELECT
+            (SELECT count(*) FROM information_schema.columns
+             WHERE table_schema = 'krd' AND table_name = 'social_data'
+               AND column_name = ANY(CAST(:columns AS text[]))) = :column_count,
+            to_regclass('krd.photo_thumbnails') IS NOT NULL
+    """)
+    query.bindValue(":columns", "{" + ",".join(f"photo_{pt}_hash" for pt in PHOTO_TYPES) + "}")
+    query.bindValue(":column_count", len(PHOTO_TYPES))
+    if not query.exec() or not query.next():
+        print(f"⚠️ [PHOTO] Не удалось проверить хранилище миниатюр, фото загружаются целиком: "
+              f"{query.lastError().text()}")
+        _photo_storage_ready = False
+        return False
+    _photo_storage_ready = bool(query.value(0)) and bool(query.value(1))
+    if not _photo_storage_ready:
+        print("⚠️ [PHOTO] Хранилище миниатюр не создано, фото загружаются целиком — выполните migrate_db.py")
+    return _photo_storage_ready
+
+
+def photo_columns_sql():
+    """
+    Колонки метаданных фото для SELECT из krd.social_data:
+    has_photo_<тип> (octet_length не читает сами данные) и photo_<тип>_hash
+    """
+    columns = []
+    for pt in PHOTO_TYPES:
+        columns.append(f"COALESCE(octet_length(photo_{pt}) > 0, FALSE) AS has_photo_{pt}")
+        columns.append(f"photo_{pt}_hash" if _photo_storage_ready else f"NULL AS photo_{pt}_hash")
+    return ", ".join(columns)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_thumbnail(data):
+    """JPEG-миниатюра THUMBNAIL_WIDTH×THUMBNAIL_HEIGHT с сохранением пропорций (None — данные не изображение)"""
+    image = QImage.fromData(data)
+    if image.isNull():
+        return None
+    image = image.scaled(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio,
+                         Qt.TransformationMode.SmoothTransformation)
+    buffer_data = QByteArray()
+    buffer = QBuffer(buffer_data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "JPG", THUMBNAIL_QUALITY)
+    buffer.close()
+    return bytes(buffer_data)
+
+
+class ThumbnailCache:
+    """
+    Дисковый LRU-кэш миниатюр: файл <хеш>.jpg в каталоге кэша пользователя.
+    Порядок вытеснения — время последнего обращения (mtime файла), переживает перезапуск программы.
+    """
+    _instance = None
+
+    def __init__(self, directory, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()   # хеш → размер файла, от давно использованных к недавним
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+        entries = []
+        for name in os.listdir(directory):
+            key, ext = os.path.splitext(name)
+            if ext != ".jpg" or not _HASH_RE.match(key):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._total_bytes += size
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            base = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+            cls._instance = cls(os.path.join(base or tempfile.gettempdir(), "photo_thumbnails"))
+        return cls._instance
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.jpg")
+
+    def get(self, key):
+        if not key or not _HASH_RE.match(key):
+            return None
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                self._total_bytes -= self._sizes.pop(key)
+                return None
+            self._sizes.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if not key or not _HASH_RE.match(key) or not data:
+            return
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ [PHOTO] Миниатюра не записана в кэш: {e}")
+                return
+            self._total_bytes -= self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and len(self._sizes) > 1:
+                evicted, size = self._sizes.popitem(last=False)
+                self._total_bytes -= size
+                try:
+                    os.remove(self._path(evicted))
+                except OSError:
+                    pass
+
+
+def _fetch_thumbnails(db, hashes):
+    """{хеш: миниатюра} из krd.photo_thumbnails одним запросом"""
+    result = {}
+    if not _photo_storage_ready or not hashes:
+        return result
+    q = QSqlQuery(db)
+    q.setForwardOnly(True)
+    q.prepare("SELECT content_hash, thumbnail FROM krd.photo_thumbnails "
+              "WHERE content_hash = ANY(CAST(:hashes AS text[]))")
+    q.bindValue(":hashes", "{" + ",".join(hashes) + "}")
+    if not q.exec():
+        raise Exception(q.lastError().text())
+    while q.next():
+        result[q.value(0)] = bytes(q.value(1))
+    return result
+
+
+def _fetch_originals(db, krd_id, photo_types):
+    """{тип: байты оригинала} — только запрошенные колонки"""
+    columns = ", ".join(f"photo_{pt}" for pt in photo_types)
+    q = QSqlQuery(db)
+    q.setForwardOnly(True)
+    q.prepare(f"SELECT {columns} FROM krd.social_data WHERE krd_id = :krd_id ORDER BY id DESC LIMIT 1")
+    q.bindValue(":krd_id", krd_id)
+    if not q.exec():
+        raise Exception(q.lastError().text())
+    result = {}
+    if q.next():
+        for i, pt in enumerate(photo_types):
+            value = q.value(i)
+            if value:
+                result[pt] = bytes(value)
+    return result
+
+
+def _store_thumbnail(db, key, thumbnail):
+    if not _photo_storage_ready:
+        return
+    q = QSqlQuery(db)
+    q.prepare("INSERT INTO krd.photo_thumbnails (content_hash, thumbnail) VALUES (:hash, :thumbnail) "
+              "ON CONFLICT (content_hash) DO NOTHING")
+    q.bindValue(":hash", key)
+    q.bindValue(":thumbnail", QByteArray(thumbnail))
+    if not q.exec():
+        print(f"⚠️ [PHOTO] Миниатюра не сохранена: {q.lastError().text()}")
+
+
+class PhotoLoadWorker(QObject):
+    """
+    Загрузка фото одной КРД в рабочем потоке (подключение арендуется из пула).
+    Миниатюры: из krd.photo_thumbnails, недостающие — из оригиналов с записью в таблицу.
+    Оригиналы (full=True): только запрошенные колонки.
+    originals — только что сохраненные фото {тип: байты}: миниатюры строятся из них без чтения BYTEA из БД.
+    """
+    loaded = pyqtSignal(str, str, bytes)   # тип фото, хеш содержимого, данные
+    failed = pyqtSignal(str, str)          # тип фото, сообщение
+    done = pyqtSignal()
+
+    def __init__(self, krd_id, requests, full=False, originals=None):
+        super().__init__()
+        self.krd_id = krd_id
+        self.requests = requests           # {тип: ожидаемый хеш или None}
+        self.full = full
+        self.originals = originals or {}
+
+    def run(self):
+        pool = get_connection_pool()
+        try:
+            self._load(pool)
+        finally:
+            pool.close_thread_connections()
+            self.done.emit()
+
+    def _load(self, pool):
+        try:
+            db = pool.acquire()
+        except Exception as e:
+            for pt in self.requests:
+                self.failed.emit(pt, f"Не удалось получить подключение: {e}")
+            return
+        try:
+            if self.full:
+                self._load_originals(db)
+            else:
+                self._load_thumbnails(db)
+        except Exception as e:
+            for pt in self.requests:
+                self.failed.emit(pt, str(e))
+        finally:
+            pool.release(db)
+
+    def _load_originals(self, db):
+        originals = _fetch_originals(db, self.krd_id, list(self.requests))
+        for pt in self.requests:
+            if pt in originals:
+                self.loaded.emit(pt, content_hash(originals[pt]), originals[pt])
+            else:
+                self.failed.emit(pt, "Фото отсутствует")
+
+    def _load_thumbnails(self, db):
+        stored = _fetch_thumbnails(db, [h for h in self.requests.values() if h])
+        missing = []
+        for pt, key in self.requests.items():
+            if key in stored:
+                self.loaded.emit(pt, key, stored[key])
+            else:
+                missing.append(pt)
+        if not missing:
+            return
+
+        # Фото без миниатюры (только что сохранены, записаны до появления таблицы или другим клиентом):
+        # генерируем один раз
+        originals = {pt: self.originals[pt] for pt in missing if pt in self.originals}
+        to_fetch = [pt for pt in missing if pt not in originals]
+        if to_fetch:
+            originals.update(_fetch_originals(db, self.krd_id, to_fetch))
+        for pt in missing:
+            data = originals.get(pt)
+            thumbnail = make_thumbnail(data) if data else None
+            if thumbnail is None:
+                self.failed.emit(pt, "Ошибка загрузки")
+                continue
+            key = content_hash(data)
+            _store_thumbnail(db, key, thumbnail)
+            self.loaded.emit(pt, key, thumbnail)
+        print(f"🖼️ [PHOTO] КРД-{self.krd_id}: сгенерировано миниатюр: {len(missing)}")
+
+
+class PhotoLoadJob(QObject):
+    """
+    Задание загрузки фото: поток и рабочий объект. Задание держит ссылку на себя до завершения потока,
+    поэтому закрытие карточки не прерывает поток; результаты для удаленной вкладки не доставляются.
+    """
+    _running = set()
+
+    def __init__(self, krd_id, requests, full=False, originals=None):
+        super().__init__()
+        self.thread = QThread()
+        self.worker = PhotoLoadWorker(krd_id, requests, full, originals)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.run)
+        self.worker.done.connect(self.thread.quit)
+        self.thread.finished.connect(self._on_thread_finished)
+
+    def start(self):
+        PhotoLoadJob._running.add(self)
+        self.thread.start()
+
+    def _on_thread_finished(self):
+        PhotoLoadJob._running.discard(self)
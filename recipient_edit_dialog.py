@@ -7,6 +7,7 @@ from PyQt6.QtWidgets import (
     QPushButton, QHBoxLayout, QMessageBox, QWidget,QComboBox
 )
 from reference_editor_dialog import ReferenceEditorDialog
+from reference_cache import fill_reference_combo
 from PyQt6.QtSql import QSqlQuery
 
 class RecipientEditDialog(QDialog):
@@ -122,18 +123,7 @@ class RecipientEditDialog(QDialog):
             QMessageBox.critical(self, "Ошибка БД", f"Ошибка сохранения:\n{q.lastError().text()}")
     def load_request_types(self):
         """Загрузка справочника с сохранением текущего выбора"""
-        current_id = self.request_type_combo.currentData()
-        self.request_type_combo.clear()
-        self.request_type_combo.addItem("— Не выбрано —", None)
-        
-        q = QSqlQuery(self.db)
-        q.exec("SELECT id, name FROM krd.request_types ORDER BY name")
-        while q.next():
-            self.request_type_combo.addItem(q.value(1), q.value(0))
-            
-        if current_id is not None:
-            idx = self.request_type_combo.findData(current_id)
-            if idx >= 0: self.request_type_combo.setCurrentIndex(idx)
+        fill_reference_combo(self.request_type_combo, self.db, 'request_types', "— Не выбрано —")
 
     def open_type_editor(self):
         """Открывает редактор справочника и подписывается на изменения"""
@@ -246,7 +246,7 @@ class RecordViewDialog(QDialog):
                 updated_at,
                 deleted_at,
                 COALESCE(u.username, 'Неизвестно'),
-                LENGTH(template_data)
+                COALESCE((SELECT b.size FROM krd.blobs b WHERE b.hash = template_hash), LENGTH(template_data))
             FROM krd.document_templates
             LEFT JOIN krd.users u ON deleted_by = u.id
             WHERE id = ?
@@ -299,7 +299,7 @@ class RecordViewDialog(QDialog):
                 o.signed_by_position,
                 o.deleted_at,
                 COALESCE(u.username, 'Неизвестно'),
-                LENGTH(o.document_data)
+                COALESCE((SELECT b.size FROM krd.blobs b WHERE b.hash = o.document_hash), LENGTH(o.document_data))
             FROM krd.outgoing_requests o
             LEFT JOIN krd.request_types rt ON o.request_type_id = rt.id
             LEFT JOIN krd.recipients r ON o.recipient_id = r.id
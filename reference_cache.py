@@ -0,0 +1,181 @@
+"""
+Кэш справочников процесса (статусы, категории, звания, в/ч, гарнизоны, должности, типы запросов и инициаторов)
+✅ ОПТИМИЗИРОВАНО: ComboBox и меню заполняются из памяти, а не запросом при каждом открытии
+✅ ДОБАВЛЕНО: Счетчик версий справочника krd.reference_versions, который увеличивают триггеры на каждое изменение —
+   кэш сверяет версии всех справочников одним запросом не чаще раза в VERSION_CHECK_INTERVAL секунд
+✅ ДОБАВЛЕНО: Сброс одного справочника после правки в ReferenceEditorDialog (остальные остаются в памяти)
+"""
+import threading
+import time
+
+from PyQt6.QtSql import QSqlQuery
+
+
+# Справочник → колонка сортировки (статусы идут в порядке id, как в меню и карточке)
+CACHED_REFERENCES = {
+    'statuses': 'id',
+    'categories': 'name',
+    'ranks': 'name',
+    'military_units': 'name',
+    'garrisons': 'name',
+    'positions': 'name',
+    'request_types': 'name',
+    'initiator_types': 'name',
+}
+
+# Как долго (сек) версии с сервера считаются актуальными — чужие правки видны не позже этого срока
+VERSION_CHECK_INTERVAL = 5.0
+
+_VERSION_MIGRATION = [
+    """
+    CREATE TABLE IF NOT EXISTS krd.reference_versions (
+        table_name text PRIMARY KEY,
+        version bigint NOT NULL DEFAULT 0,
+        changed_at timestamp NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION krd.bump_reference_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO krd.reference_versions (table_name, version, changed_at) VALUES (TG_TABLE_NAME, 1, now())
+        ON CONFLICT (table_name) DO UPDATE
+            SET version = krd.reference_versions.version + 1, changed_at = now();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+] + [
+    # Триггер уровня оператора: одно увеличение версии на INSERT/UPDATE/DELETE/TRUNCATE
+    f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                       WHERE tgname = 'trg_{table}_reference_version' AND tgrelid = 'krd.{table}'::regclass) THEN
+            CREATE TRIGGER trg_{table}_reference_version
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON krd.{table}
+                FOR EACH STATEMENT EXECUTE FUNCTION krd.bump_reference_version();
+        END IF;
+    END $$
+    """
+    for table in CACHED_REFERENCES
+] + [
+    f"""
+    INSERT INTO krd.reference_versions (table_name) VALUES ('{table}')
+    ON CONFLICT (table_name) DO NOTHING
+    """
+    for table in CACHED_REFERENCES
+]
+
+# Счетчики версий созданы (выставляется ensure_reference_versions); без них кэш не используется
+_versions_ready = False
+
+
+def _exec(db, sql):
+    query = QSqlQuery(db)
+    if not query.exec(sql):
+        raise Exception(f"{query.lastError().text()}\n📝 SQL: {sql.strip()[:200]}")
+    return query
+
+
+def ensure_reference_versions(db):
+    """Таблица версий справочников и триггеры, увеличивающие версию при изменении"""
+    global _versions_ready
+    try:
+        for sql in _VERSION_MIGRATION:
+            _exec(db, sql)
+    except Exception as e:
+        print(f"⚠️ [REFS] Версии справочников не созданы, справочники читаются из БД без кэша: {e}")
+        return False
+    _versions_ready = True
+    return True
+
+
+class ReferenceCache:
+    """
+    Строки справочников [(id, name)] в памяти процесса.
+    Запись справочника действительна, пока его версия на сервере не изменилась.
+    """
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}          # таблица → (версия, строки)
+        self._versions = {}         # таблица → версия на сервере при последней сверке
+        self._checked_at = None     # time.monotonic() последней сверки версий
+
+    def rows(self, db, table):
+        """Строки справочника [(id, name)]; из памяти, если версия не изменилась"""
+        if table not in CACHED_REFERENCES or not _versions_ready:
+            return _load_rows(db, table) or []
+        with self._lock:
+            self._check_versions(db)
+            version = self._versions.get(table, 0)
+            entry = self._entries.get(table)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+        rows = _load_rows(db, table)
+        if rows is None:
+            return []
+        with self._lock:
+            self._entries[table] = (version, rows)
+        print(f"📚 [REFS] Справочник {table} загружен в кэш: {len(rows)} записей (версия {version})")
+        return rows
+
+    def invalidate(self, table):
+        """Сбрасывает один справочник (после его правки в этом процессе)"""
+        with self._lock:
+            self._entries.pop(table, None)
+            # Версия уже увеличена триггером — при следующем обращении сверяется заново
+            self._checked_at = None
+
+    def _check_versions(self, db):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        q = QSqlQuery(db)
+        if not q.exec("SELECT table_name, version FROM krd.reference_versions"):
+            # Версии неизвестны — записи кэша не подтверждаются
+            print(f"⚠️ [REFS] Ошибка чтения версий справочников: {q.lastError().text()}")
+            self._entries.clear()
+            return
+        versions = {}
+        while q.next():
+            versions[q.value(0)] = q.value(1)
+        self._versions = versions
+        self._checked_at = now
+
+
+def _load_rows(db, table):
+    """[(id, name)] из базы; None при ошибке (не кэшируется)"""
+    order = CACHED_REFERENCES.get(table, 'name')
+    q = QSqlQuery(db)
+    if not q.exec(f"SELECT id, name FROM krd.{table} ORDER BY {order}"):
+        print(f"⚠️ [REFS] Ошибка загрузки справочника {table}: {q.lastError().text()}")
+        return None
+    rows = []
+    while q.next():
+        rows.append((q.value(0), q.value(1)))
+    return rows
+
+
+def reference_rows(db, table):
+    return ReferenceCache.instance().rows(db, table)
+
+
+def fill_reference_combo(combo, db, table, placeholder=""):
+    """Заполняет ComboBox справочником из кэша с сохранением текущего выбора"""
+    current_id = combo.currentData()
+    combo.clear()
+    combo.addItem(placeholder, None)
+    for ref_id, name in reference_rows(db, table):
+        combo.addItem(name, ref_id)
+    if current_id is not None:
+        idx = combo.findData(current_id)
+        if idx >= 0:
+            combo.setCurrentIndex(idx)
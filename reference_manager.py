@@ -1,12 +1,15 @@
 """
 Универсальный менеджер для работы со справочниками
 Поддерживает все справочники из схемы БД
+✅ ОПТИМИЗИРОВАНО: Данные для ComboBox — из кэша справочников; изменение сбрасывает в кэше только свою таблицу
 """
 from PyQt6.QtSql import QSqlQuery, QSqlQueryModel
 from PyQt6.QtWidgets import QMessageBox
 from typing import Dict, List, Optional, Tuple
 import traceback
 
+from reference_cache import CACHED_REFERENCES, ReferenceCache, reference_rows
+
 
 # === КОНФИГУРАЦИЯ СПРАВОЧНИКОВ ===
 REFERENCE_TABLES = {
@@ -148,7 +151,9 @@ class ReferenceManager:
         q.prepare(sql)
         for k, v in data.items(): q.bindValue(f":{k}", v)
 
-        if q.exec() and q.next(): return True, q.value(0)
+        if q.exec() and q.next():
+            ReferenceCache.instance().invalidate(table_name)
+            return True, q.value(0)
         return False, 0
 
     # ✅ ИСПРАВЛЕНО: добавлено имя параметра `data:`
@@ -170,7 +175,10 @@ class ReferenceManager:
         for k, v in valid_data.items(): q.bindValue(f":{k}", v)
         q.bindValue(":id", record_id)
 
-        return q.exec() and q.numRowsAffected() > 0
+        if q.exec() and q.numRowsAffected() > 0:
+            ReferenceCache.instance().invalidate(table_name)
+            return True
+        return False
 
     def delete_record(self, table_name: str, record_id: int, soft_delete: bool = True) -> bool:
         has_soft = self._has_soft_delete(table_name)
@@ -182,7 +190,10 @@ class ReferenceManager:
         q = QSqlQuery(self.db)
         q.prepare(sql)
         q.bindValue(":id", record_id)
-        return q.exec() and q.numRowsAffected() > 0
+        if q.exec() and q.numRowsAffected() > 0:
+            ReferenceCache.instance().invalidate(table_name)
+            return True
+        return False
 
     def get_record(self, table_name: str, record_id: int) -> Optional[Dict]:
         config = self.get_table_config(table_name)
@@ -198,6 +209,8 @@ class ReferenceManager:
     def get_combo_data(self, table_name: str) -> List[Tuple[int, str]]:
         config = self.get_table_config(table_name)
         if not config: return []
+        if table_name in CACHED_REFERENCES:
+            return reference_rows(self.db, table_name)
         try:
             has_soft = self._has_soft_delete(table_name)
             where = "WHERE is_deleted = FALSE" if has_soft else ""
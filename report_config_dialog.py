@@ -4,11 +4,12 @@
 ✅ ИСПРАВЛЕНО: Экспорт выполняется ПРЯМО ЗДЕСЬ, без передачи сигналов в MainWindow.
 ✅ ИСПРАВЛЕНО: QMessageBox.StandardButton для PyQt6
 ✅ ИСПРАВЛЕНО: Унифицированы все SQL-запросы на именованные параметры (:name)
+✅ ОПТИМИЗИРОВАНО: Экспорт выполняется в фоновом потоке (ReportExportJob) с прогрессом и отменой
 """
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QGroupBox,
     QPushButton, QListWidget, QListWidgetItem, QLabel,
-    QMessageBox, QFileDialog, QProgressDialog, QApplication
+    QMessageBox, QFileDialog
 )
 from PyQt6.QtCore import Qt, pyqtSignal, QDate
 from PyQt6.QtGui import QFont
@@ -17,7 +18,7 @@ import json
 import traceback
 
 from field_selection_dialog import FieldSelectionDialog
-from export_helper import KrdExcelExporter  # ✅ Импортируем экспортер
+from report_export_worker import ReportExportJob
 from ui_helpers import BaseDialog
 
 
@@ -332,33 +333,18 @@ class ReportConfigDialog(BaseDialog):
             q.bindValue(":id", self.current_template_id)
             q.exec()
             
-        # 3. Запускаем экспорт ПРЯМО ЗДЕСЬ
+        # 3. Запускаем экспорт в фоновом потоке: главное окно остается доступным
         try:
-            print("⏳ [DEBUG] Показываю индикатор прогресса...")
-            progress_msg = QProgressDialog("Генерация отчета...\nПожалуйста, подождите.", "Отмена", 0, 0, self)
-            progress_msg.setWindowTitle("Генерация отчета")
-            progress_msg.setWindowModality(Qt.WindowModality.WindowModal)
-            progress_msg.show()
-            QApplication.processEvents() # ✅ Критически важно для отрисовки прогресс-бара
+            print("🔄 [DEBUG] Запускаю фоновый экспорт...")
+            job = ReportExportJob(config, krd_ids, file_path,
+                                  parent=self.parentWidget() or self, audit_logger=self.audit_logger)
+            job.start()
             
-            print("🔄 [DEBUG] Запускаю KrdExcelExporter...")
-            exporter = KrdExcelExporter(self.db, report_config=config)
-            exporter.export_multiple_krd_to_excel(file_path, krd_ids)
-            
-            progress_msg.close()
-            
-            # 4. Логируем действие (если логгер передан)
-            if self.audit_logger:
-                self.audit_logger.log_action('REPORT_EXPORT', 'krd', description=f'Экспорт {len(krd_ids)} КРД')
-                
-            QMessageBox.information(self, "Успешно", f"✅ Отчеты сохранены:\n📊 КРД: {len(krd_ids)}\n📁 {file_path}")
-            
-            # 5. Закрываем диалог ТОЛЬКО после успешного экспорта
-            print("🟢 [DEBUG] Экспорт завершен, закрываю диалог (accept)...")
+            # 4. Закрываем диалог: ход экспорта показывает окно прогресса задания
+            print("🟢 [DEBUG] Экспорт запущен, закрываю диалог (accept)...")
             self.accept()
             
         except Exception as e:
-            progress_msg.close()
             print(f"❌ [DEBUG] КРИТИЧЕСКАЯ ОШИБКА экспорта: {e}")
             traceback.print_exc()
             QMessageBox.critical(self, "Ошибка", f"❌ Ошибка генерации:\n{str(e)}")
@@ -0,0 +1,47 @@
+"""
+Фоновый экспорт отчета по КРД
+✅ ДОБАВЛЕНО: ReportExportJob — экспорт в отдельном QThread со своим подключением к БД (background_job),
+   немодальный прогресс (КРД, строки, КРД/с, оставшееся время) и отмена
+✅ ДОБАВЛЕНО: При отмене недописанный файл удаляется, главное окно остается доступным
+"""
+from PyQt6.QtWidgets import QMessageBox
+
+from background_job import ProgressDialogJob
+from export_helper import KrdExcelExporter, ExportCancelled
+
+
+class ReportExportJob(ProgressDialogJob):
+    """Задание экспорта в GUI-потоке. Живет независимо от диалога настройки отчета"""
+    window_title = "Генерация отчета"
+    start_text = "Подготовка отчета..."
+    cancel_text = "⏳ Отмена экспорта..."
+    error_text = "Ошибка генерации"
+
+    def __init__(self, report_config, krd_ids, file_path, parent=None, audit_logger=None):
+        self.audit_logger = audit_logger
+        self.krd_count = len(krd_ids)
+        self.file_path = file_path
+
+        def task(db, report, cancel_check):
+            exporter = KrdExcelExporter(db, report_config=report_config)
+            exporter.export_multiple_krd_to_excel(file_path, krd_ids, progress_callback=report,
+                                                  cancel_check=cancel_check)
+
+        super().__init__(task, parent, cancel_exceptions=(ExportCancelled,), detached=True,
+                         maximum=self.krd_count)
+
+    def progress_text(self, done, total, extra, elapsed):
+        rows = extra[0] if extra else 0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 else 0.0
+        return (f"📊 КРД: {done} из {total}   📝 Строк: {rows}\n"
+                f"⚡ {rate:.1f} КРД/с   ⏱️ Осталось: ~{int(eta)} с")
+
+    def on_finished(self, result):
+        if self.audit_logger:
+            self.audit_logger.log_action('REPORT_EXPORT', 'krd', description=f'Экспорт {self.krd_count} КРД')
+        QMessageBox.information(self.parent_widget, "Успешно",
+                                f"✅ Отчеты сохранены:\n📊 КРД: {self.krd_count}\n📁 {self.file_path}")
+
+    def on_cancelled(self):
+        print("⚠️ [EXPORT] Экспорт отменен, файл не сохранен")
@@ -5,9 +5,11 @@ from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QGroupBox, QFormLayout, QHBoxLayout,
     QLabel, QPushButton, QDateEdit, QLineEdit, QMessageBox, QFileDialog
 )
-from PyQt6.QtCore import Qt, QByteArray
+from PyQt6.QtCore import Qt
 from PyQt6.QtSql import QSqlQuery
 
+from blob_store import put_blob, write_blob_to_file
+
 class RequestDetailsDialog(QDialog):
     def __init__(self, db, request_id, audit_logger=None, parent=None):
         super().__init__(parent)
@@ -41,12 +43,12 @@ class RequestDetailsDialog(QDialog):
         g_files = QGroupBox("Работа с файлами")
         f_files = QHBoxLayout()
         self.btn_dl_req = QPushButton("📥 Выгрузить запрос (.docx)")
-        self.btn_dl_req.clicked.connect(lambda: self._download_file("document_data", f"Запрос_{self.lbl_number.text()}.docx"))
+        self.btn_dl_req.clicked.connect(lambda: self._download_file("document", f"Запрос_{self.lbl_number.text()}.docx"))
         f_files.addWidget(self.btn_dl_req)
         self.btn_dl_resp = QPushButton("📥 Выгрузить ответ")
         self.btn_dl_resp.setEnabled(False)
         self.btn_dl_resp.setToolTip("Ответ еще не загружен в систему")
-        self.btn_dl_resp.clicked.connect(lambda: self._download_file("response_data", f"Ответ_на_{self.lbl_number.text()}.docx"))
+        self.btn_dl_resp.clicked.connect(lambda: self._download_file("response", f"Ответ_на_{self.lbl_number.text()}.docx"))
         f_files.addWidget(self.btn_dl_resp)
         g_files.setLayout(f_files)
         layout.addWidget(g_files)
@@ -83,7 +85,7 @@ class RequestDetailsDialog(QDialog):
         q = QSqlQuery(self.db)
         q.prepare("""
             SELECT rt.name, COALESCE(r.name, ''), o.issue_date, o.issue_number, o.response_status,
-            o.response_date, o.response_number, o.response_data
+            o.response_date, o.response_number, (o.response_hash IS NOT NULL OR o.response_data IS NOT NULL)
             FROM krd.outgoing_requests o
             LEFT JOIN krd.request_types rt ON o.request_type_id = rt.id
             LEFT JOIN krd.recipients r ON o.recipient_id = r.id
@@ -101,9 +103,8 @@ class RequestDetailsDialog(QDialog):
             if q.value(5): self.input_date.setDate(q.value(5))
             if q.value(6): self.input_num.setText(q.value(6) or "")
             
-            # Активируем кнопку выгрузки если файл есть
-            response_data = q.value(7)
-            if response_data is not None and (isinstance(response_data, bytes) or hasattr(response_data, 'data')):
+            # Активируем кнопку выгрузки если файл есть (сам файл не читается)
+            if q.value(7):
                 self.btn_dl_resp.setEnabled(True)
                 self.btn_dl_resp.setToolTip("Нажмите, чтобы сохранить ответ на диск")
             else:
@@ -130,22 +131,25 @@ class RequestDetailsDialog(QDialog):
         else:
             QMessageBox.critical(self, "Ошибка БД", q.lastError().text())
 
-    def _download_file(self, column, default_name):
+    def _download_file(self, kind, default_name):
+        """kind: document | response — файл в хранилище (по хешу) или в еще не перенесенной колонке"""
         q = QSqlQuery(self.db)
-        q.prepare(f"SELECT {column} FROM krd.outgoing_requests WHERE id = :id")
+        q.prepare(f"""
+            SELECT {kind}_hash, CASE WHEN {kind}_hash IS NULL THEN {kind}_data END
+            FROM krd.outgoing_requests WHERE id = :id
+        """)
         q.bindValue(":id", self.request_id)
-        if not q.exec() or not q.next() or q.value(0) is None:
+        if not q.exec() or not q.next() or (not q.value(0) and q.value(1) is None):
             return QMessageBox.information(self, "Информация", "Файл отсутствует в базе данных.")
-        raw_data = q.value(0)
-        try:
-            file_bytes = bytes(raw_data.data()) if hasattr(raw_data, 'data') else bytes(raw_data)
-        except Exception as e:
-            return QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать данные файла: {e}")
+        blob_key, raw_data = q.value(0), q.value(1)
         path, _ = QFileDialog.getSaveFileName(self, "Сохранить файл", default_name, "Все файлы (*)")
         if path:
             try:
-                with open(path, 'wb') as f:
-                    f.write(file_bytes)
+                if blob_key:
+                    write_blob_to_file(self.db, blob_key, path)
+                else:
+                    with open(path, 'wb') as f:
+                        f.write(bytes(raw_data))
                 self._open_file_with_os(path)
                 QMessageBox.information(self, "Успех", f"✅ Файл сохранён и открыт:\n{path}")
             except Exception as e:
@@ -168,13 +172,16 @@ class RequestDetailsDialog(QDialog):
         if not file_path: return
         try:
             with open(file_path, 'rb') as f: data = f.read()
+            # Уже загруженный ранее файл повторно не передается
+            blob_key = put_blob(self.db, data)
             q = QSqlQuery(self.db)
             q.prepare("""
                 UPDATE krd.outgoing_requests
-                SET response_data = :data, response_date = :date, response_number = :num, response_status = 'Получен'
+                SET response_hash = :hash, response_data = NULL, response_date = :date, response_number = :num,
+                    response_status = 'Получен'
                 WHERE id = :id
             """)
-            q.bindValue(":data", QByteArray(data))
+            q.bindValue(":hash", blob_key)
             q.bindValue(":date", self.input_date.date())
             q.bindValue(":num", self.input_num.text().strip())
             q.bindValue(":id", self.request_id)
@@ -2,10 +2,18 @@
 import sys
 import os
 import logging
+import multiprocessing
 from PyQt6.QtWidgets import QApplication, QMessageBox
 from PyQt6.QtGui import QIcon
 from config_manager import ConfigManager
 from db_connector import DatabaseConnector
+from connection_pool import init_connection_pool
+from audit_partitions import check_audit_partitioning
+from krd_version_manager import ensure_version_storage
+from krd_search import check_search_schema
+from photo_store import check_photo_storage
+from blob_store import check_blob_storage
+from reference_cache import ensure_reference_versions
 from login_window import LoginWindow
 from main_window import MainWindow
 from setup_dialog import SetupDialog
@@ -83,6 +91,21 @@ def main():
                 sys.exit(1)
 
         db = connector.get_connection()
+        # Фоновые задачи арендуют собственные подключения из пула
+        pool = init_connection_pool(connector)
+        app.aboutToQuit.connect(pool.close_thread_connections)
+        # Схему меняет только migrate_db.py (администратор); здесь — проверки без DDL
+        check_audit_partitioning(db)
+        # Хранение версий КРД дельтами
+        ensure_version_storage(db)
+        # Колонки и индексы поиска КРД (есть ли), порог похожести для основного подключения
+        check_search_schema(db)
+        # Хеши фото и таблица миниатюр (есть ли)
+        check_photo_storage(db)
+        # Хранилище файлов по хешу (создано ли)
+        check_blob_storage(db)
+        # Счетчики версий справочников для кэша справочников
+        ensure_reference_versions(db)
         login_window = LoginWindow(db)
 
         #  === ИКОНКА ДЛЯ ОКНА АВТОРИЗАЦИИ ===
@@ -129,4 +152,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Нужно для пула процессов пакетной генерации в собранном .exe (Windows, spawn)
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
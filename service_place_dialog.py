@@ -13,6 +13,7 @@ from PyQt6.QtGui import QFont, QRegularExpressionValidator
 from PyQt6.QtCore import QRegularExpression, Qt
 from autocomplete_helper import AutocompleteHelper
 from reference_editor_dialog import ReferenceEditorDialog
+from reference_cache import fill_reference_combo
 
 
 class ServicePlaceDialog(QDialog):
@@ -262,40 +263,13 @@ class ServicePlaceDialog(QDialog):
         self.postal_letter_input.setValidator(QRegularExpressionValidator(letter_regex))
 
     def load_military_units(self):
-        current_id = self.military_unit_combo.currentData()
-        self.military_unit_combo.clear()
-        self.military_unit_combo.addItem("", None)
-        query = QSqlQuery(self.db)
-        query.exec("SELECT id, name FROM krd.military_units ORDER BY name")
-        while query.next():
-            self.military_unit_combo.addItem(query.value(1), query.value(0))
-        if current_id is not None:
-            idx = self.military_unit_combo.findData(current_id)
-            if idx >= 0: self.military_unit_combo.setCurrentIndex(idx)
+        fill_reference_combo(self.military_unit_combo, self.db, 'military_units')
 
     def load_garrisons(self):
-        current_id = self.garrison_combo.currentData()
-        self.garrison_combo.clear()
-        self.garrison_combo.addItem("", None)
-        query = QSqlQuery(self.db)
-        query.exec("SELECT id, name FROM krd.garrisons ORDER BY name")
-        while query.next():
-            self.garrison_combo.addItem(query.value(1), query.value(0))
-        if current_id is not None:
-            idx = self.garrison_combo.findData(current_id)
-            if idx >= 0: self.garrison_combo.setCurrentIndex(idx)
+        fill_reference_combo(self.garrison_combo, self.db, 'garrisons')
 
     def load_positions(self):
-        current_id = self.position_combo.currentData()
-        self.position_combo.clear()
-        self.position_combo.addItem("", None)
-        query = QSqlQuery(self.db)
-        query.exec("SELECT id, name FROM krd.positions ORDER BY name")
-        while query.next():
-            self.position_combo.addItem(query.value(1), query.value(0))
-        if current_id is not None:
-            idx = self.position_combo.findData(current_id)
-            if idx >= 0: self.position_combo.setCurrentIndex(idx)
+        fill_reference_combo(self.position_combo, self.db, 'positions')
 
     def setup_autocomplete_fields(self):
         """Настройка автодополнения"""
@@ -427,7 +401,7 @@ class ServicePlaceDialog(QDialog):
                 raise Exception(f"Ошибка SQL: {query.lastError().text()}")
             
             self.db.commit()
-            self.autocomplete_helper.clear_cache()
+            self.autocomplete_helper.add_saved_values(data)
             QMessageBox.information(self, "Успех", "Место службы успешно сохранено")
             super().accept()
         except Exception as e:
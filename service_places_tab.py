@@ -10,27 +10,38 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QTableView, QMessageBox, QHeaderView, QAbstractItemView
 )
-from PyQt6.QtSql import QSqlQuery, QSqlQueryModel
+from PyQt6.QtSql import QSqlQuery
 from PyQt6.QtCore import Qt, pyqtSignal 
 from PyQt6.QtGui import QFont
 
+from krd_aggregate import CardTableModel, KrdCard
 from service_place_dialog import ServicePlaceDialog
 from ui_helpers import is_reader  # 🔒 Импорт проверки роли
 
 class ServicePlacesTab(QWidget):
     """Вкладка мест службы"""
     data_changed = pyqtSignal() 
+
+    # (ключ строки карточки, заголовок колонки)
+    COLUMNS = [
+        ('id', 'ID'), ('place_name', 'Место службы'), ('military_unit_number', 'Номер в/ч'),
+        ('military_unit_name', 'Военное управление'), ('garrison_name', 'Гарнизон'),
+        ('position_name', 'Должность'), ('place_contacts', 'Контакты'),
+    ]
     
-    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None):
+    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None, card=None):
         super().__init__()
         self.krd_id = krd_id
         self.db = db_connection
         self.audit_logger = audit_logger
         self.user_info = user_info or {}
         self.is_read_only = is_reader(self.user_info)  # 🔒 Флаг режима чтения
+        # Данные карточки (общие для всех вкладок окна)
+        self.card = card or KrdCard(db_connection, krd_id)
+        self.card.changed.connect(self._on_card_changed)
         
         self.init_ui()
-        self.load_data()
+        self._show_rows()
     
     def init_ui(self):
         """Инициализация интерфейса"""
@@ -46,7 +57,7 @@ class ServicePlacesTab(QWidget):
         layout.addWidget(title_label)
         
         # Таблица мест службы
-        self.places_model = QSqlQueryModel()
+        self.places_model = CardTableModel(self.COLUMNS)
         self.places_table = QTableView()
         self.places_table.setModel(self.places_model)
         self.places_table.setAlternatingRowColors(True)
@@ -92,26 +103,15 @@ class ServicePlacesTab(QWidget):
         layout.addLayout(button_layout)
     
     def load_data(self):
-        query = QSqlQuery(self.db)
-        query.prepare("""
-            SELECT
-            s.id,
-            s.place_name as "Место службы",
-            COALESCE(s.military_unit_number, '—') as "Номер в/ч",
-            m.name as "Военное управление",
-            g.name as "Гарнизон",
-            p.name as "Должность",
-            s.place_contacts as "Контакты"
-            FROM krd.service_places s
-            LEFT JOIN krd.military_units m ON s.military_unit_id = m.id
-            LEFT JOIN krd.garrisons g ON s.garrison_id = g.id
-            LEFT JOIN krd.positions p ON s.position_id = p.id
-            WHERE s.krd_id = ?
-            ORDER BY s.id DESC
-        """)
-        query.addBindValue(self.krd_id)
-        query.exec()
-        self.places_model.setQuery(query)
+        """Перечитывает места службы карточки из базы"""
+        self.card.refresh('service_places')
+
+    def _on_card_changed(self, part):
+        if part == 'service_places':
+            self._show_rows()
+
+    def _show_rows(self):
+        self.places_model.set_rows(self.card.get('service_places'))
         self.places_table.setColumnHidden(0, True)
     
     def on_add_place(self):
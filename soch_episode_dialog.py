@@ -447,7 +447,7 @@ class SochEpisodeDialog(QDialog):
             self.db.commit()
             
             # === ОБНОВЛЕНИЕ КЭША АВТОДОПОЛНЕНИЯ ПОСЛЕ СОХРАНЕНИЯ ===
-            self.autocomplete_helper.clear_cache()
+            self.autocomplete_helper.add_saved_values(data)
             
             QMessageBox.information(self, "Успех", "Эпизод СОЧ успешно " + ("обновлён" if self.is_edit else "добавлен"))
             super().accept()
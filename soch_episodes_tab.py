@@ -8,28 +8,39 @@ from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QTableView, QMessageBox, QHeaderView, QAbstractItemView
 )
-from PyQt6.QtSql import QSqlQuery, QSqlQueryModel
-from PyQt6.QtCore import Qt, pyqtSignal 
+from PyQt6.QtSql import QSqlQuery
+from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtGui import QFont
 
+from krd_aggregate import CardTableModel, KrdCard
 from soch_episode_dialog import SochEpisodeDialog
 from ui_helpers import is_reader  # 🔒 Импорт проверки роли
 
 class SochEpisodesTab(QWidget):
     """Вкладка сведений о СОЧ"""
     data_changed = pyqtSignal() 
+
+    # (ключ строки карточки, заголовок колонки)
+    COLUMNS = [
+        ('id', 'ID'), ('soch_date', 'Дата СОЧ'), ('soch_location', 'Место СОЧ'),
+        ('order_date_number', 'Приказ'), ('found_by', 'Кем разыскан'), ('search_date', 'Дата розыска'),
+        ('notification_number', 'Уведомление'),
+    ]
     
     # ✅ Добавляем параметр user_info
-    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None):
+    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None, card=None):
         super().__init__()
         self.krd_id = krd_id
         self.db = db_connection
         self.audit_logger = audit_logger
         self.user_info = user_info or {}
         self.is_read_only = is_reader(self.user_info)  # 🔒 Флаг режима чтения
+        # Данные карточки (общие для всех вкладок окна)
+        self.card = card or KrdCard(db_connection, krd_id)
+        self.card.changed.connect(self._on_card_changed)
         
         self.init_ui()
-        self.load_data()
+        self._show_rows()
     
     def init_ui(self):
         """Инициализация интерфейса"""
@@ -47,7 +58,7 @@ class SochEpisodesTab(QWidget):
         layout.addWidget(title_label)
         
         # Таблица эпизодов
-        self.episodes_model = QSqlQueryModel()
+        self.episodes_model = CardTableModel(self.COLUMNS)
         self.episodes_table = QTableView()
         self.episodes_table.setModel(self.episodes_model)
         self.episodes_table.setAlternatingRowColors(True)
@@ -103,27 +114,16 @@ class SochEpisodesTab(QWidget):
         self.delete_btn.setEnabled(has_selection)
     
     def load_data(self):
-        """Загрузка данных из базы (с фильтром мягкого удаления)"""
-        query = QSqlQuery(self.db)
-        query.prepare("""
-            SELECT 
-                id,
-                soch_date as "Дата СОЧ",
-                soch_location as "Место СОЧ",
-                order_date_number as "Приказ",
-                found_by as "Кем разыскан",
-                search_date as "Дата розыска",
-                notification_number as "Уведомление"
-            FROM krd.soch_episodes
-            WHERE krd_id = ? AND (is_deleted = FALSE OR is_deleted IS NULL)
-            ORDER BY soch_date DESC
-        """)
-        query.addBindValue(self.krd_id)
-        query.exec()
-        self.episodes_model.setQuery(query)
-        
+        """Перечитывает эпизоды карточки из базы (удаленные в карточку не попадают)"""
+        self.card.refresh('soch_episodes')
+
+    def _on_card_changed(self, part):
+        if part == 'soch_episodes':
+            self._show_rows()
+
+    def _show_rows(self):
+        self.episodes_model.set_rows(self.card.get('soch_episodes'))
         # Скрыть ID колонку
-        self.episodes_model.setHeaderData(0, Qt.Orientation.Horizontal, "ID")
         self.episodes_table.setColumnHidden(0, True)
     
     def on_add_episode(self):
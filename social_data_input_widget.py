@@ -5,12 +5,12 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QDate, QByteArray, QRegularExpression
 from PyQt6.QtGui import QFont, QPixmap, QRegularExpressionValidator
-from PyQt6.QtSql import QSqlQuery
 import os
 import traceback
 
 from autocomplete_helper import AutocompleteHelper
 from reference_editor_dialog import ReferenceEditorDialog
+from reference_cache import fill_reference_combo
 
 class SocialDataInputWidget(QWidget):
     """Виджет ввода социально-демографических данных для создания КРД (с автообновлением справочников)"""
@@ -236,27 +236,11 @@ class SocialDataInputWidget(QWidget):
             QMessageBox.warning(self, "Ошибка", f"Не удалось открыть справочник: {str(e)}")
     def load_categories(self):
         """Загрузка категорий с сохранением текущего выбора"""
-        current_id = self.category_combo.currentData()
-        self.category_combo.clear()
-        self.category_combo.addItem("", None)
-        q = QSqlQuery(self.db)
-        q.exec("SELECT id, name FROM krd.categories ORDER BY name")
-        while q.next(): self.category_combo.addItem(q.value(1), q.value(0))
-        if current_id is not None:
-            idx = self.category_combo.findData(current_id)
-            if idx >= 0: self.category_combo.setCurrentIndex(idx)
+        fill_reference_combo(self.category_combo, self.db, 'categories')
 
     def load_ranks(self):
         """Загрузка званий с сохранением текущего выбора"""
-        current_id = self.rank_combo.currentData()
-        self.rank_combo.clear()
-        self.rank_combo.addItem("", None)
-        q = QSqlQuery(self.db)
-        q.exec("SELECT id, name FROM krd.ranks ORDER BY name")
-        while q.next(): self.rank_combo.addItem(q.value(1), q.value(0))
-        if current_id is not None:
-            idx = self.rank_combo.findData(current_id)
-            if idx >= 0: self.rank_combo.setCurrentIndex(idx)
+        fill_reference_combo(self.rank_combo, self.db, 'ranks')
 
     def load_combo_data(self):
         """Первичная загрузка данных в комбобоксы"""
@@ -10,6 +10,10 @@ import os
 import traceback
 
 from autocomplete_helper import AutocompleteHelper
+from krd_aggregate import CardRecord, KrdCard
+from photo_store import (
+    PHOTO_TYPES, PhotoLoadJob, ThumbnailCache, content_hash
+)
 from reference_editor_dialog import ReferenceEditorDialog
 # 🔒 ИМПОРТ ВСПОМОГАТЕЛЬНЫХ ФУНКЦИЙ ДЛЯ РОЛИ ЧИТАТЕЛЯ
 from ui_helpers import is_reader, apply_readonly_mode
@@ -17,34 +21,41 @@ from ui_helpers import is_reader, apply_readonly_mode
 class SocialDataTab(QWidget):
     """Вкладка социально-демографических данных с поддержкой изображений"""
     
-    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None):
+    def __init__(self, krd_id, db_connection, audit_logger=None, user_info=None, card=None):
         super().__init__()
         self.krd_id = krd_id
         self.db = db_connection
+        # Данные карточки (общие для всех вкладок окна)
+        self.card = card or KrdCard(db_connection, krd_id)
         self.audit_logger = audit_logger
         self.user_info = user_info or {}
         
         # 🔒 Флаг режима чтения
         self.is_read_only = is_reader(self.user_info)
         
-        self.record = None
+        self.record_id = None
+        # Значения полей на момент последней загрузки/сохранения — для частичного UPDATE
+        self._persisted_values = {}
         self.autocomplete_helper = AutocompleteHelper(db_connection)
         self.photo_paths = {
             'civilian': None, 'military_headgear': None,
             'military_no_headgear': None, 'distinctive_marks': None
         }
-        self.original_photos = {
-            'civilian': None, 'military_headgear': None,
-            'military_no_headgear': None, 'distinctive_marks': None
-        }
+        # Оригиналы фото загружаются только по требованию (выгрузка); в карточке — миниатюры
+        self.original_photos = {pt: None for pt in PHOTO_TYPES}
+        self._photo_hashes = {pt: None for pt in PHOTO_TYPES}
+        self._has_photo = {pt: False for pt in PHOTO_TYPES}
+        self._pending_exports = set()
         self.max_text_length = 5000
 
         # 1. Создание интерфейса
         self.init_ui()
-        # 2. Загрузка справочников
-        self.load_combo_data()
-        # 3. Загрузка данных из БД
-        self.load_data()
+        # 2–3. Справочники и данные — из карточки (недостающее догружается одним запросом)
+        self.card.require('social_data', 'categories', 'ranks')
+        self._fill_categories()
+        self._fill_ranks()
+        self._show_data()
+        self.card.changed.connect(self._on_card_changed)
         # 4. Настройка автосохранения, автодополнения и валидаторов
         self.setup_auto_save()
         self.setup_autocomplete_fields()
@@ -383,45 +394,54 @@ class SocialDataTab(QWidget):
             self.autocomplete_helper.setup_autocomplete(w, 'social_data', c, max_items=m, show_on_focus=True)
 
     def load_categories(self):
-        """Загрузка категорий с сохранением текущего выбора"""
-        current_id = self.category_combo.currentData()
-        self.category_combo.clear()
-        self.category_combo.addItem("", None)
-        q = QSqlQuery(self.db)
-        q.exec("SELECT id, name FROM krd.categories ORDER BY name")
-        while q.next():
-            self.category_combo.addItem(q.value(1), q.value(0))
-        if current_id is not None:
-            idx = self.category_combo.findData(current_id)
-            if idx >= 0:
-                self.category_combo.setCurrentIndex(idx)
+        """Перечитывает категории из базы"""
+        self.card.refresh('categories')
 
     def load_ranks(self):
-        """Загрузка званий с сохранением текущего выбора"""
-        current_id = self.rank_combo.currentData()
-        self.rank_combo.clear()
-        self.rank_combo.addItem("", None)
-        q = QSqlQuery(self.db)
-        q.exec("SELECT id, name FROM krd.ranks ORDER BY name")
-        while q.next():
-            self.rank_combo.addItem(q.value(1), q.value(0))
+        """Перечитывает звания из базы"""
+        self.card.refresh('ranks')
+
+    def load_combo_data(self):
+        """Перечитывает оба справочника одним запросом"""
+        self.card.refresh('categories', 'ranks')
+
+    @staticmethod
+    def _fill_reference_combo(combo, rows):
+        """Заполнение справочника из карточки с сохранением текущего выбора"""
+        current_id = combo.currentData()
+        combo.clear()
+        combo.addItem("", None)
+        for row in rows or []:
+            combo.addItem(row['name'], row['id'])
         if current_id is not None:
-            idx = self.rank_combo.findData(current_id)
+            idx = combo.findData(current_id)
             if idx >= 0:
-                self.rank_combo.setCurrentIndex(idx)
+                combo.setCurrentIndex(idx)
 
-    def load_combo_data(self):
-        """Первичная загрузка данных в комбобоксы при инициализации"""
-        self.load_categories()
-        self.load_ranks()
+    def _fill_categories(self):
+        self._fill_reference_combo(self.category_combo, self.card.get('categories'))
+
+    def _fill_ranks(self):
+        self._fill_reference_combo(self.rank_combo, self.card.get('ranks'))
+
+    def _on_card_changed(self, part):
+        if part == 'social_data':
+            self._show_data()
+        elif part == 'categories':
+            self._fill_categories()
+        elif part == 'ranks':
+            self._fill_ranks()
 
     def load_data(self):
-        q = QSqlQuery(self.db)
-        q.prepare("SELECT * FROM krd.social_data WHERE krd_id = ? ORDER BY id DESC LIMIT 1")
-        q.addBindValue(self.krd_id)
-        q.exec()
-        if q.next():
-            self.record = q.record()
+        """Перечитывает соц. данные карточки из базы"""
+        self.card.refresh('social_data')
+
+    def _show_data(self):
+        # Колонки формы и метаданные фото (без BYTEA оригиналов) — из карточки
+        row = self.card.get('social_data')
+        if row is not None:
+            q = CardRecord(row)
+            self.record_id = q.value("id")
             self.surname_input.setText(q.value("surname") or "")
             self.name_input.setText(q.value("name") or "")
             self.patronymic_input.setText(q.value("patronymic") or "")
@@ -472,30 +492,64 @@ class SocialDataTab(QWidget):
             self.military_contacts_input.setText(q.value("military_contacts") or "")
             self.relatives_info_input.setPlainText(q.value("relatives_info") or "")
             
-            self.load_photo_from_db(q, 'photo_civilian', self.photo_civilian_label, 'civilian')
-            self.load_photo_from_db(q, 'photo_military_headgear', self.photo_military_headgear_label, 'military_headgear')
-            self.load_photo_from_db(q, 'photo_military_no_headgear', self.photo_military_no_headgear_label, 'military_no_headgear')
-            self.load_photo_from_db(q, 'photo_distinctive_marks', self.photo_distinctive_marks_label, 'distinctive_marks')
-
-    def load_photo_from_db(self, query, field_name, label_widget, photo_type):
-        pd = query.value(field_name)
-        self.original_photos[photo_type] = None
-        if pd and (isinstance(pd, bytes) or hasattr(pd, 'data')):
-            try:
-                b = bytes(pd.data()) if hasattr(pd, 'data') else bytes(pd)
-                self.original_photos[photo_type] = b
-                p = QPixmap()
-                p.loadFromData(b)
-                if not p.isNull():
-                    label_widget.setPixmap(p.scaled(180, 240, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-                    label_widget.setStyleSheet("QLabel { border: 2px solid #4CAF50; background-color: white; }")
-                else:
-                    label_widget.setText("Ошибка загрузки")
-            except Exception:
-                label_widget.setText("Ошибка")
-        else:
-            label_widget.setText("Нет фото")
-            label_widget.setStyleSheet("QLabel { border: 2px dashed #999; background-color: #f8f9fa; color: #6c757d; font-size: 12px; }")
+            for pt in self.photo_paths:
+                self.photo_paths[pt] = None
+            self._load_thumbnails(q)
+            self._persisted_values = self._collect_form_values()
+
+    def _load_thumbnails(self, query):
+        """Миниатюры: из дискового кэша сразу, недостающие — в рабочем потоке"""
+        cache = ThumbnailCache.instance()
+        pending = {}
+        for pt in PHOTO_TYPES:
+            label = getattr(self, f'photo_{pt}_label')
+            self.original_photos[pt] = None
+            self._has_photo[pt] = bool(query.value(f"has_photo_{pt}"))
+            self._photo_hashes[pt] = (query.value(f"photo_{pt}_hash") or None) if self._has_photo[pt] else None
+            if not self._has_photo[pt]:
+                self._show_photo_placeholder(label, "Нет фото")
+                continue
+            cached = cache.get(self._photo_hashes[pt])
+            if cached and self._show_photo(label, cached, "#4CAF50"):
+                continue
+            self._show_photo_placeholder(label, "Загрузка...")
+            pending[pt] = self._photo_hashes[pt]
+
+        if pending:
+            job = PhotoLoadJob(self.krd_id, pending)
+            job.worker.loaded.connect(self._on_thumbnail_loaded)
+            job.worker.failed.connect(self._on_thumbnail_failed)
+            job.start()
+
+    def _on_thumbnail_loaded(self, photo_type, key, thumbnail):
+        expected = self._photo_hashes.get(photo_type)
+        # Пока шла загрузка, фото заменили или карточку перечитали
+        if self.photo_paths.get(photo_type) or (expected and expected != key):
+            return
+        ThumbnailCache.instance().put(key, thumbnail)
+        if not self._show_photo(getattr(self, f'photo_{photo_type}_label'), thumbnail, "#4CAF50"):
+            self._show_photo_placeholder(getattr(self, f'photo_{photo_type}_label'), "Ошибка загрузки")
+
+    def _on_thumbnail_failed(self, photo_type, message):
+        print(f"⚠️ [PHOTO] КРД-{self.krd_id}, фото '{photo_type}': {message}")
+        if not self.photo_paths.get(photo_type):
+            self._show_photo_placeholder(getattr(self, f'photo_{photo_type}_label'), "Ошибка загрузки")
+
+    @staticmethod
+    def _show_photo(label_widget, data, border_color):
+        p = QPixmap()
+        p.loadFromData(data)
+        if p.isNull():
+            return False
+        label_widget.setPixmap(p)
+        label_widget.setStyleSheet(f"QLabel {{ border: 2px solid {border_color}; background-color: white; }}")
+        return True
+
+    @staticmethod
+    def _show_photo_placeholder(label_widget, text):
+        label_widget.clear()
+        label_widget.setText(text)
+        label_widget.setStyleSheet("QLabel { border: 2px dashed #999; background-color: #f8f9fa; color: #6c757d; font-size: 12px; }")
 
     def load_photo(self, photo_type):
         path, _ = QFileDialog.getOpenFileName(self, f"Выберите фотографию ({photo_type})", "", "Изображения (*.png *.jpg *.jpeg *.bmp);;Все файлы (*)")
@@ -518,10 +572,30 @@ class SocialDataTab(QWidget):
                 b = f.read()
         elif self.original_photos.get(photo_type):
             b = self.original_photos[photo_type]
-            
+        elif self._has_photo.get(photo_type):
+            # Оригинал в карточке не загружен — запрашиваем в рабочем потоке, диалог откроется по готовности
+            if photo_type not in self._pending_exports:
+                self._pending_exports.add(photo_type)
+                job = PhotoLoadJob(self.krd_id, {photo_type: self._photo_hashes.get(photo_type)}, full=True)
+                job.worker.loaded.connect(self._on_original_loaded)
+                job.worker.failed.connect(self._on_original_failed)
+                job.start()
+            return
+
         if not b:
             return QMessageBox.information(self, "Информация", f"Фото '{photo_type}' отсутствует.")
-            
+        self._save_photo_file(photo_type, b)
+
+    def _on_original_loaded(self, photo_type, key, data):
+        self._pending_exports.discard(photo_type)
+        self.original_photos[photo_type] = data
+        self._save_photo_file(photo_type, data)
+
+    def _on_original_failed(self, photo_type, message):
+        self._pending_exports.discard(photo_type)
+        QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить фото '{photo_type}': {message}")
+
+    def _save_photo_file(self, photo_type, b):
         path, _ = QFileDialog.getSaveFileName(self, f"Сохранить фото ({photo_type})", f"КРД-{self.krd_id}_{photo_type}.jpg", "Изображения (*.jpg *.png *.bmp);;Все файлы (*)")
         if path:
             try:
@@ -533,11 +607,8 @@ class SocialDataTab(QWidget):
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", str(e))
 
-    def save_data(self):
-        err = self.validate_all_fields()
-        if err:
-            raise ValueError(err)
-
+    def _collect_form_values(self):
+        """Текущие значения полей формы по колонкам krd.social_data (без фото)"""
         # ✅ Очистка: пустые строки → None (чтобы БД не падала на CHECK-ограничениях)
         def clean_text(val):
             if isinstance(val, str):
@@ -545,8 +616,7 @@ class SocialDataTab(QWidget):
                 return stripped if stripped else None
             return val
 
-        data = {
-            "krd_id": self.krd_id,
+        return {
             "surname": clean_text(self.surname_input.text()),
             "name": clean_text(self.name_input.text()),
             "patronymic": clean_text(self.patronymic_input.text()),
@@ -581,42 +651,51 @@ class SocialDataTab(QWidget):
             "military_contacts": clean_text(self.military_contacts_input.text()),
             "relatives_info": self.relatives_info_input.toPlainText()
         }
-        
-        # Обработка фото
-        for pt in ['civilian', 'military_headgear', 'military_no_headgear', 'distinctive_marks']:
-            p = self.photo_paths.get(pt)
-            fb = None
+
+    def _changed_photos(self):
+        """Фото, выбранные пользователем после последнего сохранения: {тип: байты}"""
+        photos = {}
+        for pt, p in self.photo_paths.items():
             if p and os.path.exists(p):
-                with open(p, 'rb') as f: fb = f.read()
-            elif self.original_photos.get(pt): 
-                fb = self.original_photos[pt]
-            data[f"photo_{pt}"] = QByteArray(fb) if fb else QByteArray()
-            
+                with open(p, 'rb') as f:
+                    photos[pt] = f.read()
+        return photos
+
+    def _dirty_fields(self, values):
+        """Колонки, значения которых отличаются от последнего сохраненного состояния"""
+        return {k: v for k, v in values.items()
+                if k not in self._persisted_values or self._persisted_values[k] != v}
+
+    def save_data(self):
+        """
+        Сохраняет только измененные поля (UPDATE нужных колонок).
+        Возвращает False, если сохранять нечего.
+        """
+        err = self.validate_all_fields()
+        if err:
+            raise ValueError(err)
+
+        values = self._collect_form_values()
+        photos = self._changed_photos()
         q = QSqlQuery(self.db)
-        
-        if self.record:
-            # UPDATE существующей записи
-            q.prepare("""UPDATE krd.social_data SET 
-                surname=:surname, name=:name, patronymic=:patronymic, birth_date=:birth_date,
-                birth_place_town=:birth_place_town, birth_place_district=:birth_place_district,
-                birth_place_region=:birth_place_region, birth_place_country=:birth_place_country,
-                tab_number=:tab_number, personal_number=:personal_number, category_id=:category_id,
-                rank_id=:rank_id, drafted_by_commissariat=:drafted_by_commissariat, draft_date=:draft_date,
-                povsk=:povsk, selection_date=:selection_date, education=:education,
-                criminal_record=:criminal_record, social_media_account=:social_media_account,
-                bank_card_number=:bank_card_number, passport_series=:passport_series,
-                passport_number=:passport_number, passport_issue_date=:passport_issue_date,
-                passport_issued_by=:passport_issued_by, military_id_series=:military_id_series,
-                military_id_number=:military_id_number, military_id_issue_date=:military_id_issue_date,
-                military_id_issued_by=:military_id_issued_by, appearance_features=:appearance_features,
-                personal_marks=:personal_marks, federal_search_info=:federal_search_info,
-                military_contacts=:military_contacts, relatives_info=:relatives_info,
-                photo_civilian=:photo_civilian, photo_military_headgear=:photo_military_headgear,
-                photo_military_no_headgear=:photo_military_no_headgear, photo_distinctive_marks=:photo_distinctive_marks
-                WHERE id=:id""")
-            q.bindValue(":id", self.record.value("id"))
+
+        if self.record_id:
+            changed = self._dirty_fields(values)
+            if not changed and not photos:
+                return False
+            data = dict(changed)
+            for pt, b in photos.items():
+                data[f"photo_{pt}"] = QByteArray(b)
+            sets = ", ".join(f"{k}=:{k}" for k in data)
+            q.prepare(f"UPDATE krd.social_data SET {sets} WHERE id=:id")
+            q.bindValue(":id", self.record_id)
         else:
-            # INSERT новой записи
+            # INSERT новой записи — все поля
+            changed = values
+            data = {"krd_id": self.krd_id, **values}
+            for pt in ['civilian', 'military_headgear', 'military_no_headgear', 'distinctive_marks']:
+                fb = photos.get(pt) or self.original_photos.get(pt)
+                data[f"photo_{pt}"] = QByteArray(fb) if fb else QByteArray()
             q.prepare("""INSERT INTO krd.social_data (krd_id, surname, name, patronymic, birth_date,
                 birth_place_town, birth_place_district, birth_place_region, birth_place_country, tab_number,
                 personal_number, category_id, rank_id, drafted_by_commissariat, draft_date, povsk,
@@ -633,16 +712,35 @@ class SocialDataTab(QWidget):
                 :military_id_series, :military_id_number, :military_id_issue_date, :military_id_issued_by,
                 :appearance_features, :personal_marks, :federal_search_info, :military_contacts,
                 :relatives_info, :photo_civilian, :photo_military_headgear, :photo_military_no_headgear,
-                :photo_distinctive_marks)""")
-                
+                :photo_distinctive_marks)
+                RETURNING id""")
+
         for k, v in data.items():
             q.bindValue(f":{k}", v)
-            
+
         if not q.exec():
             raise Exception(f"Ошибка сохранения: {q.lastError().text()}")
-            
-        self.autocomplete_helper.refresh_all_fields()
-        print("✅ [SAVE] Данные успешно сохранены в БД!")
+        if not self.record_id and q.next():
+            self.record_id = q.value(0)
+
+        # Сохраненное состояние — база для следующего сравнения
+        self._persisted_values.update(changed)
+        for pt, b in photos.items():
+            self.original_photos[pt] = b
+            self.photo_paths[pt] = None
+            self._has_photo[pt] = True
+            self._photo_hashes[pt] = content_hash(b)
+        if photos:
+            # Миниатюры сохраненных фото масштабируются в рабочем потоке, а не в окне
+            job = PhotoLoadJob(self.krd_id, {pt: self._photo_hashes[pt] for pt in photos}, originals=photos)
+            job.worker.loaded.connect(self._on_thumbnail_loaded)
+            job.worker.failed.connect(self._on_thumbnail_failed)
+            job.start()
+
+        # Новые значения сразу попадают в общий индекс подсказок
+        self.autocomplete_helper.add_saved_values(changed)
+        print(f"✅ [SAVE] Сохранено полей: {len(changed) + len(photos)} ({', '.join(list(changed) + [f'photo_{pt}' for pt in photos])})")
+        return True
 
     def setup_auto_save(self):
         """Настройка таймера автосохранения"""
@@ -675,22 +773,14 @@ class SocialDataTab(QWidget):
         self._auto_save_timer.start(400) # Сохранить через 400мс после прекращения ввода
         
     def _perform_auto_save(self):
-        """Выполнение автосохранения с логированием"""
+        """Автосохранение: серия быстрых правок объединяется таймером в один UPDATE измененных полей"""
         try:
-            print(f"\n💾 [AUTO-SAVE] Начало автосохранения для КРД-{self.krd_id}")
-            print(f"💾 [AUTO-SAVE] Данные формы:")
-            print(f"   - Фамилия: {self.surname_input.text()}")
-            print(f"   - Имя: {self.name_input.text()}")
-            print(f"   - Отчество: {self.patronymic_input.text()}")
-            print(f"   - Серия паспорта: {self.passport_series_input.text()}")
-            print(f"   - Номер паспорта: {self.passport_number_input.text()}")
-            
-            self.save_data()
-            print(f"✅ [AUTO-SAVE] Автосохранение успешно завершено\n")
+            if self.save_data():
+                print(f"✅ [AUTO-SAVE] Автосохранение КРД-{self.krd_id} завершено")
         except ValueError as e:
             # Ошибка валидации - не критична для автосохранения
             print(f"⚠️ [AUTO-SAVE] Ошибка валидации (игнорируется): {e}")
         except Exception as e:
             print(f"❌ [AUTO-SAVE] КРИТИЧЕСКАЯ ОШИБКА автосохранения: {e}")
             import traceback
-            traceback.print_exc()
\ No newline at end of file
+            traceback.print_exc()
@@ -0,0 +1,113 @@
+"""
+Поиск подсказок автодополнения в памяти
+✅ ОПТИМИЗИРОВАНО: Отсортированный массив нормализованных значений — совпадения по началу строки бинарным поиском
+✅ ОПТИМИЗИРОВАНО: Триграммный индекс — совпадения внутри строки без перебора всех значений
+✅ ДОБАВЛЕНО: Нормализация регистра для кириллицы (casefold, ё → е), top-k с ранжированием
+"""
+import bisect
+import heapq
+
+
+def normalize(text):
+    return text.casefold().replace("ё", "е")
+
+
+def _trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class SuggestionMatcher:
+    """
+    Индекс значений одной колонки. Порядок выдачи:
+    1) значения, начинающиеся с запроса (по алфавиту);
+    2) значения, где запрос начинает слово;
+    3) прочие вхождения (раньше и короче — выше).
+    """
+
+    def __init__(self, values=()):
+        self.rebuild(values)
+
+    def rebuild(self, values):
+        self._values = []        # id → исходное значение
+        self._keys = []          # id → нормализованное значение
+        self._sorted_keys = []   # нормализованные значения по возрастанию
+        self._sorted_ids = []    # id в том же порядке
+        self._trigrams = {}      # триграмма → список id (по возрастанию)
+        self._known = set()
+        for value in values:
+            self._append(value)
+        order = sorted(range(len(self._keys)), key=self._keys.__getitem__)
+        self._sorted_ids = order
+        self._sorted_keys = [self._keys[i] for i in order]
+
+    def __len__(self):
+        return len(self._values)
+
+    def _append(self, value):
+        if value in self._known:
+            return None
+        self._known.add(value)
+        item_id = len(self._values)
+        key = normalize(value)
+        self._values.append(value)
+        self._keys.append(key)
+        for gram in _trigrams(key):
+            self._trigrams.setdefault(gram, []).append(item_id)
+        return item_id
+
+    def add(self, value):
+        """Добавляет значение (True — значение новое)"""
+        item_id = self._append(value)
+        if item_id is None:
+            return False
+        key = self._keys[item_id]
+        pos = bisect.bisect_right(self._sorted_keys, key)
+        self._sorted_keys.insert(pos, key)
+        self._sorted_ids.insert(pos, item_id)
+        return True
+
+    def match(self, text, limit=15):
+        """До limit подсказок для введенного текста (пустой текст — первые значения по алфавиту)"""
+        query = normalize(text.strip())
+        if not query:
+            return [self._values[i] for i in self._sorted_ids[:limit]]
+
+        # 1. Совпадения по началу строки — непрерывный диапазон отсортированного массива
+        start = bisect.bisect_left(self._sorted_keys, query)
+        result = []
+        seen = set()
+        for pos in range(start, len(self._sorted_keys)):
+            if len(result) >= limit or not self._sorted_keys[pos].startswith(query):
+                break
+            item_id = self._sorted_ids[pos]
+            result.append(item_id)
+            seen.add(item_id)
+        if len(result) >= limit:
+            return [self._values[i] for i in result]
+
+        # 2-3. Вхождения внутри строки: кандидаты — пересечение списков триграмм
+        if len(query) >= 3:
+            postings = sorted((self._trigrams.get(g, ()) for g in _trigrams(query)), key=len)
+            if not postings[0]:
+                return [self._values[i] for i in result]
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    break
+        else:
+            candidates = range(len(self._keys))
+
+        ranked = []
+        for item_id in candidates:
+            if item_id in seen:
+                continue
+            key = self._keys[item_id]
+            position = key.find(query)
+            if position < 0:
+                continue
+            word_start = not key[position - 1].isalnum()
+            ranked.append((0 if word_start else 1, position, len(key), key, item_id))
+        for rank in heapq.nsmallest(limit - len(result), ranked):
+            result.append(rank[-1])
+        return [self._values[i] for i in result]
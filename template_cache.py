@@ -0,0 +1,164 @@
+"""
+Кэш скомпилированных Word-шаблонов
+✅ ДОБАВЛЕНО: CompiledTemplate — шаблон разбирается один раз, запоминаются абзацы с {{переменными}}
+✅ ДОБАВЛЕНО: TemplateCache — LRU по ключу (template_id, updated_at, размер) с вытеснением по числу шаблонов и оценке памяти
+✅ ОПТИМИЗИРОВАНО: Повторная генерация копирует разобранный документ и трогает только индексированные абзацы
+"""
+import io
+import copy
+import hashlib
+import threading
+import zipfile
+from collections import OrderedDict
+
+from docx import Document
+
+
+# Разобранное дерево lxml занимает в памяти в несколько раз больше, чем XML частей документа
+PARSED_TREE_FACTOR = 4
+
+
+def _xml_size(template_bytes):
+    """Суммарный размер несжатых XML-частей .docx"""
+    try:
+        with zipfile.ZipFile(io.BytesIO(template_bytes)) as archive:
+            return sum(info.file_size for info in archive.infolist()
+                       if info.filename.endswith(('.xml', '.rels')))
+    except zipfile.BadZipFile:
+        return len(template_bytes)
+
+
+class CompiledTemplate:
+    """
+    Разобранный шаблон с индексом расположения переменных.
+    Локатор абзаца: ('body', i) | ('table', t, r, c, p) | ('header', s, p) | ('footer', s, p)
+    """
+
+    def __init__(self, template_bytes, placeholder_pattern, template_id=None, name=None):
+        self.template_id = template_id
+        self.name = name
+        self.size = len(template_bytes)
+        self.content_hash = hashlib.sha256(template_bytes).hexdigest()
+        self.placeholder_pattern = placeholder_pattern
+        self.template_bytes = template_bytes
+        # Оценка памяти записи кэша: байты файла + разобранное дерево эталона
+        self.memory_size = self.size + _xml_size(template_bytes) * PARSED_TREE_FACTOR
+
+        self.locations = []      # [(подпись, локатор, множество переменных)]
+        self.variables = set()
+        self.text_lines = []     # Текст шаблона для диагностики
+
+        # Шаблон разбирается один раз: документ индексации становится эталоном для копирования
+        doc = Document(io.BytesIO(template_bytes))
+        attributes_before = dict(doc.__dict__)
+        self._compile(doc)
+        # Прокси, закэшированные python-docx при индексации (_Body), сбрасываются к исходным значениям:
+        # иначе deepcopy скопирует их отдельно от дерева документа
+        doc.__dict__.clear()
+        doc.__dict__.update(attributes_before)
+        self._pristine = doc
+
+    @staticmethod
+    def _iter_located_paragraphs(doc):
+        """Абзацы документа с локаторами; абзац объединенной ячейки выдается один раз"""
+        # Храним сами элементы, а не id(): иначе освобожденные прокси lxml переиспользуют id
+        seen = set()
+        for i, para in enumerate(doc.paragraphs):
+            yield f"[Абзац {i}]", ('body', i), para
+        for t, table in enumerate(doc.tables):
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    for p, para in enumerate(cell.paragraphs):
+                        if para._p in seen:
+                            continue
+                        seen.add(para._p)
+                        yield f"[Таблица {t}, Ячейка {r},{c}]", ('table', t, r, c, p), para
+        # Связанные с предыдущим разделом колонтитулы уже пройдены; обращение к ним создало бы
+        # пустое определение колонтитула в документе
+        for s, section in enumerate(doc.sections):
+            if not section.header.is_linked_to_previous:
+                for p, para in enumerate(section.header.paragraphs):
+                    yield f"[Шапка {s}]", ('header', s, p), para
+            if not section.footer.is_linked_to_previous:
+                for p, para in enumerate(section.footer.paragraphs):
+                    yield f"[Подвал {s}]", ('footer', s, p), para
+
+    def _compile(self, doc):
+        for label, locator, para in self._iter_located_paragraphs(doc):
+            text = para.text
+            if not text:
+                continue
+            if text.strip():
+                self.text_lines.append(f"{label} {text}")
+            found = self.placeholder_pattern.findall(text)
+            if found:
+                names = frozenset(found)
+                self.variables.update(names)
+                self.locations.append((label, locator, names))
+
+    def new_document(self):
+        """Независимая копия разобранного документа для одного рендера"""
+        return copy.deepcopy(self._pristine)
+
+    @staticmethod
+    def resolve(doc, locator, body_paragraphs=None):
+        """Возвращает абзац документа по локатору"""
+        kind = locator[0]
+        if kind == 'body':
+            paragraphs = body_paragraphs if body_paragraphs is not None else doc.paragraphs
+            return paragraphs[locator[1]]
+        if kind == 'table':
+            _, t, r, c, p = locator
+            return doc.tables[t].rows[r].cells[c].paragraphs[p]
+        section = doc.sections[locator[1]]
+        part = section.header if kind == 'header' else section.footer
+        return part.paragraphs[locator[2]]
+
+
+class TemplateCache:
+    """
+    Потокобезопасный LRU-кэш скомпилированных шаблонов.
+    Ограничен числом шаблонов и оценкой занимаемой памяти (memory_size), а не размером .docx.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=16):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, compiled):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old.memory_size
+            # Устаревшие версии того же шаблона больше не понадобятся
+            for stale_key in [k for k in self._items if k[0] == key[0]]:
+                self._total_bytes -= self._items.pop(stale_key).memory_size
+            self._items[key] = compiled
+            self._total_bytes += compiled.memory_size
+            while len(self._items) > 1 and (self._total_bytes > self.max_bytes
+                                            or len(self._items) > self.max_entries):
+                _, evicted = self._items.popitem(last=False)
+                self._total_bytes -= evicted.memory_size
+
+    def invalidate(self, template_id=None):
+        with self._lock:
+            if template_id is None:
+                self._items.clear()
+                self._total_bytes = 0
+                return
+            for key in [k for k in self._items if k[0] == template_id]:
+                self._total_bytes -= self._items.pop(key).memory_size
+
+
+# Общий кэш процесса: шаблоны переиспользуются всеми окнами КРД
+template_cache = TemplateCache()
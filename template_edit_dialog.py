@@ -9,7 +9,8 @@ from PyQt6.QtWidgets import (
     QPushButton, QTextEdit, QMessageBox, QFileDialog
 )
 from PyQt6.QtSql import QSqlQuery
-from PyQt6.QtCore import QByteArray
+
+from blob_store import load_file_data, put_blob
 
 class TemplateEditDialog(QDialog):
     def __init__(self, db, template_id=None, parent=None):
@@ -94,17 +95,17 @@ class TemplateEditDialog(QDialog):
     def load_data(self):
         query = QSqlQuery(self.db)
         # ✅ ИСПРАВЛЕНО: Именованный параметр :id
-        query.prepare("SELECT name, description, template_data FROM krd.document_templates WHERE id = :id")
+        query.prepare("SELECT name, description, template_hash, template_data FROM krd.document_templates WHERE id = :id")
         query.bindValue(":id", self.template_id)
         
         if query.exec() and query.next():
             self.name_input.setText(query.value(0) or "")
             self.desc_input.setPlainText(query.value(1) or "")
-            data = query.value(2)
+            data = load_file_data(self.db, query.value(2), query.value(3))
             
             # ✅ ИСПРАВЛЕНО: Добавлено условие проверки данных (if data:)
             if data:
-                self.current_file_bytes = bytes(data) if not isinstance(data, bytes) else data
+                self.current_file_bytes = data
                 size = len(self.current_file_bytes)
                 self.file_label.setText(f"✅ Текущий шаблон в БД ({size} байт)")
                 self.file_label.setStyleSheet("QLabel { color: blue; font-weight: bold; background-color: #e3f2fd; padding: 5px; border: 1px solid #2196F3; }")
@@ -129,26 +130,29 @@ class TemplateEditDialog(QDialog):
             
         query = QSqlQuery(self.db)
         try:
+            # Файл шаблона — в хранилище по хешу; неизмененный шаблон повторно не передается
+            blob_key = put_blob(self.db, file_bytes)
             if self.template_id:
                 # ✅ ИСПРАВЛЕНО: Именованные параметры для UPDATE
                 query.prepare("""
                     UPDATE krd.document_templates 
-                    SET name = :name, description = :desc, template_data = :data, updated_at = CURRENT_TIMESTAMP 
+                    SET name = :name, description = :desc, template_hash = :hash, template_data = NULL,
+                        updated_at = CURRENT_TIMESTAMP 
                     WHERE id = :id
                 """)
                 query.bindValue(":name", name)
                 query.bindValue(":desc", desc)
-                query.bindValue(":data", QByteArray(file_bytes))
+                query.bindValue(":hash", blob_key)
                 query.bindValue(":id", self.template_id)
             else:
                 # ✅ ИСПРАВЛЕНО: Именованные параметры для INSERT
                 query.prepare("""
-                    INSERT INTO krd.document_templates (name, description, template_data, is_deleted) 
-                    VALUES (:name, :desc, :data, FALSE)
+                    INSERT INTO krd.document_templates (name, description, template_hash, is_deleted) 
+                    VALUES (:name, :desc, :hash, FALSE)
                 """)
                 query.bindValue(":name", name)
                 query.bindValue(":desc", desc)
-                query.bindValue(":data", QByteArray(file_bytes))
+                query.bindValue(":hash", blob_key)
                 
             if query.exec():
                 QMessageBox.information(self, "Успех", "Шаблон успешно сохранён!")
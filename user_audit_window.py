@@ -1,5 +1,7 @@
 """
 Модуль для просмотра аудита действий пользователей
+✅ ОПТИМИЗИРОВАНО: AuditLogTableModel — keyset-пагинация по (created_at, id) вместо LIMIT 1000
+✅ ОПТИМИЗИРОВАНО: Экспорт выгружает всю выборку по фильтрам серверным курсором (audit_export), а не строки модели
 """
 
 from PyQt6.QtWidgets import (
@@ -7,10 +9,13 @@ from PyQt6.QtWidgets import (
     QComboBox, QTableView, QPushButton, QLabel, QDateEdit,
     QMessageBox, QHeaderView, QAbstractItemView, QSplitter, QWidget
 )
-from PyQt6.QtCore import Qt, QDate,QDateTime
-from PyQt6.QtSql import QSqlQueryModel, QSqlQuery
+from PyQt6.QtCore import QDate
+from PyQt6.QtSql import QSqlQuery
 from PyQt6.QtGui import QFont
 
+from audit_log_model import AuditLogTableModel
+from audit_export import AuditExportJob
+
 
 class UserAuditWindow(QDialog):
     """
@@ -29,6 +34,7 @@ class UserAuditWindow(QDialog):
         super().__init__()
         self.db = db_connection
         self.current_user_id = current_user_id
+        self.export_job = None
         
         self.setWindowTitle("Аудит действий пользователей")
         self.resize(1200, 700)
@@ -131,8 +137,8 @@ class UserAuditWindow(QDialog):
         group_box = QGroupBox("История действий")
         layout = QVBoxLayout()
         
-        # Создаем модель для таблицы аудита
-        self.audit_model = QSqlQueryModel()
+        # Создаем модель для таблицы аудита (подгрузка страницами при прокрутке)
+        self.audit_model = AuditLogTableModel(self.db, self)
         
         # Создаем таблицу
         self.audit_table = QTableView()
@@ -154,6 +160,9 @@ class UserAuditWindow(QDialog):
         self.audit_table.setColumnWidth(4, 80)   # ID записи
         self.audit_table.setColumnWidth(5, 80)   # ID КРД
         
+        # Счетчик в заголовке растет по мере подгрузки страниц
+        self.audit_model.rowsInserted.connect(self.update_title)
+        
         layout.addWidget(self.audit_table)
         group_box.setLayout(layout)
         
@@ -190,80 +199,40 @@ class UserAuditWindow(QDialog):
                 self.user_combo.setCurrentIndex(index)
     
     def load_audit_data(self):
-        """Загрузка данных аудита с применением фильтров (✅ ИСПРАВЛЕНО: именованные параметры)"""
-        # Получаем параметры фильтрации
+        """Загрузка данных аудита с применением фильтров (первая страница, остальные — при прокрутке)"""
         user_id = self.user_combo.currentData()
         action_type = self.action_type_combo.currentData()
         date_from = self.date_from.date().toString("yyyy-MM-dd")
         date_to = self.date_to.date().toString("yyyy-MM-dd")
         
-        # ✅ Формируем SQL-запрос с ИМЕНОВАННЫМИ параметрами
-        query_str = """
-            SELECT 
-                al.created_at as "Дата и время",
-                al.username as "Пользователь",
-                al.action_type as "Тип действия",
-                al.table_name as "Таблица",
-                al.record_id as "ID записи",
-                al.krd_id as "ID КРД",
-                al.description as "Описание"
-            FROM krd.audit_log al
-            WHERE 1=1
-        """
-        
-        # ✅ Добавляем условия с именованными параметрами
-        conditions = []
-        params = {}
-        
-        if user_id and user_id > 0:
-            conditions.append("AND al.user_id = :user_id")
-            params[":user_id"] = user_id
-        
-        if action_type:
-            conditions.append("AND al.action_type = :action_type")
-            params[":action_type"] = action_type
-        
-        conditions.append("AND al.created_at >= :date_from")
-        params[":date_from"] = date_from
-        
-        conditions.append("AND al.created_at <= :date_to")
-        params[":date_to"] = f"{date_to} 23:59:59"
-        
-        query_str += " ".join(conditions)
-        query_str += " ORDER BY al.created_at DESC LIMIT 1000"
-        
-        # ✅ Выполняем запрос с именованными параметрами
-        query = QSqlQuery(self.db)
-        query.prepare(query_str)
-        
-        for name, value in params.items():
-            query.bindValue(name, value)
-        
-        if not query.exec():
-            print(f"❌ Ошибка запроса: {query.lastError().text()}")
-            print(f"📝 SQL: {query_str}")
-            print(f"🔗 Параметры: {params}")
+        if not self.audit_model.set_filters(user_id, action_type, date_from, date_to):
             QMessageBox.critical(
                 self,
                 "Ошибка",
-                f"Ошибка выполнения запроса:\n{query.lastError().text()}"
+                f"Ошибка выполнения запроса:\n{self.audit_model.last_error}"
             )
             return
         
-        self.audit_model.setQuery(query)
-        
+        self.update_title()
+    
+    def update_title(self, *_):
         record_count = self.audit_model.rowCount()
-        self.setWindowTitle(f"Аудит действий пользователей - {record_count} записей")
+        more = "+" if self.audit_model.has_more() else ""
+        self.setWindowTitle(f"Аудит действий пользователей - {record_count}{more} записей")
     
     def on_filter_changed(self):
         """Обработчик изменения фильтров"""
         self.load_audit_data()
     
     def export_report(self):
-        """Экспорт отчета в файл"""
+        """Экспорт всех событий по текущим фильтрам (потоково, в фоновом потоке)"""
         from PyQt6.QtWidgets import QFileDialog
         from datetime import datetime
         
+        if self.export_job is not None and self.export_job.is_running():
+            QMessageBox.information(self, "Экспорт", "Выгрузка уже выполняется")
+            return
+        
         # Формируем имя файла по умолчанию
         default_filename = f"Аудит_пользователей_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         
@@ -272,89 +241,25 @@ class UserAuditWindow(QDialog):
             self,
             "Экспортировать отчет",
             default_filename,
-            "CSV файлы (*.csv);;Все файлы (*)"
+            "CSV файлы (*.csv);;Excel файлы (*.xlsx);;Все файлы (*)"
         )
         
         if not file_path:
             return
         
-        try:
-            if file_path.endswith('.csv'):
-                self.export_to_csv(file_path)
-            else:
-                QMessageBox.warning(self, "Предупреждение", "Поддерживается только формат CSV")
-                return
-            
-            QMessageBox.information(
-                self,
-                "Успех",
-                f"Отчет успешно экспортирован:\n{file_path}"
-            )
-            
-        except Exception as e:
-            QMessageBox.critical(
-                self,
-                "Ошибка",
-                f"Ошибка экспорта отчета:\n{str(e)}"
-            )
+        if not file_path.lower().endswith(('.csv', '.xlsx')):
+            QMessageBox.warning(self, "Предупреждение", "Поддерживаются форматы CSV и XLSX")
+            return
+        
+        # Выгружаются фильтры, примененные к таблице, а не только загруженные в нее строки
+        model = self.audit_model
+        self.export_job = AuditExportJob(
+            file_path, model.user_id, model.action_type, model.date_from, model.date_to, self
+        )
+        self.export_job.start()
     
-    def export_to_csv(self, file_path):
-        """Экспорт данных в CSV файл с пояснительной шапкой и корректным форматированием"""
-        import csv
-        from datetime import datetime
-
-        with open(file_path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.writer(csvfile, delimiter=';', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-
-            # === 1. ЗАГОЛОВОК ОТЧЕТА ===
-            writer.writerow([f"ОТЧЕТ ПО АУДИТУ ДЕЙСТВИЙ ПОЛЬЗОВАТЕЛЕЙ"])
-            writer.writerow([f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"])
-            writer.writerow([]) # Пустая строка-разделитель
-
-            # === 2. ПОЯСНЕНИЕ К ТАБЛИЦЕ И ТИПАМ ОПЕРАЦИЙ ===
-            writer.writerow(["📖 ПОЯСНЕНИЕ К СТОЛБЦАМ И ТИПАМ ДАННЫХ:"])
-            writer.writerow([
-                "• Дата и время | Формат: ДД.ММ.ГГГГ ЧЧ:ММ:СС. Момент фиксации действия в системе."
-            ])
-            writer.writerow([
-                "• Тип действия   | Код операции. Примеры: LOGIN/LOGOUT (вход/выход), "
-                "CREATE/UPDATE/DELETE/VIEW (CRUD операции), EXPORT (выгрузка данных), "
-                "REFERENCE_CREATE/UPDATE/DELETE (изменение справочников), "
-                "DOCUMENT_GENERATE/SAVE (работа с шаблонами), STATUS_CHANGE (смена статуса КРД)."
-            ])
-            writer.writerow([
-                "• Таблица        | Имя таблицы БД или модуля, к которому относится действие "
-                "(например: krd, users, social_data, ranks, statuses, outgoing_requests)."
-            ])
-            writer.writerow([
-                "• ID записи      | Внутренний первичный ключ (ID) конкретной измененной записи в таблице."
-            ])
-            writer.writerow([
-                "• ID КРД         | Идентификатор карточки розыска, к которой привязано действие. "
-                "Значение 0 или пусто означает системное/глобальное действие."
-            ])
-            writer.writerow([
-                "• Описание       | Человеко-читаемый лог с деталями операции (ФИО, номера документов, старые/новые значения)."
-            ])
-            writer.writerow([]) # Пустая строка перед данными
-
-            # === 3. ЗАГОЛОВКИ СТОЛБЦОВ ===
-            headers = []
-            for col in range(self.audit_model.columnCount()):
-                headers.append(self.audit_model.headerData(col, Qt.Orientation.Horizontal))
-            writer.writerow(headers)
-
-            # === 4. ДАННЫЕ С КОРРЕКТНЫМ ПРЕОБРАЗОВАНИЕМ ===
-            for row in range(self.audit_model.rowCount()):
-                row_data = []
-                for col in range(self.audit_model.columnCount()):
-                    value = self.audit_model.data(self.audit_model.index(row, col))
-
-                    # ✅ ИСПРАВЛЕНИЕ: Явное форматирование объектов даты и времени
-                    if isinstance(value, QDateTime):
-                        value = value.toString("dd.MM.yyyy HH:mm:ss")
-                    elif isinstance(value, QDate):
-                        value = value.toString("dd.MM.yyyy")
-                    
-                    row_data.append(str(value) if value is not None else "")
-                writer.writerow(row_data)
\ No newline at end of file
+    def done(self, result):
+        """Закрытие окна прерывает незавершенную выгрузку"""
+        if self.export_job is not None and self.export_job.is_running():
+            self.export_job.wait()
+        super().done(result)